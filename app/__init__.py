@@ -8,7 +8,9 @@ def create_app():
     # Cấu hình secret key để sử dụng flash messages
     # Sửa lỗi: Thêm dòng cấu hình SECRET_KEY
     app.config.from_mapping(
-        SECRET_KEY='dev', # Cần thay đổi key này bằng một chuỗi ngẫu nhiên khi triển khai thực tế
+        # Cần đặt biến môi trường SECRET_KEY bằng một chuỗi ngẫu nhiên khi triển khai thực tế:
+        # key này ký cả session cookie chứa id người học (xem app/users.py)
+        SECRET_KEY=os.environ.get('SECRET_KEY', 'dev'),
     )
 
     # Đảm bảo thư mục instance tồn tại
@@ -17,6 +19,18 @@ def create_app():
     except OSError:
         pass
 
+    # Đo thời gian request/câu lệnh SQL và endpoint /metrics
+    from . import metrics
+    metrics.init_app(app)
+
+    # Static có hash nội dung và bản nén sẵn (asset_url() trong template)
+    from . import assets
+    assets.init_app(app)
+
+    # Chia truy vấn chỉ đọc sang các replica (DATABASE_REPLICA_URLS)
+    from . import db
+    db.init_app(app)
+
     # Đăng ký các Blueprints
     from .main import routes as main_routes
     app.register_blueprint(main_routes.bp)
@@ -28,4 +42,20 @@ def create_app():
     from .admin import routes as admin_routes
     app.register_blueprint(admin_routes.bp, url_prefix='/admin')
 
+    # Id người học lưu trong session cookie (tiến độ SRS riêng cho từng người)
+    from . import users
+    users.init_app(app)
+
+    # Hàng đợi job chạy nền cho các thao tác admin nặng
+    from . import jobs
+    jobs.init_app(app)
+
+    # Lệnh `flask migrate` chạy các migration của schema database
+    from . import migrations
+    migrations.init_app(app)
+
+    # Cache bản dịch và lệnh `flask seed-translations`
+    from . import translation
+    translation.init_app(app)
+
     return app
@@ -0,0 +1,84 @@
+import csv
+import io
+
+import psycopg2.extras
+from app import jsonstream
+from app.db import db_connection
+
+# Xuất một bộ sưu tập (sao lưu, chuyển sang môi trường khác) theo kiểu streaming: dữ liệu được đọc bằng
+# server-side cursor và gửi đi theo từng chunk STREAM_ITERSIZE dòng, nên bộ nhớ không phụ thuộc số từ.
+#  - json: đúng định dạng import_data nhận ({"topics": [...], "vocabulary": [...]}), import lại được ngay;
+#    thứ tự chủ đề/từ trong file là thứ tự hiển thị nên được giữ nguyên khi import.
+#  - ndjson: mỗi dòng một object, chủ đề trước ("kind": "topic") rồi tới từ ("kind": "word").
+#  - csv: mỗi dòng một từ kèm tên/danh mục chủ đề, mở được bằng Excel/Google Sheets.
+# Không dùng COPY ... TO STDOUT: psycopg2 chỉ ghi COPY vào một file (không đọc dần được như generator)
+# và không chạy COPY ở chế độ gevent (xem app/db.py).
+EXPORT_FORMATS = {
+    # định dạng -> (mimetype, phần mở rộng file)
+    'json': ('application/json', 'json'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+TOPICS_QUERY = 'SELECT id, name, category FROM topics WHERE collection_id = %s ORDER BY position, id'
+WORDS_QUERY = '''
+    SELECT w.topic_id, w.word, w.ipa, w.type, w.meaning, w.example
+    FROM topics t JOIN words w ON w.topic_id = t.id
+    WHERE t.collection_id = %s
+    ORDER BY t.position, t.id, w.position, w.id
+'''
+CSV_QUERY = '''
+    SELECT w.topic_id, t.name AS topic_name, t.category AS topic_category,
+           w.word, w.ipa, w.type, w.meaning, w.example
+    FROM topics t JOIN words w ON w.topic_id = t.id
+    WHERE t.collection_id = %s
+    ORDER BY t.position, t.id, w.position, w.id
+'''
+CSV_COLUMNS = ('topic_id', 'topic_name', 'topic_category', 'word', 'ipa', 'type', 'meaning', 'example')
+
+
+def _begin_snapshot(conn):
+    # Chủ đề và từ được đọc trong cùng một snapshot: sửa đổi xen giữa không làm file lệch nhau
+    with conn.cursor() as cursor:
+        cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+
+
+def _iter_json(conn, collection):
+    yield b'{"collection":' + jsonstream.dumps({'name': collection['name']}) + b',"topics":'
+    yield from jsonstream.iter_json_array(conn, TOPICS_QUERY, (collection['id'],))
+    yield b',"vocabulary":'
+    yield from jsonstream.iter_json_array(conn, WORDS_QUERY, (collection['id'],))
+    yield b'}\n'
+
+
+def _iter_ndjson(conn, collection):
+    for kind, query in (('topic', TOPICS_QUERY), ('word', WORDS_QUERY)):
+        for rows in jsonstream.iter_row_chunks(conn, query, (collection['id'],),
+                                               cursor_factory=psycopg2.extras.RealDictCursor):
+            yield b''.join(jsonstream.dumps({'kind': kind, **row}) + b'\n' for row in rows)
+
+
+def _iter_csv(conn, collection):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(CSV_COLUMNS)
+    # BOM để Excel nhận đúng UTF-8 (chữ tiếng Việt)
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+    for rows in jsonstream.iter_row_chunks(conn, CSV_QUERY, (collection['id'],)):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+
+
+_WRITERS = {'json': _iter_json, 'ndjson': _iter_ndjson, 'csv': _iter_csv}
+
+
+def stream_collection(collection, fmt):
+    """
+    Sinh ra nội dung file xuất của `collection` (dict có id, name) theo định dạng `fmt` (khóa của EXPORT_FORMATS).
+    Kết nối database được giữ tới khi generator chạy hết hoặc bị close().
+    """
+    with db_connection(readonly=True) as conn:
+        _begin_snapshot(conn)
+        yield from _WRITERS[fmt](conn, collection)
@@ -0,0 +1,262 @@
+import csv
+import io
+import json
+import os
+import tempfile
+
+import psycopg2.extras
+from app.catalog import bump_catalog_version
+from app.db import cooperative
+
+try:
+    import ijson # Không bắt buộc: đọc file JSON theo kiểu streaming thay vì nạp cả file vào bộ nhớ
+except ImportError:
+    ijson = None
+
+# Số từ mỗi lần COPY vào database
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 5000))
+# Số lỗi tối đa được báo lại cho admin (các lỗi sau chỉ được đếm)
+MAX_REPORTED_ERRORS = 10
+
+WORD_COLUMNS = ('topic_id', 'word', 'ipa', 'type', 'meaning', 'example', 'position')
+
+
+class ImportValidationError(Exception):
+    """File import có dòng không hợp lệ. `errors` là danh sách thông báo lỗi theo từng dòng."""
+
+    def __init__(self, errors, error_count):
+        self.errors = errors
+        self.error_count = error_count
+        super().__init__(f"{error_count} dòng không hợp lệ")
+
+
+class _ErrorCollector:
+    def __init__(self):
+        self.errors = []
+        self.count = 0
+
+    def add(self, message):
+        self.count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+
+def _json_root_error():
+    return ImportValidationError(['File JSON phải là một object có các khóa "topics" và "vocabulary".'], 1)
+
+
+def _json_arrays(stream):
+    """
+    Trả về (danh sách chủ đề, iterator các từ) từ hai mảng "topics" và "vocabulary" ở gốc file JSON; báo
+    ImportValidationError nếu gốc không phải object có hai mảng đó.
+    Với ijson file chỉ được đọc một lần: các từ được sinh ra dần trong lúc ghi nên bộ nhớ không phụ thuộc kích thước
+    file (nếu "vocabulary" đứng trước "topics" thì các từ được ghi tạm ra file). Khi đó thiếu "vocabulary" chỉ
+    được phát hiện lúc duyệt hết iterator các từ.
+    """
+    if ijson is None:
+        data = json.load(stream)
+        if not isinstance(data, dict) or not all(isinstance(data.get(key), list) for key in ('topics', 'vocabulary')):
+            raise _json_root_error()
+        return data['topics'], iter(data['vocabulary'])
+
+    events = ijson.parse(stream, use_float=True)
+    if next(events, (None, None, None))[1] != 'start_map':
+        raise _json_root_error()
+    spool = None
+    for key, event in _root_entries(events):
+        if key in ('topics', 'vocabulary') and event != 'start_array':
+            raise _json_root_error()
+        if key == 'topics':
+            topics = list(_array_items(events))
+            return topics, (_vocabulary_items(events) if spool is None else _spooled_items(spool))
+        if key == 'vocabulary' and spool is None:
+            spool = tempfile.TemporaryFile('w+', encoding='utf-8')
+            for item in _array_items(events):
+                spool.write(json.dumps(item) + '\n')
+        else:
+            _skip_value(events, event)
+    raise _json_root_error()
+
+
+def _root_entries(events):
+    """(khóa, sự kiện mở đầu giá trị) của từng mục ở gốc object; người gọi phải đọc hết giá trị trước mục sau."""
+    for _, event, value in events:
+        if event != 'map_key':
+            return # end_map của gốc
+        yield value, next(events)[1]
+
+
+def _array_items(events):
+    """Các phần tử của mảng vừa mở (sau sự kiện start_array), dựng lại từ các sự kiện của ijson.parse()."""
+    depth = 0
+    for _, event, value in events:
+        if depth == 0:
+            if event == 'end_array':
+                return
+            builder = ijson.common.ObjectBuilder()
+        builder.event(event, value)
+        if event in ('start_map', 'start_array'):
+            depth += 1
+        elif event in ('end_map', 'end_array'):
+            depth -= 1
+        if depth == 0:
+            yield builder.value
+
+
+def _skip_value(events, event):
+    depth = 1 if event in ('start_map', 'start_array') else 0
+    while depth:
+        event = next(events)[1]
+        if event in ('start_map', 'start_array'):
+            depth += 1
+        elif event in ('end_map', 'end_array'):
+            depth -= 1
+
+
+def _vocabulary_items(events):
+    for key, event in _root_entries(events):
+        if key == 'vocabulary':
+            if event != 'start_array':
+                raise _json_root_error()
+            yield from _array_items(events)
+            return
+        _skip_value(events, event)
+    raise _json_root_error()
+
+
+def _spooled_items(spool):
+    with spool:
+        spool.seek(0)
+        for line in spool:
+            yield json.loads(line)
+
+
+def _text(value):
+    return '' if value is None else str(value)
+
+
+def _required_text(item, field):
+    value = item.get(field)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    return str(value)
+
+
+def _insert_topics(cursor, collection_id, topics, errors):
+    """Thêm toàn bộ chủ đề bằng một câu INSERT nhiều dòng. Trả về dict id trong file -> id mới."""
+    rows = []
+    file_ids = []
+    seen_ids = set()
+    for index, topic in enumerate(topics):
+        label = f'Chủ đề #{index + 1}'
+        if not isinstance(topic, dict):
+            errors.add(f'{label}: phải là một object.')
+            continue
+        name = _required_text(topic, 'name')
+        category = _required_text(topic, 'category')
+        topic_id = topic.get('id')
+        if not isinstance(topic_id, (int, str)):
+            errors.add(f'{label}: thiếu trường "id" hoặc id không hợp lệ.')
+            topic_id = None
+        elif topic_id in seen_ids:
+            errors.add(f'{label}: trùng id {topic_id!r} với một chủ đề khác.')
+        if name is None:
+            errors.add(f'{label}: thiếu trường "name".')
+        if category is None:
+            errors.add(f'{label}: thiếu trường "category".')
+        if topic_id is None or topic_id in seen_ids or name is None or category is None:
+            continue
+        seen_ids.add(topic_id)
+        # position là thứ tự trong file, duy nhất trong bộ sưu tập mới nên dùng để ghép lại với id mới
+        rows.append((name, category, len(rows), collection_id))
+        file_ids.append(topic_id)
+
+    if errors.count or not rows:
+        return {}
+    inserted = psycopg2.extras.execute_values(
+        cursor,
+        'INSERT INTO topics (name, category, position, collection_id) VALUES %s RETURNING id, position',
+        rows, page_size=IMPORT_BATCH_SIZE, fetch=True
+    )
+    return {file_ids[row['position']]: row['id'] for row in inserted}
+
+
+def _copy_words(cursor, buffer):
+    buffer.seek(0)
+    if cooperative():
+        # psycopg2 ở chế độ green (worker gevent) không hỗ trợ COPY: ghi bằng INSERT nhiều dòng
+        psycopg2.extras.execute_values(cursor, f"INSERT INTO words ({', '.join(WORD_COLUMNS)}) VALUES %s",
+                                       list(csv.reader(buffer)), page_size=1000)
+    else:
+        cursor.copy_expert(f"COPY words ({', '.join(WORD_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    buffer.seek(0)
+    buffer.truncate()
+
+
+def _insert_words(cursor, topic_ids, words, errors, progress):
+    """Ghi các từ bằng COPY theo từng lô IMPORT_BATCH_SIZE dòng. Trả về số từ đã thêm."""
+    buffer = io.StringIO()
+    # QUOTE_ALL để chuỗi rỗng được ghi là '' chứ không thành NULL
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator='\n')
+    word_positions = {}
+    pending = 0
+    total = 0
+    for index, word in enumerate(words):
+        label = f'Từ #{index + 1}'
+        if not isinstance(word, dict):
+            errors.add(f'{label}: phải là một object.')
+            continue
+        text = _required_text(word, 'word')
+        meaning = _required_text(word, 'meaning')
+        if text is not None:
+            label += f' ({text})'
+        file_topic_id = word.get('topic_id')
+        topic_id = topic_ids.get(file_topic_id) if isinstance(file_topic_id, (int, str)) else None
+        if text is None:
+            errors.add(f'{label}: thiếu trường "word".')
+        if meaning is None:
+            errors.add(f'{label}: thiếu trường "meaning".')
+        if topic_id is None:
+            errors.add(f'{label}: topic_id {file_topic_id!r} không khớp với chủ đề nào trong file.')
+        if errors.count:
+            continue # Đã có lỗi thì import sẽ bị hủy: chỉ kiểm tra tiếp để báo đủ lỗi
+
+        position = word_positions.get(topic_id, 0)
+        word_positions[topic_id] = position + 1
+        writer.writerow((topic_id, text, _text(word.get('ipa')), _text(word.get('type')), meaning,
+                         _text(word.get('example')), position))
+        pending += 1
+        if pending >= IMPORT_BATCH_SIZE:
+            _copy_words(cursor, buffer)
+            total += pending
+            pending = 0
+            if progress is not None:
+                progress(total)
+
+    if pending and not errors.count:
+        _copy_words(cursor, buffer)
+        total += pending
+    return total
+
+
+def import_collection(cursor, collection_name, stream, progress=None):
+    """
+    Tạo bộ sưu tập `collection_name` từ file JSON {"topics": [...], "vocabulary": [...]}.
+    Chạy trong transaction của `cursor` (dạng dictionary): nếu có dòng không hợp lệ thì báo
+    ImportValidationError và người gọi rollback, không có gì được ghi.
+    `progress(số từ đã ghi)` (nếu có) được gọi sau mỗi lô COPY.
+    Trả về (số chủ đề, số từ) đã thêm.
+    """
+    topics, words = _json_arrays(stream)
+    errors = _ErrorCollector()
+
+    cursor.execute('INSERT INTO collections (name) VALUES (%s) RETURNING id', (collection_name,))
+    collection_id = cursor.fetchone()['id']
+
+    topic_ids = _insert_topics(cursor, collection_id, topics, errors)
+    word_count = _insert_words(cursor, topic_ids, words, errors, progress)
+    if errors.count:
+        raise ImportValidationError(errors.errors, errors.count)
+
+    bump_catalog_version(cursor)
+    return len(topic_ids), word_count
@@ -0,0 +1,93 @@
+# Phân trang và lọc cho các danh sách của trang admin (bộ sưu tập, chủ đề, từ vựng).
+# Phân trang keyset: ?after=<giá trị các cột sắp xếp của dòng cuối trang trước, cách nhau bởi dấu phẩy>
+# (ví dụ 12,345 = position,id), trang sau bắt đầu ngay sau các giá trị đó theo thứ tự hiển thị, nên chỉ đọc
+# đúng một trang qua index thay vì OFFSET (đọc lại mọi dòng phía trước). Cursor chứa sẵn giá trị sắp xếp
+# nên vẫn đúng khi dòng đó đã bị xóa hoặc di chuyển giữa hai lần tải trang. Các cột sắp xếp phải NOT NULL
+# (migration 0012): giá trị NULL không mã hóa được vào cursor và bị phép so sánh keyset bỏ qua.
+# Lọc: ?q=<chữ cần tìm>, không phân biệt hoa thường và dấu (fold_text(), migration 0006).
+import os
+from datetime import datetime
+
+PAGE_SIZE = int(os.environ.get('ADMIN_PAGE_SIZE', 100)) # Số dòng mỗi trang danh sách admin
+
+
+def read_args(request):
+    """(q, after) từ query string của request; after rỗng thì là None (trang đầu)."""
+    return request.args.get('q', '').strip(), request.args.get('after') or None
+
+
+def _encode_cursor(row, order):
+    return ','.join(row[column].isoformat() if isinstance(row[column], datetime) else str(row[column])
+                    for column in order)
+
+
+def _decode_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        return datetime.fromisoformat(text)
+
+
+def _decode_cursor(after, order):
+    """Giá trị các cột `order` trong cursor `after`, hoặc None (trang đầu) nếu cursor sai định dạng."""
+    if after is None:
+        return None
+    parts = after.split(',')
+    if len(parts) != len(order):
+        return None
+    try:
+        return tuple(_decode_value(part) for part in parts)
+    except ValueError:
+        return None
+
+
+def _like_pattern(text):
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def _conditions(where, params, search_columns, q):
+    if q and search_columns:
+        match = ' OR '.join(f'fold_text({column}) LIKE fold_text(%s)' for column in search_columns)
+        where = f'{where} AND ({match})'
+        params = params + (_like_pattern(q),) * len(search_columns)
+    return where, params
+
+
+def _anchor(order, descending, comparison):
+    columns = ', '.join(order)
+    operator = {'after': '<' if descending else '>', 'through': '>=' if descending else '<='}[comparison]
+    return f" AND ({columns}) {operator} ({', '.join(['%s'] * len(order))})"
+
+
+def fetch_page(cursor, table, where, params, order, after=None, search_columns=(), q='', descending=False,
+               limit=PAGE_SIZE):
+    """
+    Một trang các dòng của `table` thỏa `where` (và khớp `q` ở một trong `search_columns`), theo thứ tự
+    các cột `order` (cột cuối phải là id), bắt đầu sau cursor `after`.
+    Trả về (rows, next_after); next_after là cursor của trang sau, None ở trang cuối.
+    """
+    where, params = _conditions(where, params, search_columns, q)
+    anchor = _decode_cursor(after, order)
+    if anchor is not None:
+        where += _anchor(order, descending, 'after')
+        params = params + anchor
+    direction = ' DESC' if descending else ''
+    cursor.execute(f"SELECT * FROM {table} WHERE {where} ORDER BY {', '.join(c + direction for c in order)} LIMIT %s",
+                   params + (limit + 1,))
+    rows = cursor.fetchall()
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = _encode_cursor(rows[-1], order)
+    return rows, next_after
+
+
+def count_before(cursor, table, where, params, order, after):
+    """Số dòng (không lọc) đứng trước trang bắt đầu sau cursor `after`: vị trí tuyệt đối của dòng đầu trang."""
+    anchor = _decode_cursor(after, order)
+    if anchor is None:
+        return 0
+    cursor.execute(f'SELECT COUNT(*) AS n FROM {table} WHERE {where}' + _anchor(order, False, 'through'),
+                   params + anchor)
+    return cursor.fetchone()['n']
@@ -0,0 +1,94 @@
+# Sắp xếp lại chủ đề/từ vựng bằng các câu lệnh theo tập hợp thay vì một UPDATE cho mỗi dòng.
+# Thứ tự hiển thị là (position, id) trong phạm vi bảng cha.
+
+# bảng -> (bảng cha, cột khóa ngoại tới bảng cha)
+ORDERED_TABLES = {
+    'topics': ('collections', 'collection_id'),
+    'words': ('topics', 'topic_id'),
+}
+
+
+class OrderingError(ValueError):
+    """Danh sách sắp xếp không hợp lệ (id trùng lặp hoặc không thuộc bảng cha)."""
+
+
+def _lock_parent(cursor, table, parent_id):
+    # Khóa dòng cha để các lần sắp xếp cùng một danh sách chạy lần lượt
+    parent_table, _ = ORDERED_TABLES[table]
+    cursor.execute(f'SELECT id FROM {parent_table} WHERE id = %s FOR UPDATE', (parent_id,))
+    return cursor.fetchone() is not None
+
+
+def reorder(cursor, table, parent_id, ordered_ids):
+    """
+    Gán position = thứ tự trong `ordered_ids` bằng một câu UPDATE ... FROM unnest() WITH ORDINALITY.
+    Mọi id phải thuộc `parent_id`, ngược lại báo OrderingError. Chỉ các dòng đổi vị trí mới bị ghi.
+    Trả về số dòng đã đổi.
+    """
+    _, parent_column = ORDERED_TABLES[table]
+    if len(set(ordered_ids)) != len(ordered_ids):
+        raise OrderingError('Danh sách sắp xếp có id bị trùng.')
+    if not _lock_parent(cursor, table, parent_id):
+        raise OrderingError('Danh sách cần sắp xếp không tồn tại.')
+
+    cursor.execute(f'SELECT COUNT(*) FROM {table} WHERE id = ANY(%s) AND {parent_column} = %s', (ordered_ids, parent_id))
+    if cursor.fetchone()[0] != len(ordered_ids):
+        raise OrderingError('Danh sách sắp xếp có id không thuộc danh sách này.')
+
+    cursor.execute(f'''
+        UPDATE {table} AS t SET position = o.ordinality - 1
+        FROM unnest(%s::INTEGER[]) WITH ORDINALITY AS o(id, ordinality)
+        WHERE t.id = o.id AND t.{parent_column} = %s AND t.position IS DISTINCT FROM o.ordinality - 1
+    ''', (ordered_ids, parent_id))
+    return cursor.rowcount
+
+
+def _normalize_positions(cursor, table, parent_id):
+    """Đánh lại position thành 0..n-1 theo thứ tự hiện tại nếu có khoảng trống, trùng lặp hoặc NULL (ví dụ sau khi xóa)."""
+    _, parent_column = ORDERED_TABLES[table]
+    cursor.execute(f'''
+        UPDATE {table} AS t SET position = r.new_position
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (ORDER BY position, id) - 1 AS new_position
+            FROM {table} WHERE {parent_column} = %s
+        ) r
+        WHERE t.id = r.id AND t.position IS DISTINCT FROM r.new_position
+    ''', (parent_id,))
+    return cursor.rowcount
+
+
+def move(cursor, table, item_id, new_position):
+    """
+    Chuyển một dòng tới vị trí `new_position` (tính từ 0) trong danh sách của nó:
+    chỉ dịch các dòng nằm giữa vị trí cũ và mới thay vì ghi lại cả danh sách.
+    Trả về số dòng đã đổi, hoặc None nếu không tìm thấy dòng.
+    """
+    _, parent_column = ORDERED_TABLES[table]
+    cursor.execute(f'SELECT {parent_column} FROM {table} WHERE id = %s', (item_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    parent_id = row[0]
+    _lock_parent(cursor, table, parent_id)
+
+    changed = _normalize_positions(cursor, table, parent_id)
+    cursor.execute(f'SELECT position, (SELECT COUNT(*) FROM {table} WHERE {parent_column} = %s) FROM {table} WHERE id = %s',
+                   (parent_id, item_id))
+    old_position, count = cursor.fetchone()
+    new_position = min(max(new_position, 0), count - 1)
+    if new_position == old_position:
+        return changed
+
+    if new_position < old_position:
+        cursor.execute(f'''
+            UPDATE {table} SET position = position + 1
+            WHERE {parent_column} = %s AND position >= %s AND position < %s
+        ''', (parent_id, new_position, old_position))
+    else:
+        cursor.execute(f'''
+            UPDATE {table} SET position = position - 1
+            WHERE {parent_column} = %s AND position > %s AND position <= %s
+        ''', (parent_id, old_position, new_position))
+    changed += cursor.rowcount
+    cursor.execute(f'UPDATE {table} SET position = %s WHERE id = %s', (new_position, item_id))
+    return changed + 1
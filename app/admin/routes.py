@@ -1,74 +1,61 @@
 import psycopg2
 import psycopg2.extras # Thêm thư viện này
-import json
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
-from app.db import get_db_connection
+from werkzeug.utils import secure_filename
+from app.db import db_cursor
+from app.catalog import bump_catalog_version
+from app import jobs, jsonstream, translation
+from app.admin import exporter, listing, ordering, tasks
 
 bp = Blueprint('admin', __name__, url_prefix='/admin', template_folder='templates')
 
 # --- Collection Management ---
 @bp.route('/')
 def manage_collections():
-    conn = None
-    cursor = None
+    q, after = listing.read_args(request)
+    next_after = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        cursor.execute('SELECT * FROM collections ORDER BY created_at DESC')
-        collections = cursor.fetchall()
+        with db_cursor(psycopg2.extras.RealDictCursor, readonly=True) as cursor:
+            # topic_count/word_count là cột bộ đếm (migration 0009), không cần đếm lại các bảng con
+            collections, next_after = listing.fetch_page(cursor, 'collections', 'TRUE', (), ('created_at', 'id'),
+                                                         after, search_columns=('name',), q=q, descending=True)
+        recent_jobs = jobs.recent_jobs()
     except (Exception, psycopg2.DatabaseError) as e:
         flash(f'Lỗi khi tải bộ sưu tập: {e}', 'error')
         collections = []
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
-        
-    return render_template('admin/manage_collections.html', collections=collections)
+        recent_jobs = []
+
+    return render_template('admin/manage_collections.html', collections=collections,
+                           recent_jobs=recent_jobs, job_titles=tasks.JOB_TITLES,
+                           q=q, after=after, next_after=next_after)
 
 @bp.route('/collections/delete/<int:id>', methods=['POST'])
 def delete_collection(id):
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        # %s là cú pháp của psycopg2 (thay cho ?)
-        cursor.execute('DELETE FROM collections WHERE id = %s', (id,))
-        conn.commit()
-        flash('Bộ sưu tập và tất cả dữ liệu liên quan đã được xóa.', 'success')
+        # Xóa dây chuyền toàn bộ chủ đề/từ có thể mất nhiều thời gian: chạy nền
+        job_id = jobs.enqueue(tasks.DELETE_COLLECTION, {'collection_id': id})
+        flash(f'Đang xóa bộ sưu tập (công việc #{job_id}). Trang sẽ tự cập nhật khi hoàn tất.', 'success')
     except (Exception, psycopg2.DatabaseError) as e:
-        if conn: conn.rollback()
         flash(f'Lỗi khi xóa bộ sưu tập: {e}', 'error')
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
-        
+
     return redirect(url_for('admin.manage_collections'))
 
 @bp.route('/collections/toggle-visibility/<int:id>', methods=['POST'])
 def toggle_visibility(id):
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        cursor.execute('SELECT is_visible FROM collections WHERE id = %s', (id,))
-        current_status_row = cursor.fetchone()
-        
-        if current_status_row is None:
-            return jsonify({'status': 'error', 'message': 'Không tìm thấy bộ sưu tập.'}), 404
-        
-        new_status = 0 if current_status_row['is_visible'] == 1 else 1
-        cursor.execute('UPDATE collections SET is_visible = %s WHERE id = %s', (new_status, id))
-        conn.commit()
+        with db_cursor(psycopg2.extras.RealDictCursor) as cursor:
+            cursor.execute('SELECT is_visible FROM collections WHERE id = %s', (id,))
+            current_status_row = cursor.fetchone()
+
+            if current_status_row is None:
+                return jsonify({'status': 'error', 'message': 'Không tìm thấy bộ sưu tập.'}), 404
+
+            new_status = 0 if current_status_row['is_visible'] == 1 else 1
+            cursor.execute('UPDATE collections SET is_visible = %s WHERE id = %s', (new_status, id))
+            bump_catalog_version(cursor)
         return jsonify({'status': 'success', 'new_status': 'Hiển thị' if new_status == 1 else 'Đã ẩn', 'is_visible': new_status})
     except (Exception, psycopg2.DatabaseError) as e:
-        if conn: conn.rollback()
         return jsonify({'status': 'error', 'message': f'Lỗi cơ sở dữ liệu: {e}'}), 500
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 # --- Import Logic ---
 @bp.route('/import-data', methods=['POST'])
@@ -85,87 +72,81 @@ def import_data():
         return redirect(url_for('admin.manage_collections'))
 
     if file and file.filename.endswith('.json'):
-        conn = get_db_connection() # Bắt đầu kết nối
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) # Dùng cursor dict
         try:
-            data = json.load(file.stream)
-            topics_data = data.get('topics', [])
-            vocabulary_data = data.get('vocabulary', [])
-            
-            # Bắt đầu Transaction (PostgreSQL tự xử lý, chỉ cần commit/rollback)
-            
-            # Sửa: Dùng RETURNING id để lấy ID vừa chèn
-            cursor.execute('INSERT INTO collections (name) VALUES (%s) RETURNING id', (collection_name,))
-            collection_id = cursor.fetchone()['id'] # Lấy ID
-            
-            old_id_to_new_id = {}
-            for index, topic in enumerate(topics_data):
-                old_topic_id = topic['id']
-                cursor.execute(
-                    'INSERT INTO topics (name, category, position, collection_id) VALUES (%s, %s, %s, %s) RETURNING id',
-                    (topic['name'], topic['category'], index, collection_id)
-                )
-                new_topic_id = cursor.fetchone()['id'] # Lấy ID
-                old_id_to_new_id[old_topic_id] = new_topic_id
-
-            word_positions = {}
-            for word in vocabulary_data:
-                old_topic_id = word.get('topic_id')
-                if old_topic_id in old_id_to_new_id:
-                    new_topic_id = old_id_to_new_id[old_topic_id]
-                    current_pos = word_positions.get(new_topic_id, 0)
-                    cursor.execute(
-                        'INSERT INTO words (topic_id, word, ipa, type, meaning, example, position) VALUES (%s, %s, %s, %s, %s, %s, %s)',
-                        (new_topic_id, word['word'], word.get('ipa', ''), word.get('type', ''), word['meaning'], word.get('example', ''), current_pos)
-                    )
-                    word_positions[new_topic_id] = current_pos + 1
-
-            conn.commit() # Commit khi mọi thứ thành công
-            flash(f'Import thành công bộ sưu tập "{collection_name}"!', 'success')
-
-        except psycopg2.IntegrityError: # Sửa: Lỗi Integrity của psycopg2
-            if conn: conn.rollback()
-            flash(f'Tên bộ sưu tập "{collection_name}" đã tồn tại. Vui lòng chọn tên khác.', 'error')
-        except (Exception, psycopg2.DatabaseError) as e: # Sửa: Lỗi chung
-            if conn: conn.rollback()
+            # Import chạy nền: request trả về ngay, tiến độ hiển thị ở danh sách công việc
+            job_id = jobs.enqueue(tasks.IMPORT_COLLECTION, {'collection_name': collection_name}, upload=file.stream)
+            flash(f'Đang import bộ sưu tập "{collection_name}" (công việc #{job_id}). Trang sẽ tự cập nhật khi hoàn tất.', 'success')
+        except (Exception, psycopg2.DatabaseError) as e:
             flash(f'Đã xảy ra lỗi: {e}', 'error')
-        finally:
-            if cursor: cursor.close()
-            if conn: conn.close()
     else:
         flash('Vui lòng upload file có định dạng .json', 'error')
 
     return redirect(url_for('admin.manage_collections'))
 
+# --- Export ---
+@bp.route('/collections/<int:id>/export')
+def export_collection(id):
+    """
+    Tải bộ sưu tập về dạng file (?format=json|ndjson|csv, mặc định json: import lại được bằng import_data).
+    File được gửi theo từng chunk trong lúc đọc database nên bộ sưu tập lớn không bị dựng sẵn trong bộ nhớ.
+    """
+    fmt = request.args.get('format', 'json')
+    if fmt not in exporter.EXPORT_FORMATS:
+        flash(f'Định dạng xuất không hợp lệ: {fmt}', 'error')
+        return redirect(url_for('admin.manage_collections'))
+    try:
+        with db_cursor(psycopg2.extras.RealDictCursor, readonly=True) as cursor:
+            cursor.execute('SELECT id, name FROM collections WHERE id = %s', (id,))
+            collection = cursor.fetchone()
+    except (Exception, psycopg2.DatabaseError) as e:
+        flash(f'Lỗi khi xuất bộ sưu tập: {e}', 'error')
+        return redirect(url_for('admin.manage_collections'))
+    if collection is None:
+        flash('Bộ sưu tập không tồn tại.', 'error')
+        return redirect(url_for('admin.manage_collections'))
+
+    mimetype, extension = exporter.EXPORT_FORMATS[fmt]
+    chunks = exporter.stream_collection(collection, fmt)
+    if 'gzip' in request.accept_encodings:
+        response = current_app.response_class(jsonstream.gzip_chunks(chunks), mimetype=mimetype)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = current_app.response_class(chunks, mimetype=mimetype)
+    filename = f"{secure_filename(collection['name']) or 'collection'}-{id}.{extension}"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    response.vary.add('Accept-Encoding')
+    return response
+
 # --- Topic Management ---
 @bp.route('/collection/<int:collection_id>/topics')
 def manage_topics(collection_id):
-    conn = None
-    cursor = None
+    q, after = listing.read_args(request)
+    collection = None
+    topics, next_after, offset = [], None, 0
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        collection = cursor.execute('SELECT * FROM collections WHERE id = %s', (collection_id,)).fetchone()
-        if not collection:
-            flash('Bộ sưu tập không tồn tại.', 'error')
-            return redirect(url_for('admin.manage_collections'))
-            
-        cursor.execute('SELECT * FROM topics WHERE collection_id = %s ORDER BY position, id', (collection_id,))
-        topics = cursor.fetchall()
-        
+        with db_cursor(psycopg2.extras.RealDictCursor, readonly=True) as cursor:
+            cursor.execute('SELECT * FROM collections WHERE id = %s', (collection_id,))
+            collection = cursor.fetchone()
+            if not collection:
+                flash('Bộ sưu tập không tồn tại.', 'error')
+                return redirect(url_for('admin.manage_collections'))
+
+            topics, next_after = listing.fetch_page(cursor, 'topics', 'collection_id = %s', (collection_id,),
+                                                    ('position', 'id'), after, search_columns=('name', 'category'), q=q)
+            # Kéo thả gửi vị trí trong cả danh sách: cần vị trí của dòng đầu trang
+            offset = listing.count_before(cursor, 'topics', 'collection_id = %s', (collection_id,),
+                                          ('position', 'id'), after)
+
     except (Exception, psycopg2.DatabaseError) as e:
         flash(f'Lỗi khi tải chủ đề: {e}', 'error')
-        topics = []
         collection = None # Đảm bảo collection không bị lỗi
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
-        
+
     if collection is None: # Kiểm tra lại sau khi đóng kết nối
         return redirect(url_for('admin.manage_collections'))
-        
-    return render_template('admin/manage_topics.html', topics=topics, collection=collection)
+
+    return render_template('admin/manage_topics.html', topics=topics, collection=collection,
+                           q=q, after=after, next_after=next_after, offset=offset)
 
 @bp.route('/collection/<int:collection_id>/topics/add', methods=['POST'])
 def add_topic(collection_id):
@@ -174,145 +155,137 @@ def add_topic(collection_id):
     if not name or not category:
         flash('Tên chủ đề và danh mục không được để trống.', 'error')
     else:
-        conn = None
-        cursor = None
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT MAX(position) FROM topics WHERE collection_id = %s', (collection_id,))
-            max_pos_row = cursor.fetchone()
-            
-            max_pos = max_pos_row[0] if max_pos_row[0] is not None else -1
-            new_pos = max_pos + 1
-            
-            cursor.execute('INSERT INTO topics (name, category, position, collection_id) VALUES (%s, %s, %s, %s)', 
-                           (name, category, new_pos, collection_id))
-            conn.commit()
+            with db_cursor() as cursor:
+                cursor.execute('SELECT MAX(position) FROM topics WHERE collection_id = %s', (collection_id,))
+                max_pos_row = cursor.fetchone()
+
+                max_pos = max_pos_row[0] if max_pos_row[0] is not None else -1
+                new_pos = max_pos + 1
+
+                cursor.execute('INSERT INTO topics (name, category, position, collection_id) VALUES (%s, %s, %s, %s)',
+                               (name, category, new_pos, collection_id))
+                bump_catalog_version(cursor)
             flash('Chủ đề đã được thêm thành công!', 'success')
         except (Exception, psycopg2.DatabaseError) as e:
-            if conn: conn.rollback()
             flash(f'Lỗi khi thêm chủ đề: {e}', 'error')
-        finally:
-            if cursor: cursor.close()
-            if conn: conn.close()
-            
+
     return redirect(url_for('admin.manage_topics', collection_id=collection_id))
 
 @bp.route('/topics/edit/<int:id>', methods=['GET', 'POST'])
 def edit_topic(id):
-    conn = None
-    cursor = None
     topic = None # Khai báo topic
-    
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        if request.method == 'POST':
-            name = request.form['name']
-            category = request.form['category']
-            cursor.execute('UPDATE topics SET name = %s, category = %s WHERE id = %s', (name, category, id))
-            conn.commit()
-            
-            # Lấy lại collection_id để redirect
-            cursor.execute('SELECT collection_id FROM topics WHERE id = %s', (id,))
-            topic = cursor.fetchone()
-            
+        with db_cursor(psycopg2.extras.RealDictCursor) as cursor:
+            if request.method == 'POST':
+                name = request.form['name']
+                category = request.form['category']
+                cursor.execute('UPDATE topics SET name = %s, category = %s WHERE id = %s', (name, category, id))
+                bump_catalog_version(cursor)
+
+                # Lấy lại collection_id để redirect
+                cursor.execute('SELECT collection_id FROM topics WHERE id = %s', (id,))
+                topic = cursor.fetchone()
+            else:
+                # Cho GET request
+                cursor.execute('SELECT * FROM topics WHERE id = %s', (id,))
+                topic = cursor.fetchone()
+
+        if request.method == 'POST' and topic is not None:
             flash('Chủ đề đã được cập nhật thành công!', 'success')
             return redirect(url_for('admin.manage_topics', collection_id=topic['collection_id']))
-        
-        # Cho GET request
-        topic = cursor.execute('SELECT * FROM topics WHERE id = %s', (id,)).fetchone()
-        
+
     except (Exception, psycopg2.DatabaseError) as e:
-        if conn and request.method == 'POST': conn.rollback()
         flash(f'Lỗi khi sửa chủ đề: {e}', 'error')
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
+        topic = None
 
     if topic is None:
         flash('Không tìm thấy chủ đề này.', 'error')
         return redirect(url_for('admin.manage_collections'))
-        
+
     return render_template('admin/edit_topic.html', topic=topic)
 
 @bp.route('/topics/delete/<int:id>', methods=['POST'])
 def delete_topic(id):
     collection_id = None
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        topic = cursor.execute('SELECT collection_id FROM topics WHERE id = %s', (id,)).fetchone()
-        collection_id = topic['collection_id'] if topic else None
-        
-        cursor.execute('DELETE FROM topics WHERE id = %s', (id,))
-        conn.commit()
+        with db_cursor(psycopg2.extras.RealDictCursor) as cursor:
+            cursor.execute('SELECT collection_id FROM topics WHERE id = %s', (id,))
+            topic = cursor.fetchone()
+            collection_id = topic['collection_id'] if topic else None
+
+            cursor.execute('DELETE FROM topics WHERE id = %s', (id,))
+            bump_catalog_version(cursor)
         flash('Chủ đề và các từ vựng liên quan đã được xóa.', 'success')
     except (Exception, psycopg2.DatabaseError) as e:
-        if conn: conn.rollback()
         flash(f'Lỗi khi xóa chủ đề: {e}', 'error')
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
-        
+
     if collection_id:
         return redirect(url_for('admin.manage_topics', collection_id=collection_id))
     return redirect(url_for('admin.manage_collections'))
 
 
-@bp.route('/topics/reorder', methods=['POST'])
-def reorder_topics():
-    data = request.get_json()
+def _json_int(value):
+    """Số nguyên trong body JSON (số hoặc chuỗi số); None nếu thiếu hoặc sai kiểu."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return None
+    return None
+
+def _reorder(kind, parent_key):
+    """Đưa yêu cầu sắp xếp {"<parent_key>": id, "ordered_ids": [...]} vào hàng đợi job."""
+    data = request.get_json(silent=True)
+    data = data if isinstance(data, dict) else {}
+    parent_id = _json_int(data.get(parent_key))
     ordered_ids = data.get('ordered_ids')
-    conn = None
-    cursor = None
+    if isinstance(ordered_ids, list):
+        ordered_ids = [_json_int(x) for x in ordered_ids]
+    if parent_id is None or not isinstance(ordered_ids, list) or None in ordered_ids:
+        return jsonify({'status': 'error', 'message': f'Cần {parent_key} và ordered_ids (danh sách id) hợp lệ.'}), 400
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        for index, topic_id in enumerate(ordered_ids):
-            cursor.execute('UPDATE topics SET position = %s WHERE id = %s', (index, int(topic_id)))
-        conn.commit()
-        return jsonify({'status': 'success', 'message': 'Thứ tự chủ đề đã được cập nhật.'})
+        # Các lần sắp xếp liên tiếp được áp dụng đúng thứ tự gửi lên (cùng serial_key)
+        job_id = jobs.enqueue(kind, {'parent_id': parent_id, 'ordered_ids': ordered_ids}, serial_key=kind)
+        return jsonify({'status': 'queued', 'job_id': job_id, 'status_url': url_for('admin.job_status', job_id=job_id)}), 202
     except (Exception, psycopg2.DatabaseError) as e:
-        if conn: conn.rollback()
-        return jsonify({'status': 'error', 'message': f'Lỗi cơ sở dữ liệu: {e}'})
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
+        return jsonify({'status': 'error', 'message': f'Lỗi cơ sở dữ liệu: {e}'}), 500
+
+@bp.route('/topics/reorder', methods=['POST'])
+def reorder_topics():
+    return _reorder(tasks.REORDER_TOPICS, 'collection_id')
 
 # --- Word Management ---
 @bp.route('/topic/<int:topic_id>/words')
 def manage_words(topic_id):
-    conn = None
-    cursor = None
+    q, after = listing.read_args(request)
     topic = None
-    words = []
+    words, next_after, offset = [], None, 0
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        topic = cursor.execute('SELECT t.*, c.name as collection_name FROM topics t JOIN collections c ON t.collection_id = c.id WHERE t.id = %s', (topic_id,)).fetchone()
-        if topic is None:
-            flash('Chủ đề không tồn tại.', 'error')
-            return redirect(url_for('admin.manage_collections'))
-            
-        words = cursor.execute('SELECT * FROM words WHERE topic_id = %s ORDER BY position, id', (topic_id,)).fetchall()
-        
+        with db_cursor(psycopg2.extras.RealDictCursor, readonly=True) as cursor:
+            cursor.execute('SELECT t.*, c.name as collection_name FROM topics t JOIN collections c ON t.collection_id = c.id WHERE t.id = %s', (topic_id,))
+            topic = cursor.fetchone()
+            if topic is None:
+                flash('Chủ đề không tồn tại.', 'error')
+                return redirect(url_for('admin.manage_collections'))
+
+            words, next_after = listing.fetch_page(cursor, 'words', 'topic_id = %s', (topic_id,), ('position', 'id'),
+                                                   after, search_columns=('word', 'meaning'), q=q)
+            offset = listing.count_before(cursor, 'words', 'topic_id = %s', (topic_id,), ('position', 'id'), after)
+
     except (Exception, psycopg2.DatabaseError) as e:
         flash(f'Lỗi khi tải từ vựng: {e}', 'error')
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
-        
+
     if topic is None: # Kiểm tra lại phòng trường hợp lỗi
         return redirect(url_for('admin.manage_collections'))
-        
-    return render_template('admin/manage_words.html', topic=topic, words=words)
+
+    return render_template('admin/manage_words.html', topic=topic, words=words,
+                           q=q, after=after, next_after=next_after, offset=offset)
 
 @bp.route('/topic/<int:topic_id>/words/add', methods=['POST'])
 def add_word(topic_id):
@@ -320,92 +293,75 @@ def add_word(topic_id):
     if not form_data.get('word') or not form_data.get('meaning'):
         flash('Từ và nghĩa không được để trống.', 'error')
     else:
-        conn = None
-        cursor = None
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            max_pos_row = cursor.execute('SELECT MAX(position) FROM words WHERE topic_id = %s', (topic_id,)).fetchone()
-            max_pos = max_pos_row[0] if max_pos_row[0] is not None else -1
-            new_pos = max_pos + 1
-            
-            cursor.execute(
-                'INSERT INTO words (topic_id, word, meaning, ipa, type, example, position) VALUES (%s, %s, %s, %s, %s, %s, %s)',
-                (topic_id, form_data['word'], form_data['meaning'], form_data.get('ipa'), form_data.get('type'), form_data.get('example'), new_pos)
-            )
-            conn.commit()
+            with db_cursor() as cursor:
+                cursor.execute('SELECT MAX(position) FROM words WHERE topic_id = %s', (topic_id,))
+                max_pos_row = cursor.fetchone()
+                max_pos = max_pos_row[0] if max_pos_row[0] is not None else -1
+                new_pos = max_pos + 1
+
+                cursor.execute(
+                    'INSERT INTO words (topic_id, word, meaning, ipa, type, example, position) VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id',
+                    (topic_id, form_data['word'], form_data['meaning'], form_data.get('ipa'), form_data.get('type'), form_data.get('example'), new_pos)
+                )
+                translation.seed_from_vocabulary(cursor, word_ids=[cursor.fetchone()[0]])
+                bump_catalog_version(cursor)
             flash('Từ mới đã được thêm thành công!', 'success')
         except (Exception, psycopg2.DatabaseError) as e:
-            if conn: conn.rollback()
             flash(f'Lỗi khi thêm từ: {e}', 'error')
-        finally:
-            if cursor: cursor.close()
-            if conn: conn.close()
-            
+
     return redirect(url_for('admin.manage_words', topic_id=topic_id))
 
 @bp.route('/words/edit/<int:word_id>', methods=['GET', 'POST'])
 def edit_word(word_id):
-    conn = None
-    cursor = None
     word = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        if request.method == 'POST':
-            form_data = request.form
-            cursor.execute(
-                'UPDATE words SET word = %s, meaning = %s, ipa = %s, type = %s, example = %s WHERE id = %s',
-                (form_data['word'], form_data['meaning'], form_data.get('ipa'), form_data.get('type'), form_data.get('example'), word_id)
-            )
-            conn.commit()
-            
-            cursor.execute('SELECT topic_id FROM words WHERE id = %s', (word_id,))
-            word = cursor.fetchone() # Lấy topic_id để redirect
-            
+        with db_cursor(psycopg2.extras.RealDictCursor) as cursor:
+            if request.method == 'POST':
+                form_data = request.form
+                cursor.execute(
+                    'UPDATE words SET word = %s, meaning = %s, ipa = %s, type = %s, example = %s WHERE id = %s',
+                    (form_data['word'], form_data['meaning'], form_data.get('ipa'), form_data.get('type'), form_data.get('example'), word_id)
+                )
+                # translation_cache của từ cũ và từ mới được trigger nạp lại (migration 0013)
+                bump_catalog_version(cursor)
+
+                cursor.execute('SELECT topic_id FROM words WHERE id = %s', (word_id,))
+                word = cursor.fetchone() # Lấy topic_id để redirect
+            else:
+                # Cho GET request
+                cursor.execute('SELECT * FROM words WHERE id = %s', (word_id,))
+                word = cursor.fetchone()
+
+        if request.method == 'POST' and word is not None:
             flash('Từ đã được cập nhật thành công!', 'success')
             return redirect(url_for('admin.manage_words', topic_id=word['topic_id']))
-        
-        # Cho GET request
-        word = cursor.execute('SELECT * FROM words WHERE id = %s', (word_id,)).fetchone()
-        
+
     except (Exception, psycopg2.DatabaseError) as e:
-        if conn and request.method == 'POST': conn.rollback()
         flash(f'Lỗi khi sửa từ: {e}', 'error')
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
+        word = None
 
     if word is None:
         flash('Không tìm thấy từ này.', 'error')
         return redirect(url_for('admin.manage_collections'))
-        
+
     return render_template('admin/edit_word.html', word=word)
 
 @bp.route('/words/delete/<int:word_id>', methods=['POST'])
 def delete_word(word_id):
     topic_id = None
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        word = cursor.execute('SELECT topic_id FROM words WHERE id = %s', (word_id,)).fetchone()
-        topic_id = word['topic_id'] if word else None
-        
-        cursor.execute('DELETE FROM words WHERE id = %s', (word_id,))
-        conn.commit()
+        with db_cursor(psycopg2.extras.RealDictCursor) as cursor:
+            cursor.execute('SELECT topic_id FROM words WHERE id = %s', (word_id,))
+            word = cursor.fetchone()
+            topic_id = word['topic_id'] if word else None
+
+            cursor.execute('DELETE FROM words WHERE id = %s', (word_id,))
+            bump_catalog_version(cursor)
         flash('Từ đã được xóa.', 'success')
     except (Exception, psycopg2.DatabaseError) as e:
-        if conn: conn.rollback()
         flash(f'Lỗi khi xóa từ: {e}', 'error')
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
-        
+
     if topic_id:
         return redirect(url_for('admin.manage_words', topic_id=topic_id))
     return redirect(url_for('admin.manage_collections'))
@@ -413,20 +369,52 @@ def delete_word(word_id):
 
 @bp.route('/words/reorder', methods=['POST'])
 def reorder_words():
-    data = request.get_json()
-    ordered_ids = data.get('ordered_ids')
-    conn = None
-    cursor = None
+    return _reorder(tasks.REORDER_WORDS, 'topic_id')
+
+# --- Ordering ---
+def _move(table, id):
+    data = request.get_json(silent=True)
+    new_position = _json_int(data.get('position')) if isinstance(data, dict) else None
+    if new_position is None:
+        return jsonify({'status': 'error', 'message': 'Vị trí không hợp lệ.'}), 400
+    try:
+        with db_cursor() as cursor:
+            changed = ordering.move(cursor, table, id, new_position)
+            if changed is None:
+                return jsonify({'status': 'error', 'message': 'Không tìm thấy mục cần di chuyển.'}), 404
+            if changed:
+                bump_catalog_version(cursor)
+        return jsonify({'status': 'success', 'changed': changed})
+    except (Exception, psycopg2.DatabaseError) as e:
+        return jsonify({'status': 'error', 'message': f'Lỗi cơ sở dữ liệu: {e}'}), 500
+
+# Kéo thả một mục: {"position": n} là vị trí mới (tính từ 0), chỉ các mục nằm giữa vị trí cũ và mới bị dịch
+@bp.route('/topics/<int:id>/move', methods=['POST'])
+def move_topic(id):
+    return _move('topics', id)
+
+@bp.route('/words/<int:id>/move', methods=['POST'])
+def move_word(id):
+    return _move('words', id)
+
+# --- Background Jobs ---
+@bp.route('/jobs/<int:job_id>')
+def job_status(job_id):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        for index, word_id in enumerate(ordered_ids):
-            cursor.execute('UPDATE words SET position = %s WHERE id = %s', (index, int(word_id)))
-        conn.commit()
-        return jsonify({'status': 'success', 'message': 'Thứ tự từ đã được cập nhật.'})
+        jobs.ensure_worker() # Khởi động lại thread xử lý của tiến trình này nếu nó đã dừng
+        job = jobs.get_job(job_id)
+        if job is None:
+            return jsonify({'status': 'error', 'message': 'Không tìm thấy công việc.'}), 404
+        return jsonify({
+            'id': job['id'],
+            'kind': job['kind'],
+            'title': tasks.JOB_TITLES.get(job['kind'], job['kind']),
+            'status': job['status'],
+            'progress': job['progress'],
+            'total': job['total'],
+            'message': job['message'],
+            'result': job['result'],
+            'finished': job['status'] in (jobs.SUCCEEDED, jobs.FAILED),
+        })
     except (Exception, psycopg2.DatabaseError) as e:
-        if conn: conn.rollback()
-        return jsonify({'status': 'error', 'message': f'Lỗi cơ sở dữ liệu: {e}'})
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
\ No newline at end of file
+        return jsonify({'status': 'error', 'message': f'Lỗi cơ sở dữ liệu: {e}'}), 500
@@ -0,0 +1,78 @@
+import psycopg2
+import psycopg2.extras
+from app import jobs, translation
+from app.db import db_cursor
+from app.catalog import bump_catalog_version
+from app.admin import ordering
+from app.admin.importer import ImportValidationError, import_collection
+
+# Các thao tác admin nặng được chạy nền qua hàng đợi job (xem app/jobs.py)
+IMPORT_COLLECTION = 'import_collection'
+DELETE_COLLECTION = 'delete_collection'
+REORDER_TOPICS = 'reorder_topics'
+REORDER_WORDS = 'reorder_words'
+
+JOB_TITLES = {
+    IMPORT_COLLECTION: 'Import bộ sưu tập',
+    DELETE_COLLECTION: 'Xóa bộ sưu tập',
+    REORDER_TOPICS: 'Sắp xếp chủ đề',
+    REORDER_WORDS: 'Sắp xếp từ vựng',
+}
+
+
+@jobs.register(IMPORT_COLLECTION)
+def run_import_collection(job):
+    collection_name = job.params['collection_name']
+    try:
+        with db_cursor(psycopg2.extras.RealDictCursor) as cursor:
+            topic_count, word_count = import_collection(
+                cursor, collection_name, job.open_upload(),
+                progress=lambda count: job.report(count, message=f'Đã ghi {count} từ...')
+            )
+            cursor.execute('SELECT id FROM collections WHERE name = %s', (collection_name,))
+            translation.seed_from_vocabulary(cursor, collection_id=cursor.fetchone()['id'])
+    except ImportValidationError as e:
+        raise jobs.JobError(f'Import thất bại: file có {e.error_count} lỗi, không có dữ liệu nào được thêm.',
+                            {'errors': e.errors, 'error_count': e.error_count})
+    except psycopg2.IntegrityError:
+        raise jobs.JobError(f'Tên bộ sưu tập "{collection_name}" đã tồn tại. Vui lòng chọn tên khác.')
+    return (f'Import thành công bộ sưu tập "{collection_name}" ({topic_count} chủ đề, {word_count} từ)!',
+            {'topics': topic_count, 'words': word_count})
+
+
+@jobs.register(DELETE_COLLECTION)
+def run_delete_collection(job):
+    collection_id = job.params['collection_id']
+    with db_cursor() as cursor:
+        cursor.execute('SELECT id FROM topics WHERE collection_id = %s ORDER BY id', (collection_id,))
+        topic_ids = [row[0] for row in cursor.fetchall()]
+        # Xóa lần lượt từng chủ đề (cùng một transaction) để báo được tiến độ khi bộ sưu tập lớn
+        for index, topic_id in enumerate(topic_ids):
+            cursor.execute('DELETE FROM words WHERE topic_id = %s', (topic_id,))
+            job.report(index + 1, len(topic_ids), f'Đã xóa {index + 1}/{len(topic_ids)} chủ đề...')
+        cursor.execute('DELETE FROM collections WHERE id = %s', (collection_id,))
+        if cursor.rowcount == 0:
+            raise jobs.JobError('Bộ sưu tập không tồn tại hoặc đã bị xóa.')
+        bump_catalog_version(cursor)
+    return 'Bộ sưu tập và tất cả dữ liệu liên quan đã được xóa.', None
+
+
+def _run_reorder(job, table, message):
+    with db_cursor() as cursor:
+        try:
+            changed = ordering.reorder(cursor, table, job.params['parent_id'], job.params['ordered_ids'])
+        except ordering.OrderingError as e:
+            raise jobs.JobError(str(e))
+        if changed:
+            bump_catalog_version(cursor)
+    return message, {'changed': changed}
+
+
+@jobs.register(REORDER_TOPICS)
+def run_reorder_topics(job):
+    return _run_reorder(job, 'topics', 'Thứ tự chủ đề đã được cập nhật.')
+
+
+@jobs.register(REORDER_WORDS)
+def run_reorder_words(job):
+    return _run_reorder(job, 'words', 'Thứ tự từ đã được cập nhật.')
@@ -1,72 +1,435 @@
 import psycopg2 # Bỏ sqlite3
 import psycopg2.extras # Thư viện quan trọng
 from flask import Blueprint, jsonify, current_app, request
-from deep_translator import GoogleTranslator
 from datetime import datetime, timedelta
-from app.db import get_db_connection
+import os
+from app.db import db_cursor
+from app import catalog, formats, jsonstream, metrics, quiz, translation, users
 
 # Blueprint này vẫn đúng
 bp = Blueprint('api', __name__, url_prefix='/api')
 
+# Nén (brotli/gzip) mọi response /api đủ lớn; các endpoint trả danh sách dòng còn hỗ trợ
+# định dạng dạng cột/MessagePack qua header Accept (xem app/formats.py)
+bp.after_request(formats.compress_response)
+
 # XÓA hàm get_db_connection() cũ dùng sqlite3
 
+# Bật để /api/data luôn phát dữ liệu theo từng chunk (server-side cursor) thay vì giữ snapshot trong bộ nhớ.
+# Có thể bật riêng cho từng request bằng ?stream=1.
+API_DATA_STREAMING = os.environ.get('API_DATA_STREAMING') == '1'
 
 @bp.route('/data')
 def get_all_data():
     """
-    API endpoint để lấy tất cả dữ liệu từ POSTGRESQL.
-    """
-    conn = None
-    cursor = None
-    try:
-        conn = get_db_connection()
-        # Dùng RealDictCursor để lấy kết quả dạng dictionary (giống JSON)
-        # Đây là thay thế cho conn.row_factory = sqlite3.Row
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) 
-        
-        cursor.execute('SELECT * FROM collections WHERE is_visible = 1 ORDER BY name')
-        collections = cursor.fetchall()
-        
-        cursor.execute('''
-            SELECT t.* FROM topics t
-            JOIN collections c ON t.collection_id = c.id
-            WHERE c.is_visible = 1
-            ORDER BY t.collection_id, t.position, t.id
-        ''')
-        topics = cursor.fetchall()
-        
-        cursor.execute('''
-            SELECT w.* FROM words w
-            JOIN topics t ON w.topic_id = t.id
-            JOIN collections c ON t.collection_id = c.id
-            WHERE c.is_visible = 1
-            ORDER BY t.id, w.position, w.id
-        ''')
-        words = cursor.fetchall()
-        
-        cursor.execute('SELECT * FROM user_word_data')
-        user_data = cursor.fetchall()
-        
-        # Vì đã dùng RealDictCursor, chúng ta không cần [dict(ix) for ix...] nữa
-        return jsonify({
-            'collections': collections,
-            'topics': topics,
-            'words': words,
-            'user_data': user_data
-        })
+    API endpoint để lấy tất cả dữ liệu từ POSTGRESQL (tiến độ SRS là của người học hiện tại).
+    Phần catalog được phục vụ từ snapshot đã serialize (và nén) sẵn dùng chung cho mọi người học;
+    client gửi lại ETag qua If-None-Match sẽ nhận 304 chỉ sau một lần tra phiên bản tiến độ.
+    """
+    try:
+        fmt = formats.negotiate()
+        user_id = users.get_current_user_id()
+        etag = formats.format_etag(catalog.version_token(catalog.get_current_versions(user_id)), fmt)
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag, private=True)
+
+        # MessagePack cần biết trước số phần tử của mỗi mảng nên không phát theo chunk được
+        if (API_DATA_STREAMING or request.args.get('stream') == '1') and fmt != formats.MSGPACK:
+            return _stream_all_data(user_id, fmt)
+
+        # Các giai đoạn được đo riêng (header Server-Timing, /metrics): dựng catalog, đọc tiến độ, ghép và nén
+        with metrics.phase('snapshot'):
+            snapshot = catalog.get_snapshot(fmt)
+        with metrics.phase('user_data'):
+            progress_version, user_data = catalog.read_user_data(user_id, fmt)
+        versions = (snapshot.catalog_version, progress_version)
+        etag = formats.format_etag(catalog.version_token(versions), fmt)
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag, private=True)
+
+        gzipped = 'gzip' in request.accept_encodings
+        with metrics.phase('render'):
+            body = snapshot.render(versions, user_data, gzipped)
+        response = current_app.response_class(body, mimetype=fmt)
+        if gzipped:
+            response.headers['Content-Encoding'] = 'gzip'
+        return _with_cache_headers(response, etag, private=True)
     except Exception as e:
         current_app.logger.error(f"Database error in /data: {e}")
         return jsonify({'error': 'Failed to fetch data'}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close() # Luôn đóng kết nối
+
+def _stream_all_data(user_id, fmt):
+    versions, chunks = catalog.stream_catalog(user_id, columnar=fmt == formats.COLUMNAR)
+    etag = formats.format_etag(catalog.version_token(versions), fmt)
+    if request.if_none_match.contains_weak(etag):
+        chunks.close() # Trả kết nối về pool ngay
+        return _not_modified(etag, private=True)
+
+    if 'gzip' in request.accept_encodings:
+        response = current_app.response_class(jsonstream.gzip_chunks(chunks), mimetype=fmt)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = current_app.response_class(chunks, mimetype=fmt)
+    return _with_cache_headers(response, etag, private=True)
+
+@bp.route('/data/changes')
+def get_data_changes():
+    """
+    API endpoint trả về các thay đổi kể từ phiên bản `since` (giá trị 'version' client nhận được lần trước).
+    Trả về 410 nếu không thể tính thay đổi từ phiên bản đó, client cần tải lại /api/data.
+    ?words=0 để không gửi danh sách từ (client tự tải lại các chủ đề có trong 'topics').
+    """
+    try:
+        since = catalog.parse_version_token(request.args.get('since', ''))
+    except ValueError:
+        return jsonify({'error': 'Invalid since version'}), 400
+
+    try:
+        changes = catalog.get_changes(since, users.get_current_user_id(), include_words=request.args.get('words') != '0')
+        if changes is None:
+            return jsonify({'error': 'Version no longer available, reload /api/data'}), 410
+        return formats.respond(changes, tables=('collections', 'topics', 'words', 'user_data'))
+    except Exception as e:
+        current_app.logger.error(f"Database error in /data/changes: {e}")
+        return jsonify({'error': 'Failed to fetch changes'}), 500
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+def _parse_page_args():
+    """Đọc tham số phân trang ?after=<position>,<id>&limit=N. Báo ValueError nếu sai định dạng."""
+    limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    after = request.args.get('after')
+    if after:
+        position, row_id = after.split(',')
+        after = (int(position), int(row_id))
+    return after, limit
+
+def _keyset_page(cursor, query, params, alias, after, limit):
+    """
+    Chạy truy vấn phân trang theo thứ tự (position, id) có sẵn của topics/words.
+    `query` chưa có ORDER BY/LIMIT; lấy dư một dòng để biết còn trang sau hay không.
+    """
+    if after is not None:
+        query += f' AND ({alias}.position, {alias}.id) > (%s, %s)'
+        params = params + after
+    cursor.execute(query + f' ORDER BY {alias}.position, {alias}.id LIMIT %s', params + (limit + 1,))
+    rows = cursor.fetchall()
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = f"{rows[-1]['position']},{rows[-1]['id']}"
+    return rows, next_after
+
+def _catalog_etag(catalog_version, fmt):
+    # Dữ liệu các endpoint chỉ đọc nội dung (không có tiến độ SRS) chỉ phụ thuộc vào phiên bản catalog
+    return formats.format_etag(f"c{catalog_version}", fmt)
+
+def _catalog_not_modified(fmt):
+    catalog_version = catalog.get_cached_catalog_version()
+    if catalog_version is not None and request.if_none_match.contains_weak(_catalog_etag(catalog_version, fmt)):
+        return _not_modified(_catalog_etag(catalog_version, fmt))
+    return None
+
+@bp.route('/collections')
+def get_collections():
+    """API endpoint trả về danh sách bộ sưu tập đang hiển thị cùng phiên bản dữ liệu hiện tại."""
+    try:
+        # Đọc phiên bản TRƯỚC dữ liệu: nếu có thay đổi xen giữa, lần đồng bộ sau sẽ lấy lại, không bị sót
+        versions = catalog.get_current_versions(users.get_current_user_id())
+        with db_cursor(psycopg2.extras.RealDictCursor, readonly=True) as cursor:
+            cursor.execute('SELECT * FROM collections WHERE is_visible = 1 ORDER BY name')
+            collections = cursor.fetchall()
+        return formats.respond({'version': catalog.version_token(versions), 'collections': collections}, tables=('collections',))
+    except Exception as e:
+        current_app.logger.error(f"Database error in /collections: {e}")
+        return jsonify({'error': 'Failed to fetch collections'}), 500
+
+@bp.route('/collections/<int:collection_id>/topics')
+def get_collection_topics(collection_id):
+    """API endpoint trả về các chủ đề (kèm số từ) của một bộ sưu tập, phân trang theo (position, id)."""
+    try:
+        after, limit = _parse_page_args()
+    except ValueError:
+        return jsonify({'error': 'Invalid pagination parameters'}), 400
+
+    fmt = formats.negotiate()
+    not_modified = _catalog_not_modified(fmt)
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        catalog_version = catalog.get_catalog_version()
+        with db_cursor(psycopg2.extras.RealDictCursor, readonly=True) as cursor:
+            cursor.execute('SELECT id FROM collections WHERE id = %s AND is_visible = 1', (collection_id,))
+            if cursor.fetchone() is None:
+                return jsonify({'error': 'Collection not found'}), 404
+
+            # word_count là cột bộ đếm do trigger giữ (migration 0009), không phải đếm lại bảng words
+            topics, next_after = _keyset_page(cursor, 'SELECT t.* FROM topics t WHERE t.collection_id = %s',
+                                              (collection_id,), 't', after, limit)
+        return _with_cache_headers(formats.respond({'topics': topics, 'next_after': next_after}, tables=('topics',), fmt=fmt),
+                                   _catalog_etag(catalog_version, fmt))
+    except Exception as e:
+        current_app.logger.error(f"Database error in /collections/{collection_id}/topics: {e}")
+        return jsonify({'error': 'Failed to fetch topics'}), 500
+
+@bp.route('/topics/<int:topic_id>/words')
+def get_topic_words(topic_id):
+    """API endpoint trả về từ vựng của một chủ đề, phân trang theo (position, id)."""
+    try:
+        after, limit = _parse_page_args()
+    except ValueError:
+        return jsonify({'error': 'Invalid pagination parameters'}), 400
+
+    fmt = formats.negotiate()
+    not_modified = _catalog_not_modified(fmt)
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        catalog_version = catalog.get_catalog_version()
+        with db_cursor(psycopg2.extras.RealDictCursor, readonly=True) as cursor:
+            cursor.execute('''
+                SELECT t.id FROM topics t
+                JOIN collections c ON t.collection_id = c.id
+                WHERE t.id = %s AND c.is_visible = 1
+            ''', (topic_id,))
+            if cursor.fetchone() is None:
+                return jsonify({'error': 'Topic not found'}), 404
+
+            words, next_after = _keyset_page(cursor, 'SELECT w.* FROM words w WHERE w.topic_id = %s', (topic_id,), 'w', after, limit)
+        return _with_cache_headers(formats.respond({'words': words, 'next_after': next_after}, tables=('words',), fmt=fmt),
+                                   _catalog_etag(catalog_version, fmt))
+    except Exception as e:
+        current_app.logger.error(f"Database error in /topics/{topic_id}/words: {e}")
+        return jsonify({'error': 'Failed to fetch words'}), 500
+
+@bp.route('/words')
+def get_words_by_ids():
+    """API endpoint trả về các từ theo danh sách id (?ids=1,2,3), dùng cho mục Từ đã lưu và Ôn tập."""
+    try:
+        ids = [int(x) for x in request.args.get('ids', '').split(',') if x.strip()]
+    except ValueError:
+        return jsonify({'error': 'Invalid ids'}), 400
+    if len(ids) > MAX_PAGE_SIZE:
+        return jsonify({'error': f'At most {MAX_PAGE_SIZE} ids per request'}), 400
+    if not ids:
+        return formats.respond({'words': []}, tables=('words',))
+
+    try:
+        with db_cursor(psycopg2.extras.RealDictCursor, readonly=True) as cursor:
+            cursor.execute('''
+                SELECT w.* FROM words w
+                JOIN topics t ON w.topic_id = t.id
+                JOIN collections c ON t.collection_id = c.id
+                WHERE w.id = ANY(%s) AND c.is_visible = 1
+                ORDER BY w.topic_id, w.position, w.id
+            ''', (ids,))
+            words = cursor.fetchall()
+        return formats.respond({'words': words}, tables=('words',))
+    except Exception as e:
+        current_app.logger.error(f"Database error in /words: {e}")
+        return jsonify({'error': 'Failed to fetch words'}), 500
+
+@bp.route('/user_data')
+def get_user_data():
+    """API endpoint trả về tiến độ SRS (user_word_data) của người học hiện tại cùng phiên bản dữ liệu hiện tại."""
+    try:
+        user_id = users.get_current_user_id()
+        versions = catalog.get_current_versions(user_id)
+        with db_cursor(psycopg2.extras.RealDictCursor, readonly=True) as cursor:
+            cursor.execute(catalog.USER_DATA_QUERY, (user_id,))
+            user_data = cursor.fetchall()
+        return formats.respond({'version': catalog.version_token(versions), 'user_data': user_data}, tables=('user_data',))
+    except Exception as e:
+        current_app.logger.error(f"Database error in /user_data: {e}")
+        return jsonify({'error': 'Failed to fetch data'}), 500
+
+DEFAULT_REVIEW_LIMIT = 50
+
+@bp.route('/reviews/due')
+def get_due_reviews():
+    """
+    API endpoint trả về các từ đã đến hạn ôn tập (từ đến hạn sớm nhất trước) và số từ đến hạn của từng chủ đề.
+    ?limit=N giới hạn số từ của một phiên ôn tập, ?collection=<id> chỉ lấy từ trong một bộ sưu tập.
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_REVIEW_LIMIT)), 1), MAX_PAGE_SIZE)
+        collection_id = request.args.get('collection')
+        collection_id = int(collection_id) if collection_id else None
+    except ValueError:
+        return jsonify({'error': 'Invalid parameters'}), 400
+
+    try:
+        with db_cursor(psycopg2.extras.RealDictCursor, readonly=True) as cursor:
+            # Một truy vấn duy nhất, bắt đầu từ index idx_user_word_data_review_queue (user_id, next_review_at).
+            # Số từ theo chủ đề được đếm trên TẤT CẢ các từ đến hạn, không chỉ các từ trong giới hạn limit.
+            cursor.execute('''
+                WITH due AS (
+                    SELECT w.*, u.srs_level, u.next_review_at
+                    FROM user_word_data u
+                    JOIN words w ON w.id = u.word_id
+                    JOIN topics t ON w.topic_id = t.id
+                    JOIN collections c ON t.collection_id = c.id
+                    WHERE u.user_id = %(user_id)s AND u.next_review_at <= %(now)s AND c.is_visible = 1
+                      AND (%(collection_id)s::INTEGER IS NULL OR t.collection_id = %(collection_id)s)
+                )
+                SELECT d.*, (SELECT json_object_agg(topic_id, due_count)
+                             FROM (SELECT topic_id, COUNT(*) AS due_count FROM due GROUP BY topic_id) counts) AS topic_counts
+                FROM due d
+                ORDER BY d.next_review_at, d.id
+                LIMIT %(limit)s
+            ''', {'user_id': users.get_current_user_id(), 'now': datetime.now(), 'collection_id': collection_id, 'limit': limit})
+            rows = cursor.fetchall()
+
+        topic_counts = {int(topic_id): count for topic_id, count in (rows[0]['topic_counts'] if rows else {}).items()}
+        for row in rows:
+            del row['topic_counts']
+        return formats.respond({
+            'total': sum(topic_counts.values()),
+            'topics': topic_counts,
+            'words': rows,
+        }, tables=('words',))
+    except Exception as e:
+        current_app.logger.error(f"Database error in /reviews/due: {e}")
+        return jsonify({'error': 'Failed to fetch due reviews'}), 500
+
+@bp.route('/quiz')
+def get_quiz():
+    """
+    API endpoint tạo một bài quiz ở server: ?type=multiple_choice|listening|fill_blank|spelling, ?size=N câu hỏi và
+    một phạm vi: ?topic=<id>, ?collection=<id>, ?scope=review (từ đến hạn ôn) hoặc ?ids=1,2,3 (ví dụ từ đã lưu).
+    Mỗi câu hỏi có sẵn các lựa chọn (đáp án nhiễu lấy ngẫu nhiên từ cùng chủ đề, ưu tiên cùng loại từ) và vị trí
+    đáp án đúng; một phần câu hỏi được dành cho các từ đến hạn ôn hoặc còn yếu của người học.
+    """
+    quiz_type = request.args.get('type', quiz.MULTIPLE_CHOICE)
+    if quiz_type not in quiz.QUIZ_TYPES:
+        return jsonify({'error': f"Invalid quiz type, expected one of: {', '.join(quiz.QUIZ_TYPES)}"}), 400
+    try:
+        size = min(max(int(request.args.get('size', quiz.DEFAULT_QUIZ_SIZE)), 1), quiz.MAX_QUIZ_SIZE)
+        topic_id = int(request.args['topic']) if request.args.get('topic') else None
+        collection_id = int(request.args['collection']) if request.args.get('collection') else None
+        word_ids = [int(x) for x in request.args.get('ids', '').split(',') if x.strip()]
+    except ValueError:
+        return jsonify({'error': 'Invalid parameters'}), 400
+    review = request.args.get('scope') == 'review'
+    if sum((topic_id is not None, collection_id is not None, review, bool(word_ids))) != 1:
+        return jsonify({'error': 'Exactly one of topic, collection, scope=review or ids is required'}), 400
+    if len(word_ids) > MAX_PAGE_SIZE:
+        return jsonify({'error': f'At most {MAX_PAGE_SIZE} ids per request'}), 400
+
+    try:
+        questions = quiz.generate(users.get_current_user_id(), quiz_type, size, topic_id=topic_id,
+                                  collection_id=collection_id, review=review, word_ids=word_ids)
+        if questions is None:
+            return jsonify({'error': 'Topic or collection not found'}), 404
+        response = formats.respond({'type': quiz_type, 'questions': questions})
+        response.headers['Cache-Control'] = 'no-store' # Mỗi lần gọi là một bài quiz ngẫu nhiên khác
+        return response
+    except Exception as e:
+        current_app.logger.error(f"Database error in /quiz: {e}")
+        return jsonify({'error': 'Failed to generate quiz'}), 500
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 50
+MAX_SEARCH_OFFSET = 500
+_has_pg_trgm = None # Database có extension pg_trgm hay không (kiểm tra một lần mỗi tiến trình)
+
+# Điều kiện khớp và điểm xếp hạng. Câu truy vấn đã được fold_text() (chữ thường, bỏ dấu tiếng Việt);
+# tsquery là các từ trong câu truy vấn, từ nào cũng khớp theo tiền tố.
+_SEARCH_QUERY = """
+    WITH q AS (
+        -- pattern: text đã escape ký tự đại diện để dùng trong LIKE (người dùng gõ phần trăm/gạch dưới được hiểu theo nghĩa đen)
+        SELECT fold_text(%(q)s) AS text,
+               replace(replace(replace(fold_text(%(q)s), '\', '\\'), '%%', '\%%'), '_', '\_') AS pattern,
+               to_tsquery('simple', (SELECT string_agg(quote_literal(lexeme) || ':*', ' & ')
+                                     FROM unnest(to_tsvector('simple', fold_text(%(q)s))))) AS ts
+    )
+    SELECT w.*, t.name AS topic_name, {rank} AS rank
+    FROM words w
+    JOIN topics t ON w.topic_id = t.id
+    JOIN collections c ON t.collection_id = c.id
+    CROSS JOIN q
+    WHERE c.is_visible = 1 AND ({match})
+    ORDER BY rank DESC, w.id
+    LIMIT %(limit)s OFFSET %(offset)s
+"""
+_SEARCH_RANK = """
+    COALESCE(ts_rank(words_search_document(w.word, w.meaning, w.example), q.ts), 0) -- q.ts NULL khi q không có chữ/số nào
+    + CASE WHEN fold_text(w.word) = q.text THEN 10 WHEN fold_text(w.word) LIKE q.pattern || '%%' THEN 3 ELSE 0 END
+"""
+_SEARCH_MATCH = """
+    words_search_document(w.word, w.meaning, w.example) @@ q.ts
+    OR fold_text(w.word) LIKE q.pattern || '%%'
+    OR fold_text(w.meaning) LIKE '%%' || q.pattern || '%%'
+"""
+# Với pg_trgm: thêm khớp gần đúng (word_similarity cho phép gõ sai và gõ dở một phần của từ)
+_SEARCH_RANK_TRGM = _SEARCH_RANK + """
+    + 2 * word_similarity(q.text, fold_text(w.word)) + word_similarity(q.text, fold_text(w.meaning))
+"""
+_SEARCH_MATCH_TRGM = """
+    words_search_document(w.word, w.meaning, w.example) @@ q.ts
+    OR fold_text(w.word) %%> q.text
+    OR fold_text(w.meaning) %%> q.text
+"""
+
+def _trigram_available(cursor):
+    global _has_pg_trgm
+    if _has_pg_trgm is None:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+        _has_pg_trgm = cursor.fetchone()['exists']
+    return _has_pg_trgm
+
+@bp.route('/search')
+def search_words():
+    """
+    API endpoint tìm từ vựng theo từ, nghĩa và ví dụ (?q=...), không phân biệt hoa thường và dấu tiếng Việt,
+    xếp theo mức độ liên quan. Phân trang bằng ?offset=N&limit=N (dùng next_offset của trang trước).
+    """
+    query = ' '.join(request.args.get('q', '').split())
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_SEARCH_LIMIT)), 1), MAX_SEARCH_LIMIT)
+        offset = min(max(int(request.args.get('offset', 0)), 0), MAX_SEARCH_OFFSET)
+    except ValueError:
+        return jsonify({'error': 'Invalid pagination parameters'}), 400
+    if not query:
+        return formats.respond({'results': [], 'next_offset': None}, tables=('results',))
+
+    try:
+        with db_cursor(psycopg2.extras.RealDictCursor, readonly=True) as cursor:
+            if _trigram_available(cursor):
+                sql = _SEARCH_QUERY.format(rank=_SEARCH_RANK_TRGM, match=_SEARCH_MATCH_TRGM)
+            else:
+                sql = _SEARCH_QUERY.format(rank=_SEARCH_RANK, match=_SEARCH_MATCH)
+            cursor.execute(sql, {'q': query, 'limit': limit + 1, 'offset': offset})
+            results = cursor.fetchall()
+        next_offset = None
+        if len(results) > limit:
+            results = results[:limit]
+            next_offset = offset + limit if offset + limit <= MAX_SEARCH_OFFSET else None
+        for row in results:
+            row['rank'] = float(row['rank'])
+        return formats.respond({'results': results, 'next_offset': next_offset}, tables=('results',))
+    except Exception as e:
+        current_app.logger.error(f"Database error in /search: {e}")
+        return jsonify({'error': 'Search failed'}), 500
+
+def _not_modified(etag, private=False):
+    return _with_cache_headers(current_app.response_class(status=304), etag, private)
+
+def _with_cache_headers(response, etag, private=False):
+    # Weak ETag vì cùng một phiên bản có thể được gửi dưới dạng nén hoặc không nén
+    response.set_etag(etag, weak=True)
+    # Trình duyệt luôn hỏi lại bằng If-None-Match; dữ liệu có tiến độ riêng của người học thì proxy không được cache
+    response.headers['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
 
 @bp.route('/translate', methods=['POST'])
 def translate_text():
     """
-    API endpoint này không thay đổi vì nó không dùng database.
+    API endpoint dịch đoạn văn bản người dùng bôi đen (en -> vi), qua cache bản dịch (xem app/translation.py).
     """
     data = request.get_json()
     text_to_translate = data.get('text', '')
@@ -75,14 +438,95 @@ def translate_text():
         return jsonify({'error': 'No text provided'}), 400
 
     try:
-        translated_text = GoogleTranslator(source='en', target='vi').translate(text_to_translate)
+        translated_text = translation.translate(text_to_translate)
         return jsonify({'translatedText': translated_text})
+    except translation.TranslationUnavailable as e:
+        return _translation_unavailable(e)
     except Exception as e:
         current_app.logger.error(f"Translation error: {e}")
         return jsonify({'error': 'Translation failed'}), 500
-    
+
+MAX_TRANSLATE_BATCH_SIZE = 100
+MAX_TRANSLATE_TEXT_LENGTH = 5000 # Giới hạn của dịch vụ dịch cho mỗi đoạn văn bản
+
+@bp.route('/translate/batch', methods=['POST'])
+def translate_batch():
+    """
+    API endpoint dịch nhiều đoạn văn bản một lần ({"texts": [...]}). Văn bản trùng nhau chỉ được dịch một lần
+    và các lời gọi tới dịch vụ dịch chạy song song, nên thời gian chờ gần bằng lời gọi chậm nhất thay vì tổng các lời gọi.
+    Trả về bản dịch theo đúng thứ tự; đoạn nào lỗi thì có 'error' thay cho 'translatedText'.
+    """
+    data = request.get_json(silent=True) or {}
+    texts = data.get('texts')
+    if not isinstance(texts, list) or not texts:
+        return jsonify({'error': 'No texts provided'}), 400
+    if len(texts) > MAX_TRANSLATE_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_TRANSLATE_BATCH_SIZE} texts per request'}), 400
+    if any(not isinstance(text, str) or not text.strip() or len(text) > MAX_TRANSLATE_TEXT_LENGTH for text in texts):
+        return jsonify({'error': f'Each text must be a non-empty string of at most {MAX_TRANSLATE_TEXT_LENGTH} characters'}), 400
+
+    try:
+        results = translation.translate_many(texts)
+    except Exception as e:
+        current_app.logger.error(f"Translation error: {e}")
+        return jsonify({'error': 'Translation failed'}), 500
+
+    translations = []
+    for text, result in zip(texts, results):
+        if isinstance(result, translation.TranslationUnavailable):
+            translations.append({'text': text, 'error': str(result)})
+        elif isinstance(result, Exception):
+            current_app.logger.error(f"Translation error: {result}")
+            translations.append({'text': text, 'error': 'Translation failed'})
+        else:
+            translations.append({'text': text, 'translatedText': result})
+
+    if all(isinstance(result, translation.TranslationUnavailable) for result in results):
+        return _translation_unavailable(results[0])
+    return jsonify({'translations': translations})
+
+def _translation_unavailable(error):
+    response = jsonify({'error': str(error)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(int(translation.TRANSLATION_BREAKER_COOLDOWN))
+    return response
+
 
 SRS_INTERVALS_HOURS = [4, 8, 24, 72, 168, 336, 720] # 4h, 8h, 1d, 3d, 7d, 14d, 30d
+MAX_SRS_BATCH_SIZE = 500
+SRS_ANSWER_MAX_AGE_DAYS = int(os.environ.get('SRS_ANSWER_MAX_AGE_DAYS', 30)) # Câu trả lời cũ hơn được tính ở mốc này
+
+def next_srs_state(srs_level, is_correct, answered_at=None):
+    """Tính cấp SRS mới và thời điểm ôn tập tiếp theo sau một câu trả lời."""
+    if is_correct:
+        srs_level = min(srs_level + 1, len(SRS_INTERVALS_HOURS))
+    else:
+        srs_level = max(0, srs_level - 2)
+
+    interval_hours = SRS_INTERVALS_HOURS[srs_level - 1] if srs_level > 0 else 1
+    next_review_at = (answered_at or datetime.now()) + timedelta(hours=interval_hours)
+    return srs_level, next_review_at
+
+def _parse_answered_at(value):
+    """
+    Đọc thời điểm trả lời (ISO 8601, ví dụ từ Date.toISOString()) thành giờ địa phương của server
+    giống datetime.now(). Thiếu, sai định dạng hoặc ở tương lai thì dùng thời điểm hiện tại; cũ hơn
+    SRS_ANSWER_MAX_AGE_DAYS ngày thì dùng mốc đó.
+    """
+    now = datetime.now()
+    if not value:
+        return now
+    try:
+        answered_at = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return now
+    if answered_at.tzinfo is not None:
+        try:
+            answered_at = answered_at.astimezone().replace(tzinfo=None)
+        except OverflowError:
+            # Ví dụ "0001-01-01T00:00:00+14:00": đổi múi giờ vượt ra ngoài khoảng của datetime
+            answered_at = datetime.min if answered_at.year == datetime.min.year else datetime.max
+    return max(min(answered_at, now), now - timedelta(days=SRS_ANSWER_MAX_AGE_DAYS))
 
 @bp.route('/update_srs', methods=['POST'])
 def update_srs():
@@ -93,47 +537,93 @@ def update_srs():
     if not word_id:
         return jsonify({'status': 'error', 'message': 'Missing word_id'}), 400
 
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        user_id = users.get_current_user_id()
+        with db_cursor(psycopg2.extras.RealDictCursor) as cursor:
+            # LƯU Ý: PostgreSQL dùng %s thay vì ?
+            cursor.execute(
+                'SELECT * FROM user_word_data WHERE user_id = %s AND word_id = %s', (user_id, word_id)
+            )
+            progress = cursor.fetchone()
 
-        # LƯU Ý: PostgreSQL dùng %s thay vì ?
-        cursor.execute(
-            'SELECT * FROM user_word_data WHERE word_id = %s', (word_id,)
-        )
-        progress = cursor.fetchone()
+            srs_level, next_review_at = next_srs_state(progress['srs_level'] if progress else 0, is_correct)
 
-        srs_level = progress['srs_level'] if progress else 0
+            # LƯU Ý: PostgreSQL dùng %s thay vì ?
+            # Phiên bản tiến độ của người học được tăng bởi trigger stamp_user_progress_version
+            cursor.execute('''
+                INSERT INTO user_word_data (user_id, word_id, srs_level, next_review_at) VALUES (%s, %s, %s, %s)
+                ON CONFLICT(user_id, word_id) DO UPDATE SET
+                srs_level = excluded.srs_level,
+                next_review_at = excluded.next_review_at
+            ''', (user_id, word_id, srs_level, next_review_at.isoformat()))
+        # Thoát khỏi khối with: tự động commit (hoặc rollback nếu có lỗi) và trả kết nối về pool
 
-        if is_correct:
-            srs_level = min(srs_level + 1, len(SRS_INTERVALS_HOURS))
-        else:
-            srs_level = max(0, srs_level - 2)
+        return jsonify({'status': 'success', 'word_id': word_id, 'new_level': srs_level})
 
-        interval_hours = SRS_INTERVALS_HOURS[srs_level - 1] if srs_level > 0 else 1
-        next_review_at = datetime.now() + timedelta(hours=interval_hours)
+    except Exception as e:
+        current_app.logger.error(f"Database error in /update_srs: {e}")
+        return jsonify({'error': 'Failed to update data'}), 500
 
-        # LƯU Ý: PostgreSQL dùng %s thay vì ?
-        cursor.execute('''
-            INSERT INTO user_word_data (word_id, srs_level, next_review_at) VALUES (%s, %s, %s)
-            ON CONFLICT(word_id) DO UPDATE SET
-            srs_level = excluded.srs_level,
-            next_review_at = excluded.next_review_at
-        ''', (word_id, srs_level, next_review_at.isoformat()))
 
-        conn.commit() # Lưu thay đổi vào database
+@bp.route('/update_srs/batch', methods=['POST'])
+def update_srs_batch():
+    """
+    Ghi nhiều câu trả lời quiz trong một request: {"events": [{word_id, is_correct, answered_at}, ...]}.
+    Các câu trả lời của cùng một từ được áp dụng theo thứ tự answered_at; toàn bộ được ghi bằng
+    một câu INSERT ... ON CONFLICT duy nhất. Sự kiện sai định dạng bị bỏ qua riêng lẻ (trả về trong
+    "invalid" theo vị trí trong lô) thay vì từ chối cả lô.
+    """
+    data = request.get_json(silent=True) or {}
+    events = data.get('events')
+    if not isinstance(events, list) or not events:
+        return jsonify({'status': 'error', 'message': 'Missing events'}), 400
+    if len(events) > MAX_SRS_BATCH_SIZE:
+        return jsonify({'status': 'error', 'message': f'At most {MAX_SRS_BATCH_SIZE} events per request'}), 400
 
-        return jsonify({'status': 'success', 'word_id': word_id, 'new_level': srs_level})
+    parsed, invalid = [], []
+    for index, event in enumerate(events):
+        # word_id phải là số nguyên JSON, is_correct là boolean JSON: chuỗi "false"/"0" không được hiểu
+        # thành câu trả lời đúng
+        if (not isinstance(event, dict) or not isinstance(event.get('is_correct'), bool)
+                or not isinstance(event.get('word_id'), int) or isinstance(event['word_id'], bool)):
+            invalid.append(index)
+            continue
+        parsed.append((_parse_answered_at(event.get('answered_at')), event['word_id'], event['is_correct']))
+    parsed.sort(key=lambda event: event[0]) # sort ổn định: cùng thời điểm thì giữ thứ tự gửi lên
+
+    try:
+        user_id = users.get_current_user_id()
+        with db_cursor() as cursor:
+            # Một truy vấn lấy cấp hiện tại của mọi từ trong lô, đồng thời loại các từ không còn tồn tại
+            cursor.execute('''
+                SELECT w.id, COALESCE(u.srs_level, 0) FROM words w
+                LEFT JOIN user_word_data u ON u.user_id = %s AND u.word_id = w.id
+                WHERE w.id = ANY(%s)
+            ''', (user_id, list({word_id for _, word_id, _ in parsed})))
+            levels = dict(cursor.fetchall())
+
+            states = {}
+            for answered_at, word_id, is_correct in parsed:
+                if word_id in levels:
+                    levels[word_id], states[word_id] = next_srs_state(levels[word_id], is_correct, answered_at)
+
+            if states:
+                psycopg2.extras.execute_values(cursor, '''
+                    INSERT INTO user_word_data (user_id, word_id, srs_level, next_review_at) VALUES %s
+                    ON CONFLICT(user_id, word_id) DO UPDATE SET
+                    srs_level = excluded.srs_level,
+                    next_review_at = excluded.next_review_at
+                ''', [(user_id, word_id, levels[word_id], next_review_at) for word_id, next_review_at in states.items()],
+                    page_size=MAX_SRS_BATCH_SIZE)
+
+        return jsonify({
+            'status': 'success',
+            'results': [{'word_id': word_id, 'new_level': levels[word_id], 'next_review_at': next_review_at}
+                        for word_id, next_review_at in states.items()],
+            'skipped': sorted({word_id for _, word_id, _ in parsed} - levels.keys()),
+            'invalid': invalid
+        })
 
     except Exception as e:
-        if conn:
-            conn.rollback() # Hoàn tác nếu có lỗi
-        current_app.logger.error(f"Database error in /update_srs: {e}")
+        current_app.logger.error(f"Database error in /update_srs/batch: {e}")
         return jsonify({'error': 'Failed to update data'}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
\ No newline at end of file
@@ -0,0 +1,119 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+import click
+from flask import abort, current_app, request, send_file, url_for
+
+try:
+    import brotli # Không bắt buộc: file .br nhỏ hơn .gz khoảng 15-20%
+except ImportError:
+    brotli = None
+
+# Bước build static (python -m app.assets hoặc `flask build-assets`, chạy lúc build Docker image):
+# chép các file trong app/static vào app/static/dist với tên có mã hash nội dung (main.3f2a9c1b07d4.js),
+# kèm bản nén sẵn .gz/.br. Vì tên file đổi mỗi khi nội dung đổi, trình duyệt/CDN được phép cache vĩnh viễn.
+# Chưa build (môi trường dev) thì asset_url() trả về URL /static thường.
+ASSET_EXTENSIONS = ('.js', '.css', '.svg', '.json', '.txt', '.html')
+ASSET_URL_PREFIX = os.environ.get('ASSET_URL_PREFIX', '').rstrip('/') # Ví dụ https://cdn.example.com nếu đặt CDN phía trước
+ASSET_MAX_AGE = 365 * 24 * 3600
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+_ENCODINGS = (('br', '.br'), ('gzip', '.gz')) # Thứ tự ưu tiên khi trình duyệt nhận được cả hai
+
+
+def build(static_folder):
+    """Tạo app/static/dist (xóa bản cũ) và trả về manifest: tên gốc -> tên có hash."""
+    dist = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist]
+        for name in sorted(files):
+            if not name.endswith(ASSET_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            relative = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            stem, extension = os.path.splitext(relative)
+            hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+
+            target = os.path.join(dist, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+            with open(target + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(target + '.br', 'wb') as f:
+                    f.write(brotli.compress(data, quality=11))
+            manifest[relative] = hashed
+
+    with open(os.path.join(dist, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def _load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def asset_url(filename):
+    """URL của file static: bản có hash (cache vĩnh viễn) nếu đã build, ngược lại là URL /static thường."""
+    hashed = current_app.extensions['assets'].get(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return ASSET_URL_PREFIX + url_for('assets', filename=hashed)
+
+
+def serve_asset(filename):
+    """Phục vụ file đã build, chọn bản nén sẵn theo Accept-Encoding (không nén lại ở mỗi request)."""
+    if filename not in current_app.extensions['assets_files']:
+        abort(404)
+    dist = os.path.join(current_app.static_folder, DIST_DIR)
+    path, encoding = os.path.join(dist, filename), None
+    for name, suffix in _ENCODINGS:
+        if name in request.accept_encodings and os.path.exists(path + suffix):
+            path, encoding = path + suffix, name
+            break
+
+    # conditional=True: trả 304 khi trình duyệt hỏi lại; ETag khác nhau cho từng bản nén
+    response = send_file(path, mimetype=_mimetype(filename), conditional=True, max_age=ASSET_MAX_AGE)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    response.headers['Access-Control-Allow-Origin'] = '*' # Cho phép phục vụ qua CDN khác domain
+    return response
+
+
+def _mimetype(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def init_app(app):
+    manifest = _load_manifest(app.static_folder)
+    app.extensions['assets'] = manifest
+    app.extensions['assets_files'] = frozenset(manifest.values())
+    app.add_url_rule('/assets/<path:filename>', 'assets', serve_asset)
+    app.add_template_global(asset_url)
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Build các file static có hash và bản nén sẵn vào app/static/dist."""
+        manifest = build(app.static_folder)
+        click.echo(f'Đã build {len(manifest)} file static.')
+
+
+if __name__ == '__main__':
+    manifest = build(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    print(f'Đã build {len(manifest)} file static.')
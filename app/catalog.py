@@ -0,0 +1,346 @@
+import os
+import struct
+import threading
+import time
+import zlib
+
+import psycopg2.extras
+from app import formats, jsonstream, metrics
+from app.db import db_connection, db_cursor
+
+# Số giây một worker tin vào phiên bản catalog đã biết trước khi hỏi lại database.
+# Đây cũng là độ trễ tối đa để các worker khác thấy thay đổi từ trang admin.
+CATALOG_VERSION_TTL = float(os.environ.get('CATALOG_VERSION_TTL', 5))
+
+# Phiên bản dữ liệu gửi cho client gồm hai bộ đếm:
+#  - 'catalog' (bảng catalog_state): tăng mỗi khi admin thay đổi collections/topics/words, dùng chung cho mọi người
+#  - tiến độ (bảng user_progress_state): đếm riêng cho từng người học, tăng khi user_word_data của người đó thay đổi
+#    (trigger stamp_user_progress_version)
+CATALOG = 'catalog'
+
+_lock = threading.Lock()
+_build_lock = threading.Lock()
+_known_version = None # (phiên bản catalog, thời điểm đọc từ database)
+_snapshots = {} # định dạng -> snapshot; mỗi định dạng chỉ giữ bản mới nhất để giới hạn bộ nhớ
+
+_GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+
+class Snapshot:
+    """
+    Phần catalog (collections/topics/words) của payload /api/data đã serialize sẵn theo một định dạng
+    (xem app/formats.py) cho một phiên bản catalog, dùng chung cho mọi người học.
+    Tiến độ của từng người được nối vào ở mỗi request (render()).
+    """
+
+    def __init__(self, catalog_version, fmt, head):
+        self.catalog_version = catalog_version
+        self.fmt = fmt
+        self._head = head
+        # Nén sẵn phần catalog thành một đoạn deflate chưa kết thúc (Z_SYNC_FLUSH): mỗi request chỉ cần nén
+        # phần đuôi nhỏ (tiến độ của người học) rồi nối vào, kết quả vẫn là một luồng gzip hợp lệ
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._head_deflated = compressor.compress(self._head) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        self._head_crc = zlib.crc32(self._head)
+
+    def render(self, versions, user_data, gzipped=False):
+        """Payload /api/data hoàn chỉnh với `user_data` (đã serialize theo cùng định dạng, xem read_user_data())."""
+        if self.fmt == formats.MSGPACK:
+            tail = jsonstream.packb('user_data') + user_data + jsonstream.packb('version') + jsonstream.packb(version_token(versions))
+        else:
+            tail = b',"user_data":' + user_data + b',"version":' + jsonstream.dumps(version_token(versions)) + b'}'
+        if not gzipped:
+            return self._head + tail
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        trailer = struct.pack('<II', zlib.crc32(tail, self._head_crc), (len(self._head) + len(tail)) & 0xFFFFFFFF)
+        return b''.join((_GZIP_HEADER, self._head_deflated, compressor.compress(tail), compressor.flush(), trailer))
+
+
+def version_token(versions):
+    """Chuỗi phiên bản gửi cho client (dùng làm ETag): '<catalog>.<tiến độ của người học>'."""
+    return f"{versions[0]}.{versions[1]}"
+
+
+def bump_catalog_version(cursor):
+    """
+    Tăng phiên bản catalog trong CÙNG transaction với thay đổi dữ liệu.
+    Gọi nhiều lần trong một transaction chỉ tăng một lần (xem hàm SQL bump_catalog_version).
+    """
+    global _known_version
+    cursor.execute('SELECT bump_catalog_version(%s)', (CATALOG,))
+    with _lock:
+        # Buộc worker này đọc lại phiên bản từ database ở request kế tiếp
+        _known_version = None
+
+
+def _read_catalog_version(cursor):
+    cursor.execute('SELECT version FROM catalog_state WHERE name = %s', (CATALOG,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def _read_progress_version(cursor, user_id):
+    cursor.execute('SELECT version FROM user_progress_state WHERE user_id = %s', (user_id,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def get_cached_catalog_version():
+    """Phiên bản catalog nếu worker này đã biết và chưa quá CATALOG_VERSION_TTL, ngược lại trả về None."""
+    known = _known_version
+    if known is None or time.monotonic() - known[1] > CATALOG_VERSION_TTL:
+        return None
+    return known[0]
+
+
+def _remember_catalog_version(version):
+    global _known_version
+    with _lock:
+        _known_version = (version, time.monotonic())
+
+
+def get_catalog_version():
+    """Phiên bản catalog hiện tại, chỉ truy vấn database khi bản đã biết hết hạn."""
+    version = get_cached_catalog_version()
+    metrics.CACHE_REQUESTS.inc(cache='catalog_version', result='miss' if version is None else 'hit')
+    if version is None:
+        with db_cursor(readonly=True) as cursor:
+            version = _read_catalog_version(cursor)
+        _remember_catalog_version(version)
+    return version
+
+
+def get_current_versions(user_id):
+    """(phiên bản catalog, phiên bản tiến độ của người học). Phiên bản tiến độ luôn được đọc từ database."""
+    catalog_version = get_cached_catalog_version()
+    with db_cursor(readonly=True) as cursor:
+        if catalog_version is None:
+            catalog_version = _read_catalog_version(cursor)
+            _remember_catalog_version(catalog_version)
+        return (catalog_version, _read_progress_version(cursor, user_id))
+
+
+# Các truy vấn tạo nên payload /api/data, theo đúng thứ tự các khóa trong JSON
+CATALOG_QUERIES = [
+    ('collections', 'SELECT * FROM collections WHERE is_visible = 1 ORDER BY name'),
+    ('topics', '''
+        SELECT t.* FROM topics t
+        JOIN collections c ON t.collection_id = c.id
+        WHERE c.is_visible = 1
+        ORDER BY t.collection_id, t.position, t.id
+    '''),
+    ('words', '''
+        SELECT w.* FROM words w
+        JOIN topics t ON w.topic_id = t.id
+        JOIN collections c ON t.collection_id = c.id
+        WHERE c.is_visible = 1
+        ORDER BY t.id, w.position, w.id
+    '''),
+]
+# Tiến độ của một người học (không gửi lại user_id)
+USER_DATA_QUERY = '''
+    SELECT word_id, srs_level, next_review_at, is_favorite, change_version
+    FROM user_word_data WHERE user_id = %s ORDER BY word_id
+'''
+
+
+def _begin_consistent_read(conn, user_id=None):
+    """
+    Mở transaction REPEATABLE READ để phiên bản và dữ liệu đọc ra thuộc cùng một snapshot của Postgres.
+    Trả về phiên bản catalog, hoặc cặp (catalog, tiến độ) nếu có `user_id`.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        catalog_version = _read_catalog_version(cursor)
+        if user_id is None:
+            return catalog_version
+        return (catalog_version, _read_progress_version(cursor, user_id))
+
+
+def _iter_catalog_fragment(conn, columnar=False):
+    for index, (key, query) in enumerate(CATALOG_QUERIES):
+        yield (b',' if index else b'') + b'"' + key.encode('ascii') + b'":'
+        yield from jsonstream.iter_json_array(conn, query, columnar=columnar)
+
+
+def _build_snapshot(fmt):
+    with db_connection(readonly=True) as conn:
+        catalog_version = _begin_consistent_read(conn)
+        if fmt == formats.MSGPACK:
+            # Map 5 khóa: các bảng catalog ở đây, 'user_data' và 'version' được nối vào ở render()
+            head = b'\x85' + b''.join(jsonstream.packb(key) + jsonstream.pack_rows(conn, query) for key, query in CATALOG_QUERIES)
+        else:
+            head = b'{' + b''.join(_iter_catalog_fragment(conn, columnar=fmt == formats.COLUMNAR))
+    return Snapshot(catalog_version, fmt, head)
+
+
+def read_user_data(user_id, fmt=formats.JSON):
+    """Tiến độ của một người học: (phiên bản tiến độ, bảng đã serialize theo `fmt`), đọc trong cùng một snapshot."""
+    with db_connection(readonly=True) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+            progress_version = _read_progress_version(cursor, user_id)
+        if fmt == formats.MSGPACK:
+            user_data = jsonstream.pack_rows(conn, USER_DATA_QUERY, (user_id,))
+        else:
+            user_data = b''.join(jsonstream.iter_json_array(conn, USER_DATA_QUERY, (user_id,), columnar=fmt == formats.COLUMNAR))
+    return progress_version, user_data
+
+
+def stream_catalog(user_id, columnar=False):
+    """
+    Phát payload /api/data (JSON) của một người học theo từng chunk thay vì dựng sẵn trong bộ nhớ (chế độ streaming).
+    Trả về (versions, chunks). Kết nối database được giữ tới khi `chunks` chạy hết hoặc bị close().
+    """
+    def generate():
+        with db_connection(readonly=True) as conn:
+            versions = _begin_consistent_read(conn, user_id)
+            yield versions
+            yield b'{"version":' + jsonstream.dumps(version_token(versions)) + b','
+            yield from _iter_catalog_fragment(conn, columnar)
+            yield b',"user_data":'
+            yield from jsonstream.iter_json_array(conn, USER_DATA_QUERY, (user_id,), columnar=columnar)
+            yield b'}'
+
+    chunks = generate()
+    # Chạy trước tới khi đọc xong phiên bản để có ETag trước khi gửi header
+    versions = next(chunks)
+    return versions, chunks
+
+
+def get_snapshot(fmt=formats.JSON):
+    """
+    Lấy snapshot catalog theo định dạng `fmt` cho phiên bản catalog hiện tại; chỉ chạy lại các truy vấn khi
+    phiên bản đã đổi (tiến độ của người học thay đổi không làm snapshot cũ đi).
+    Khi nhiều request cùng gặp snapshot cũ, chỉ một request dựng lại, các request khác chờ và dùng chung.
+    """
+    catalog_version = get_catalog_version()
+    snapshot = _snapshots.get(fmt)
+    if snapshot is not None and snapshot.catalog_version == catalog_version:
+        metrics.CACHE_REQUESTS.inc(cache='catalog_snapshot', result='hit')
+        return snapshot
+
+    with _build_lock:
+        snapshot = _snapshots.get(fmt)
+        if snapshot is not None and snapshot.catalog_version >= catalog_version:
+            metrics.CACHE_REQUESTS.inc(cache='catalog_snapshot', result='hit')
+            return snapshot
+        metrics.CACHE_REQUESTS.inc(cache='catalog_snapshot', result='miss')
+        snapshot = _build_snapshot(fmt)
+        _snapshots[fmt] = snapshot
+    _remember_catalog_version(snapshot.catalog_version)
+    return snapshot
+
+
+def parse_version_token(token):
+    """Ngược lại với version_token(): '12.345' -> (12, 345). Báo ValueError nếu sai định dạng."""
+    catalog_version, progress_version = token.split('.')
+    versions = (int(catalog_version), int(progress_version))
+    if versions[0] < 0 or versions[1] < 0:
+        raise ValueError(token)
+    return versions
+
+
+# Các chủ đề có từ được thêm/sửa/xóa sau phiên bản %(since)s
+_TOUCHED_TOPICS = '''
+    WITH touched_topics AS (
+        SELECT topic_id AS id FROM words WHERE change_version > %(since)s
+        UNION
+        SELECT parent_id FROM deleted_rows
+        WHERE stream = %(stream)s AND table_name = 'words' AND change_version > %(since)s
+    )
+'''
+
+
+def get_changes(since, user_id, include_words=True):
+    """
+    Các dòng được thêm/sửa/xóa sau phiên bản `since` (cặp (catalog, tiến độ)) của người học `user_id`.
+    Chủ đề có từ bị thêm/sửa/xóa cũng được gửi lại (kèm word_count mới).
+    include_words=False bỏ qua danh sách từ: client chỉ tải từ theo chủ đề thì tự tải lại các chủ đề đã đổi.
+    Trả về None nếu `since` mới hơn phiên bản hiện tại (ví dụ database đã được tạo lại):
+    khi đó client phải tải lại toàn bộ /api/data.
+    """
+    since_catalog, since_progress = since
+    with db_cursor(psycopg2.extras.RealDictCursor, readonly=True) as cursor:
+        cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        cursor.execute('''
+            SELECT (SELECT version FROM catalog_state WHERE name = %s) AS catalog,
+                   (SELECT version FROM user_progress_state WHERE user_id = %s) AS progress
+        ''', (CATALOG, user_id))
+        row = cursor.fetchone()
+        versions = (row['catalog'] or 0, row['progress'] or 0)
+        if since_catalog > versions[0] or since_progress > versions[1]:
+            return None
+
+        collections, topics, words, deleted = [], [], [], {}
+        # Chỉ chạy các truy vấn catalog khi catalog đã đổi (tiến độ thay đổi thường xuyên hơn nhiều)
+        if since_catalog < versions[0]:
+            # Gửi cả bộ sưu tập vừa bị ẩn (is_visible = 0) để client tự gỡ các chủ đề/từ của nó, và bộ sưu tập
+            # chỉ đổi bộ đếm (có chủ đề/từ được thêm/xóa): bộ đếm không đổi change_version (migration 0011)
+            cursor.execute(_TOUCHED_TOPICS + '''
+                SELECT * FROM collections
+                WHERE change_version > %(since)s OR id IN (
+                    SELECT collection_id FROM topics
+                    WHERE change_version > %(since)s OR id IN (SELECT id FROM touched_topics)
+                    UNION
+                    SELECT parent_id FROM deleted_rows
+                    WHERE stream = %(stream)s AND table_name = 'topics' AND change_version > %(since)s
+                )
+                ORDER BY name
+            ''', {'since': since_catalog, 'stream': CATALOG})
+            collections = cursor.fetchall()
+
+            # Bộ sưu tập vừa hiện lại (hoặc vừa import) thì client chưa có gì: gửi toàn bộ chủ đề/từ của nó
+            cursor.execute(_TOUCHED_TOPICS + '''
+                SELECT t.*
+                FROM topics t
+                JOIN collections c ON t.collection_id = c.id
+                WHERE c.is_visible = 1
+                  AND (t.change_version > %(since)s OR c.change_version > %(since)s OR t.id IN (SELECT id FROM touched_topics))
+                ORDER BY t.collection_id, t.position, t.id
+            ''', {'since': since_catalog, 'stream': CATALOG})
+            topics = cursor.fetchall()
+
+            if include_words:
+                cursor.execute('''
+                    SELECT w.* FROM words w
+                    JOIN topics t ON w.topic_id = t.id
+                    JOIN collections c ON t.collection_id = c.id
+                    WHERE c.is_visible = 1 AND (w.change_version > %s OR c.change_version > %s)
+                    ORDER BY t.id, w.position, w.id
+                ''', (since_catalog, since_catalog))
+                words = cursor.fetchall()
+
+            cursor.execute('''
+                SELECT table_name, array_agg(DISTINCT row_id) AS ids FROM deleted_rows
+                WHERE stream = %s AND change_version > %s
+                GROUP BY table_name
+            ''', (CATALOG, since_catalog))
+            deleted = {row['table_name']: row['ids'] for row in cursor.fetchall()}
+
+        user_data = []
+        if since_progress < versions[1]:
+            cursor.execute('''
+                SELECT word_id, srs_level, next_review_at, is_favorite, change_version
+                FROM user_word_data WHERE user_id = %s AND change_version > %s
+            ''', (user_id, since_progress))
+            user_data = cursor.fetchall()
+
+    return _changes_payload(versions, collections, topics, words, user_data, deleted)
+
+
+def _changes_payload(versions, collections, topics, words, user_data, deleted):
+    return {
+        'version': version_token(versions),
+        'collections': collections,
+        'topics': topics,
+        'words': words,
+        'user_data': user_data,
+        'deleted': {
+            'collections': deleted.get('collections', []),
+            'topics': deleted.get('topics', []),
+            'words': deleted.get('words', []),
+            # Tiến độ chỉ bị xóa dây chuyền theo từ: client gỡ tiến độ của các từ đã bị xóa
+            'user_data': deleted.get('words', []),
+        }
+    }
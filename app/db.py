@@ -1,12 +1,432 @@
 import psycopg2
 import psycopg2.extras # Dùng để lấy data dạng dictionary
+import psycopg2.extensions
+import psycopg2.pool
+import itertools
+import logging
 import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_request_context, request
+from app import metrics
 
-def get_db_connection():
-    """Hàm dùng chung để lấy kết nối database PostgreSQL từ Render."""
+# Cấu hình pool cho MỖI tiến trình (mỗi gunicorn worker có pool riêng),
+# nên tổng số kết nối tối đa tới Postgres = DB_POOL_MAX * số worker.
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10)) # Số giây chờ khi pool đã hết kết nối
+DB_POOL_CHECK_INTERVAL = float(os.environ.get('DB_POOL_CHECK_INTERVAL', 30)) # Kết nối rảnh lâu hơn mức này sẽ được kiểm tra lại
+
+# Replica chỉ đọc (streaming replication của Postgres). Các truy vấn đánh dấu readonly (db_connection(readonly=True))
+# được chia đều cho các replica còn kết nối được và không trễ quá DB_REPLICA_MAX_LAG; không có replica nào
+# dùng được thì chạy trên primary (DATABASE_URL). Mỗi replica có pool riêng, cùng cấu hình DB_POOL_*.
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()] # DSN các replica, cách nhau bởi dấu phẩy
+DB_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 5)) # Replica trễ hơn số giây này không nhận truy vấn đọc
+DB_REPLICA_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', 5)) # Số giây giữa hai lần đo độ trễ của một replica
+DB_READ_YOUR_WRITES = int(os.environ.get('DB_READ_YOUR_WRITES', 10)) # Sau một request ghi, client đó đọc từ primary trong số giây này
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY_COOKIE = 'db_primary' # Cookie ngắn hạn đánh dấu client vừa ghi dữ liệu (xem init_app())
+
+# Độ trễ (giây) của replica so với primary. Replica đã áp dụng hết WAL nhận được thì coi như không trễ:
+# pg_last_xact_replay_timestamp() đứng yên khi primary không có gì để ghi (và là NULL ngay sau khi replica
+# khởi động lại; lúc đó vị trí đã nhận có thể đứng sau vị trí đã áp dụng từ pg_wal cục bộ, nên so sánh bằng >=).
+REPLICA_LAG_QUERY = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_replay_lsn() >= pg_last_wal_receive_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp())
+    END
+'''
+
+_logger = logging.getLogger(__name__)
+
+
+def get_database_url():
     db_url = os.environ.get('DATABASE_URL')
     if not db_url:
         raise Exception("DATABASE_URL không được tìm thấy trong biến môi trường.")
-        
-    conn = psycopg2.connect(db_url)
-    return conn
\ No newline at end of file
+    return db_url
+
+
+class _InstrumentedCursorMixin:
+    """Đo thời gian và số dòng của mỗi câu lệnh (xem app/metrics.py)."""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            metrics.record_query(query, time.perf_counter() - start, self.rowcount)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            metrics.record_query(query, time.perf_counter() - start, self.rowcount)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            metrics.record_query(sql, time.perf_counter() - start, self.rowcount)
+
+
+_instrumented_cursors = {}
+
+def _instrumented_cursor(cursor_factory):
+    cursor_class = _instrumented_cursors.get(cursor_factory)
+    if cursor_class is None:
+        cursor_class = type(f'Instrumented{cursor_factory.__name__}', (_InstrumentedCursorMixin, cursor_factory), {})
+        _instrumented_cursors[cursor_factory] = cursor_class
+    return cursor_class
+
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    """Kết nối của pool: mọi cursor (kể cả RealDictCursor và server-side cursor) đều được đo."""
+
+    def cursor(self, *args, **kwargs):
+        kwargs['cursor_factory'] = _instrumented_cursor(kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor)
+        return super().cursor(*args, **kwargs)
+
+
+class ConnectionPool:
+    """
+    Pool kết nối dùng chung cho các thread của một tiến trình.
+    Khác với ThreadedConnectionPool gốc: chờ (có timeout) khi hết kết nối thay vì báo lỗi ngay,
+    kiểm tra kết nối khi lấy ra và tự loại bỏ các kết nối đã hỏng.
+    """
+
+    def __init__(self, dsn, minconn, maxconn, timeout, check_interval):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self._pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, dsn, connection_factory=InstrumentedConnection)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {} # id(conn) -> thời điểm trả về pool gần nhất
+        self._lock = threading.Lock()
+        self._in_use = 0
+
+    def getconn(self, timeout=None):
+        """Lấy một kết nối, chờ tối đa `timeout` giây (mặc định self.timeout; 0: không chờ) khi pool đã hết."""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        acquired = self._slots.acquire(timeout=timeout)
+        metrics.POOL_WAIT.observe(time.perf_counter() - start)
+        if not acquired:
+            raise psycopg2.pool.PoolError(f"Không lấy được kết nối database sau {timeout} giây (pool đã dùng hết {self.maxconn} kết nối).")
+        try:
+            while True:
+                conn = self._pool.getconn()
+                if self._is_healthy(conn):
+                    with self._lock:
+                        self._in_use += 1
+                    return conn
+                # Kết nối hỏng (server restart, mạng rớt...): bỏ đi và lấy kết nối khác
+                self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, close=False):
+        try:
+            if conn.closed or conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            if close:
+                self._discard(conn)
+            else:
+                with self._lock:
+                    self._last_used[id(conn)] = time.monotonic()
+                self._pool.putconn(conn)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def stats(self):
+        """Số kết nối đang được dùng, đang rảnh trong pool và số tối đa."""
+        with self._lock:
+            return {'in_use': self._in_use, 'idle': len(self._pool._pool), 'max': self.maxconn}
+
+    def expire_idle(self):
+        """Buộc kiểm tra lại các kết nối đang rảnh ở lần lấy ra tiếp theo (ví dụ sau khi server vừa khởi động lại)."""
+        with self._lock:
+            for conn in self._pool._pool:
+                self._last_used[id(conn)] = float('-inf')
+
+    def closeall(self):
+        with self._lock:
+            self._last_used.clear()
+        self._pool.closeall()
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        with self._lock:
+            last_used = self._last_used.get(id(conn))
+        # Kết nối mới tạo hoặc vừa được dùng thì không cần kiểm tra lại
+        if last_used is None or time.monotonic() - last_used < self.check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        with self._lock:
+            self._last_used.pop(id(conn), None)
+        try:
+            self._pool.putconn(conn, close=True)
+        except psycopg2.Error:
+            pass
+
+
+class Replica:
+    """
+    Một replica chỉ đọc: pool kết nối riêng (tạo khi cần, để replica chưa sẵn sàng không chặn lúc khởi động)
+    và độ trễ đo được lần gần nhất. lag là None khi không kết nối được hoặc chưa đo lần nào.
+    Độ trễ được đo bởi thread nền (_monitor_replicas), request chỉ đọc kết quả.
+    """
+
+    def __init__(self, name, dsn):
+        self.name = name
+        self.dsn = dsn
+        self.pool = None
+        self.lag = None
+        self._checked_at = None
+        self._monitor_conn = None # Kết nối riêng của thread kiểm tra: không tranh với request khi pool đang bận
+
+    def available(self):
+        """True nếu replica nhận được truy vấn đọc (kết nối được và trễ không quá DB_REPLICA_MAX_LAG)."""
+        lag = self.lag
+        return lag is not None and lag <= DB_REPLICA_MAX_LAG
+
+    def check(self):
+        """Đo lại độ trễ (thread nền gọi mỗi DB_REPLICA_CHECK_INTERVAL giây)."""
+        lag = self._measure_lag()
+        if lag is not None and self.pool is None:
+            try:
+                self.pool = ConnectionPool(self.dsn, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, DB_POOL_CHECK_INTERVAL)
+            except psycopg2.Error:
+                lag = None
+        self._set_lag(lag)
+
+    def mark_failed(self):
+        """Replica lỗi kết nối: không dùng tới lần kiểm tra sau."""
+        self._set_lag(None)
+
+    def _set_lag(self, lag):
+        was_available = self.lag is not None and self.lag <= DB_REPLICA_MAX_LAG
+        is_available = lag is not None and lag <= DB_REPLICA_MAX_LAG
+        if was_available and not is_available:
+            reason = 'không kết nối được' if lag is None else f'trễ {lag:.1f} giây'
+            _logger.warning(f"Replica {self.name} {reason}, truy vấn đọc chuyển sang primary")
+        elif is_available and not was_available and self._checked_at is not None:
+            _logger.warning(f"Replica {self.name} đã dùng lại được (trễ {lag:.1f} giây)")
+        if lag is None and self.pool is not None:
+            self.pool.expire_idle() # Kết nối rảnh có thể đã đứt theo replica
+        self.lag = lag
+        self._checked_at = time.monotonic()
+
+    def _measure_lag(self):
+        try:
+            if self._monitor_conn is None or self._monitor_conn.closed:
+                self._monitor_conn = psycopg2.connect(self.dsn, connect_timeout=max(int(DB_POOL_TIMEOUT), 1))
+            with self._monitor_conn.cursor() as cursor:
+                cursor.execute(REPLICA_LAG_QUERY)
+                lag = cursor.fetchone()[0]
+            self._monitor_conn.rollback()
+            return None if lag is None else max(float(lag), 0.0)
+        except psycopg2.Error:
+            if self._monitor_conn is not None:
+                self._monitor_conn.close()
+                self._monitor_conn = None
+            return None
+
+
+def _monitor_replicas(replicas):
+    while True:
+        for replica in replicas:
+            try:
+                replica.check()
+            except Exception as e:
+                _logger.error(f"Không kiểm tra được replica {replica.name}: {e}")
+        time.sleep(DB_REPLICA_CHECK_INTERVAL)
+
+
+def _gevent_patched():
+    gevent_monkey = sys.modules.get('gevent.monkey')
+    return gevent_monkey is not None and gevent_monkey.is_module_patched('socket')
+
+def _gevent_wait_callback(conn):
+    """Chờ kết quả của psycopg2 bằng gevent: greenlet khác được chạy trong lúc chờ database."""
+    from gevent.socket import wait_read, wait_write
+    while True:
+        state = conn.poll()
+        if state == psycopg2.extensions.POLL_OK:
+            return
+        if state == psycopg2.extensions.POLL_READ:
+            wait_read(conn.fileno())
+        elif state == psycopg2.extensions.POLL_WRITE:
+            wait_write(conn.fileno())
+        else:
+            raise psycopg2.OperationalError(f'Trạng thái poll không hợp lệ: {state}')
+
+def cooperative():
+    """True nếu psycopg2 đang chạy ở chế độ green (gunicorn WORKER_MODE=gevent, xem gunicorn.conf.py)."""
+    return psycopg2.extensions.get_wait_callback() is not None
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_replicas = []
+_replica_turn = itertools.count()
+
+def get_pool():
+    """
+    Lấy pool kết nối của tiến trình hiện tại, tạo mới nếu chưa có.
+    Pool được gắn với PID nên an toàn khi gunicorn fork worker sau khi đã import app.
+    """
+    global _pool, _pool_pid, _replicas
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                # Worker gevent: câu lệnh SQL nhường greenlet thay vì chặn cả tiến trình
+                if _gevent_patched() and not cooperative():
+                    psycopg2.extensions.set_wait_callback(_gevent_wait_callback)
+                _pool = ConnectionPool(get_database_url(), DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, DB_POOL_CHECK_INTERVAL)
+                _replicas = [Replica(f'replica{index}', dsn) for index, dsn in enumerate(DATABASE_REPLICA_URLS)]
+                if _replicas:
+                    # Thread được tạo lại theo PID như pool: thread không còn sau khi gunicorn fork
+                    threading.Thread(target=_monitor_replicas, args=(_replicas,), name='db-replica-monitor',
+                                     daemon=True).start()
+                _pool_pid = pid
+    return _pool
+
+def get_replicas():
+    """Các replica của tiến trình hiện tại, theo thứ tự trong DATABASE_REPLICA_URLS."""
+    get_pool()
+    return _replicas
+
+def replica_lag():
+    """Độ trễ đo được của từng replica cho /metrics (-1: không kết nối được)."""
+    if _pool is None or _pool_pid != os.getpid():
+        return None
+    return {(replica.name,): -1 if replica.lag is None else replica.lag for replica in _replicas}
+
+def pool_stats():
+    """Thống kê pool của tiến trình hiện tại cho /metrics (None nếu tiến trình chưa tạo pool)."""
+    if _pool is None or _pool_pid != os.getpid():
+        return None
+    return {(state,): count for state, count in _pool.stats().items()}
+
+def _primary_required():
+    """
+    Read-your-writes: request ghi dữ liệu, request đã dùng kết nối primary trước đó,
+    hoặc client vừa ghi trong DB_READ_YOUR_WRITES giây (cookie PRIMARY_COOKIE) luôn đọc từ primary.
+    """
+    if not has_request_context():
+        return False
+    return (request.method not in SAFE_METHODS or g.get('db_primary_used', False)
+            or PRIMARY_COOKIE in request.cookies)
+
+def _replica_connection():
+    """(kết nối, replica) từ một replica dùng được, hoặc None nếu phải đọc từ primary."""
+    replicas = [replica for replica in get_replicas() if replica.available()]
+    if not replicas:
+        return None
+    start = next(_replica_turn) % len(replicas)
+    replicas = replicas[start:] + replicas[:start]
+    # Lấy kết nối rảnh ở bất kỳ replica nào trước; chỉ chờ (DB_POOL_TIMEOUT) khi mọi replica đều đang bận
+    for replica, timeout in [(replica, 0) for replica in replicas] + [(replicas[0], None)]:
+        if not replica.available():
+            continue
+        try:
+            return replica.pool.getconn(timeout), replica
+        except psycopg2.pool.PoolError:
+            continue # Pool đã hết kết nối: replica vẫn khỏe, chỉ đang bận
+        except psycopg2.OperationalError:
+            replica.mark_failed() # Không kết nối được: bỏ qua tới lần kiểm tra sau
+    return None
+
+def _acquire(readonly):
+    """(kết nối, replica hoặc None nếu là primary) cho một khối lệnh db_connection()."""
+    if readonly and DATABASE_REPLICA_URLS and not _primary_required():
+        acquired = _replica_connection()
+        if acquired is not None:
+            metrics.DB_CONNECTIONS.inc(target=acquired[1].name)
+            return acquired
+    conn = get_db_connection()
+    metrics.DB_CONNECTIONS.inc(target='primary')
+    if not readonly and has_request_context():
+        g.db_primary_used = True
+    return conn, None
+
+def get_db_connection():
+    """
+    Lấy một kết nối từ pool. Người gọi PHẢI trả kết nối lại bằng release_db_connection().
+    Trong các route nên dùng db_connection()/db_cursor() để việc commit/rollback/trả kết nối được tự động.
+    """
+    return get_pool().getconn()
+
+def release_db_connection(conn, close=False):
+    """Trả kết nối về pool. close=True để loại bỏ hẳn kết nối (ví dụ khi nó đã hỏng)."""
+    get_pool().putconn(conn, close=close)
+
+@contextmanager
+def db_connection(readonly=False):
+    """
+    Context manager lấy kết nối từ pool:
+    commit khi khối lệnh chạy xong, rollback nếu có exception, luôn trả kết nối về pool.
+    readonly=True cho khối lệnh chỉ đọc: được chạy trên replica nếu có (xem DATABASE_REPLICA_URLS).
+    """
+    conn, replica = _acquire(readonly)
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True # Lỗi kết nối: không đưa kết nối này trở lại pool
+        raise
+    finally:
+        if not broken and not conn.closed and conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback() # Hoàn tác nếu có lỗi
+            except psycopg2.Error:
+                broken = True
+        if replica is None:
+            release_db_connection(conn, close=broken)
+        else:
+            if broken:
+                replica.mark_failed()
+            replica.pool.putconn(conn, close=broken)
+
+@contextmanager
+def db_cursor(cursor_factory=None, readonly=False):
+    """
+    Giống db_connection() nhưng trả về luôn cursor.
+    Truyền cursor_factory=psycopg2.extras.RealDictCursor để lấy kết quả dạng dictionary.
+    """
+    with db_connection(readonly) as conn:
+        with conn.cursor(cursor_factory=cursor_factory) as cursor:
+            yield cursor
+
+def _remember_write(response):
+    # Client vừa ghi dữ liệu đọc từ primary thêm một lúc, để thấy ngay thay đổi của mình dù replica còn trễ
+    if request.method not in SAFE_METHODS and response.status_code < 400:
+        response.set_cookie(PRIMARY_COOKIE, '1', max_age=DB_READ_YOUR_WRITES, httponly=True, samesite='Lax')
+    return response
+
+def init_app(app):
+    if DATABASE_REPLICA_URLS:
+        app.after_request(_remember_write)
@@ -0,0 +1,92 @@
+import gzip
+import os
+
+from flask import current_app, request
+from app import jsonstream
+
+try:
+    import brotli # Không bắt buộc: nếu có, response /api được nén bằng brotli khi trình duyệt hỗ trợ
+except ImportError:
+    brotli = None
+
+# Định dạng response của /api, chọn theo header Accept:
+#  - JSON (mặc định): mỗi dòng là một object, tên cột lặp lại ở mọi dòng
+#  - JSON dạng cột: mỗi danh sách dòng thành {"columns": [...], "rows": [[...], ...]}, tên cột chỉ gửi một lần
+#  - MessagePack dạng cột (cần thư viện msgpack): như trên nhưng mã hóa nhị phân
+JSON = 'application/json'
+COLUMNAR = 'application/vnd.aneng.columnar+json'
+MSGPACK = 'application/msgpack'
+AVAILABLE_FORMATS = [JSON, COLUMNAR] + ([MSGPACK] if jsonstream.packb is not None else [])
+_ETAG_SUFFIXES = {JSON: '', COLUMNAR: '-c', MSGPACK: '-m'}
+
+API_COMPRESS_MIN_SIZE = int(os.environ.get('API_COMPRESS_MIN_SIZE', 1024)) # Response nhỏ hơn (byte) thì không nén
+API_GZIP_LEVEL = int(os.environ.get('API_GZIP_LEVEL', 6))
+API_BROTLI_QUALITY = int(os.environ.get('API_BROTLI_QUALITY', 5)) # Mức 5 nén tốt hơn gzip -6 mà vẫn đủ nhanh cho nội dung động
+
+
+def negotiate():
+    """Định dạng response theo header Accept của request hiện tại (JSON nếu không chỉ định)."""
+    return request.accept_mimetypes.best_match(AVAILABLE_FORMATS, default=JSON)
+
+
+def format_etag(etag, fmt):
+    """ETag riêng cho từng định dạng của cùng một phiên bản dữ liệu."""
+    return etag + _ETAG_SUFFIXES[fmt]
+
+
+def columnar(rows):
+    """Danh sách dòng (dict) -> {'columns': [...], 'rows': [[...], ...]}."""
+    columns = list(rows[0].keys()) if rows else []
+    return {'columns': columns, 'rows': [[row[column] for column in columns] for row in rows]}
+
+
+def encode(payload, fmt, tables=()):
+    """Serialize `payload` theo định dạng `fmt`; với định dạng dạng cột, các khóa trong `tables` được chuyển sang dạng cột."""
+    if fmt != JSON:
+        payload = dict(payload)
+        for key in tables:
+            payload[key] = columnar(payload[key])
+    if fmt == MSGPACK:
+        return jsonstream.packb(payload)
+    return jsonstream.dumps(payload)
+
+
+def respond(payload, tables=(), fmt=None):
+    """Response theo định dạng client yêu cầu; `tables` là các khóa của `payload` chứa danh sách dòng."""
+    fmt = fmt or negotiate()
+    response = current_app.response_class(encode(payload, fmt, tables), mimetype=fmt)
+    response.vary.add('Accept')
+    return response
+
+
+def _choose_encoding():
+    if brotli is not None and request.accept_encodings['br'] > 0:
+        return 'br'
+    if request.accept_encodings['gzip'] > 0:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    """
+    after_request của blueprint /api: nén response lớn hơn API_COMPRESS_MIN_SIZE bằng brotli hoặc gzip.
+    Bỏ qua response dạng streaming và response đã tự nén (ví dụ snapshot /api/data được nén sẵn).
+    """
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    encoding = _choose_encoding() if len(data) >= API_COMPRESS_MIN_SIZE else None
+    if encoding is None:
+        return response
+
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=API_BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=API_GZIP_LEVEL, mtime=0))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True) # Nội dung đã nén khác từng byte với bản gốc
+    return response
@@ -0,0 +1,322 @@
+import io
+import os
+import threading
+import time
+
+import psycopg2
+import psycopg2.extras
+from app.db import db_cursor
+
+# Hàng đợi job chạy nền lưu trong bảng jobs. Mỗi tiến trình (gunicorn worker) có một thread xử lý riêng,
+# được khởi động khi worker khởi động (hook post_worker_init trong gunicorn.conf.py, run.py khi chạy dev) và
+# khởi động lại khi cần (ensure_worker); các thread lấy job bằng FOR UPDATE SKIP LOCKED nên không tranh nhau.
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 5)) # Số giây giữa hai lần kiểm tra job mới khi rảnh
+JOB_HEARTBEAT_INTERVAL = float(os.environ.get('JOB_HEARTBEAT_INTERVAL', 30))
+JOB_STALE_AFTER = float(os.environ.get('JOB_STALE_AFTER', 300)) # Job 'running' không còn heartbeat quá lâu coi như đã chết
+JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', 7))
+JOB_PROGRESS_INTERVAL = 1.0 # Ghi tiến độ vào database tối đa mỗi giây một lần
+JOB_UPLOAD_CHUNK_SIZE = 1024 * 1024 # Kích thước mỗi đoạn file upload trong bảng job_uploads (migration 0010)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+_handlers = {}
+_app = None
+_worker = None
+_worker_pid = None
+_worker_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+class JobError(Exception):
+    """Lỗi dự kiến trong lúc chạy job: `message` được hiển thị cho admin, `result` (nếu có) lưu kèm job."""
+
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        self.message = message
+        self.result = result
+
+
+class Job:
+    """Job đang chạy, được truyền cho handler."""
+
+    def __init__(self, row):
+        self.id = row['id']
+        self.kind = row['kind']
+        self.params = row['params']
+        self._last_report = 0.0
+
+    def open_upload(self):
+        """File (nhị phân, seek được) đã upload kèm job; các đoạn được đọc dần từ database khi cần."""
+        return io.BufferedReader(_UploadReader(self.id))
+
+    def report(self, progress, total=None, message=None):
+        """Cập nhật tiến độ (dùng kết nối riêng nên admin thấy được ngay cả khi transaction của job chưa commit)."""
+        now = time.monotonic()
+        if now - self._last_report < JOB_PROGRESS_INTERVAL:
+            return
+        self._last_report = now
+        with db_cursor() as cursor:
+            cursor.execute(
+                'UPDATE jobs SET progress = %s, total = COALESCE(%s, total), message = COALESCE(%s, message), updated_at = NOW() WHERE id = %s',
+                (progress, total, message, self.id)
+            )
+
+
+def register(kind):
+    """Decorator đăng ký hàm xử lý cho một loại job. Hàm nhận Job và trả về (message, result)."""
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+def init_app(app):
+    """
+    Ghi nhớ app để thread xử lý chạy handler trong app context. Thread chỉ được tạo ở ensure_worker(), không
+    tạo ở đây để các lệnh `flask ...` (migrate, seed-translations) không nhận job.
+    """
+    global _app
+    _app = app
+
+
+def enqueue(kind, params=None, upload=None, serial_key=None):
+    """
+    Thêm job vào hàng đợi và trả về id. Job cùng `serial_key` (ví dụ cùng loại sắp xếp) chạy lần lượt.
+    `upload` (file nhị phân, ví dụ file import) được chép sang job_uploads theo từng đoạn, handler đọc lại
+    bằng job.open_upload(). Job chỉ hiện ra với worker khi đã chép xong (cùng một transaction).
+    """
+    if kind not in _handlers:
+        raise ValueError(f"Không có handler cho job '{kind}'")
+    with db_cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO jobs (kind, params, serial_key) VALUES (%s, %s, %s) RETURNING id',
+            (kind, psycopg2.extras.Json(params or {}), serial_key)
+        )
+        job_id = cursor.fetchone()[0]
+        if upload is not None:
+            _store_upload(cursor, job_id, upload)
+    ensure_worker()
+    _wakeup.set()
+    return job_id
+
+
+def _store_upload(cursor, job_id, upload):
+    seq = 0
+    while True:
+        chunk = _read_chunk(upload)
+        if not chunk:
+            return
+        cursor.execute('INSERT INTO job_uploads (job_id, seq, chunk) VALUES (%s, %s, %s)',
+                       (job_id, seq, psycopg2.Binary(chunk)))
+        seq += 1
+
+
+def _read_chunk(upload):
+    # Mọi đoạn trừ đoạn cuối phải đủ JOB_UPLOAD_CHUNK_SIZE byte (_UploadReader tính vị trí theo kích thước này)
+    parts = []
+    remaining = JOB_UPLOAD_CHUNK_SIZE
+    while remaining:
+        part = upload.read(remaining)
+        if not part:
+            break
+        parts.append(part)
+        remaining -= len(part)
+    return b''.join(parts)
+
+
+class _UploadReader(io.RawIOBase):
+    """Đọc file upload của một job từ job_uploads, giữ trong bộ nhớ tối đa một đoạn."""
+
+    def __init__(self, job_id):
+        super().__init__()
+        self.job_id = job_id
+        self._position = 0
+        self._seq = None
+        self._chunk = b''
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        else:
+            raise io.UnsupportedOperation('Không hỗ trợ seek từ cuối file upload')
+        if position < 0:
+            raise ValueError(f'Vị trí không hợp lệ: {position}')
+        self._position = position
+        return position
+
+    def tell(self):
+        return self._position
+
+    def readinto(self, buffer):
+        seq, offset = divmod(self._position, JOB_UPLOAD_CHUNK_SIZE)
+        if seq != self._seq:
+            with db_cursor() as cursor:
+                cursor.execute('SELECT chunk FROM job_uploads WHERE job_id = %s AND seq = %s', (self.job_id, seq))
+                row = cursor.fetchone()
+            self._chunk = bytes(row[0]) if row is not None else b''
+            self._seq = seq
+        data = self._chunk[offset:offset + len(buffer)]
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+def get_job(job_id):
+    """Trạng thái job (không kèm dữ liệu đầu vào), hoặc None nếu không tồn tại."""
+    with db_cursor(psycopg2.extras.RealDictCursor) as cursor:
+        cursor.execute('''
+            SELECT id, kind, status, params, progress, total, message, result, created_at, started_at, finished_at
+            FROM jobs WHERE id = %s
+        ''', (job_id,))
+        return cursor.fetchone()
+
+
+def recent_jobs(limit=10):
+    with db_cursor(psycopg2.extras.RealDictCursor) as cursor:
+        cursor.execute('''
+            SELECT id, kind, status, params, progress, total, message, result, created_at, finished_at
+            FROM jobs ORDER BY id DESC LIMIT %s
+        ''', (limit,))
+        return cursor.fetchall()
+
+
+def ensure_worker():
+    """Khởi động thread xử lý job của tiến trình hiện tại nếu chưa có (an toàn khi gunicorn fork)."""
+    global _worker, _worker_pid
+    pid = os.getpid()
+    if _worker is not None and _worker_pid == pid and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is None or _worker_pid != pid or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_worker, name='job-worker', daemon=True)
+            _worker_pid = pid
+            _worker.start()
+
+
+def _run_worker():
+    last_maintenance = 0.0
+    while True:
+        try:
+            if time.monotonic() - last_maintenance > JOB_STALE_AFTER:
+                _maintenance()
+                last_maintenance = time.monotonic()
+            row = _claim_next()
+        except Exception as e:
+            _log_error(f"Không lấy được job từ hàng đợi: {e}")
+            row = None
+        if row is None:
+            _wakeup.wait(JOB_POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+        _execute(Job(row))
+
+
+def _claim_next():
+    with db_cursor(psycopg2.extras.RealDictCursor) as cursor:
+        cursor.execute('''
+            UPDATE jobs SET status = 'running', started_at = NOW(), updated_at = NOW()
+            WHERE id = (
+                SELECT j.id FROM jobs j
+                WHERE j.status = 'queued'
+                  AND (j.serial_key IS NULL OR NOT EXISTS (
+                      SELECT 1 FROM jobs prev
+                      WHERE prev.serial_key = j.serial_key AND prev.id < j.id AND prev.status IN ('queued', 'running')))
+                ORDER BY j.id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, kind, params
+        ''')
+        return cursor.fetchone()
+
+
+def _execute(job):
+    handler = _handlers.get(job.kind)
+    heartbeat = _Heartbeat(job.id)
+    heartbeat.start()
+    try:
+        if handler is None:
+            raise JobError(f"Không có handler cho job '{job.kind}'")
+        if _app is not None:
+            with _app.app_context():
+                message, result = handler(job)
+        else:
+            message, result = handler(job)
+        _finish(job.id, SUCCEEDED, message, result)
+    except JobError as e:
+        _finish(job.id, FAILED, e.message, e.result)
+    except Exception as e:
+        _log_error(f"Job #{job.id} ({job.kind}) lỗi: {e}")
+        _finish(job.id, FAILED, f"Đã xảy ra lỗi: {e}", None)
+    finally:
+        heartbeat.stop()
+
+
+def _finish(job_id, status, message, result):
+    try:
+        with db_cursor() as cursor:
+            cursor.execute('''
+                UPDATE jobs SET status = %s, message = %s, result = %s,
+                                progress = CASE WHEN %s = 'succeeded' THEN COALESCE(total, progress) ELSE progress END,
+                                finished_at = NOW(), updated_at = NOW()
+                WHERE id = %s
+            ''', (status, message, psycopg2.extras.Json(result) if result is not None else None, status, job_id))
+            cursor.execute('DELETE FROM job_uploads WHERE job_id = %s', (job_id,))
+    except Exception as e:
+        _log_error(f"Không cập nhật được trạng thái job #{job_id}: {e}")
+
+
+def _maintenance():
+    with db_cursor() as cursor:
+        # Tiến trình chạy job đã chết (worker bị restart, server tắt...): transaction của nó đã bị rollback
+        cursor.execute('''
+            UPDATE jobs SET status = 'failed', message = 'Tiến trình xử lý đã dừng giữa chừng, không có thay đổi nào được lưu.',
+                            finished_at = NOW()
+            WHERE status = 'running' AND updated_at < NOW() - make_interval(secs => %s)
+        ''', (JOB_STALE_AFTER,))
+        cursor.execute('''
+            DELETE FROM job_uploads u USING jobs j WHERE u.job_id = j.id AND j.status IN ('succeeded', 'failed')
+        ''')
+        cursor.execute('''
+            DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < NOW() - make_interval(days => %s)
+        ''', (JOB_RETENTION_DAYS,))
+
+
+def _log_error(message):
+    if _app is not None:
+        _app.logger.error(message)
+
+
+class _Heartbeat:
+    """Định kỳ cập nhật updated_at của job đang chạy để phân biệt job chạy lâu với job đã chết."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'job-heartbeat-{job_id}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(JOB_HEARTBEAT_INTERVAL):
+            try:
+                with db_cursor() as cursor:
+                    cursor.execute('UPDATE jobs SET updated_at = NOW() WHERE id = %s', (self.job_id,))
+            except psycopg2.Error as e:
+                _log_error(f"Không cập nhật được heartbeat của job #{self.job_id}: {e}")
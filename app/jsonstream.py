@@ -0,0 +1,131 @@
+import itertools
+import json
+import os
+import zlib
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+try:
+    import orjson # Không bắt buộc: nhanh hơn json chuẩn nhiều lần nếu được cài
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack # Không bắt buộc: cần cho định dạng MessagePack của /api (xem app/formats.py)
+except ImportError:
+    msgpack = None
+
+# Số dòng mỗi lần server-side cursor lấy về và cũng là số dòng mỗi chunk JSON được gửi đi
+STREAM_ITERSIZE = int(os.environ.get('STREAM_ITERSIZE', 2000))
+
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+_cursor_ids = itertools.count()
+
+
+def http_date(value):
+    """
+    Định dạng ngày giờ giống JSON provider mặc định của Flask (werkzeug.http.http_date),
+    nhưng không đi qua email.utils nên nhanh hơn nhiều khi phải format hàng trăm nghìn dòng.
+    Giờ không có múi giờ được coi là UTC, như Flask.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return (f"{_DAYS[value.weekday()]}, {value.day:02d} {_MONTHS[value.month - 1]} {value.year:04d} "
+                f"{value.hour:02d}:{value.minute:02d}:{value.second:02d} GMT")
+    return f"{_DAYS[value.weekday()]}, {value.day:02d} {_MONTHS[value.month - 1]} {value.year:04d} 00:00:00 GMT"
+
+
+def _default(value):
+    if isinstance(value, date): # datetime cũng là date
+        return http_date(value)
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(value):
+        """Serialize thành bytes JSON."""
+        return orjson.dumps(value, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(value):
+        """Serialize thành bytes JSON."""
+        return json.dumps(value, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+if msgpack is not None:
+    def packb(value):
+        """Serialize thành bytes MessagePack (ngày giờ được định dạng giống JSON)."""
+        return msgpack.packb(value, default=_default, use_bin_type=True)
+else:
+    packb = None
+
+
+def iter_json_array(conn, query, params=None, itersize=STREAM_ITERSIZE, columnar=False):
+    """
+    Chạy truy vấn bằng server-side (named) cursor và sinh ra một mảng JSON các object theo từng chunk,
+    nên bộ nhớ chỉ giữ tối đa `itersize` dòng thay vì toàn bộ kết quả như fetchall().
+    columnar=True sinh ra {"columns": [...], "rows": [[...], ...]} (tên cột chỉ xuất hiện một lần).
+    Cần chạy trong transaction (kết nối lấy từ db_connection()).
+    """
+    with conn.cursor(name=f'json_stream_{next(_cursor_ids)}') as cursor:
+        cursor.itersize = itersize
+        cursor.execute(query, params)
+        columns = None
+        chunk = []
+        separator = b'['
+        for row in cursor:
+            if columns is None:
+                columns = [column.name for column in cursor.description]
+                if columnar:
+                    yield b'{"columns":' + dumps(columns) + b',"rows":'
+            chunk.append(dumps(row if columnar else dict(zip(columns, row))))
+            if len(chunk) >= itersize:
+                yield separator + b','.join(chunk)
+                separator = b','
+                chunk = []
+        if chunk:
+            yield separator + b','.join(chunk)
+            separator = b','
+        if columnar and columns is None:
+            # Không có dòng nào: server-side cursor chỉ có description sau lần fetch đầu tiên
+            columns = [column.name for column in cursor.description] if cursor.description else []
+            yield b'{"columns":' + dumps(columns) + b',"rows":'
+        yield (b']' if separator == b',' else b'[]') + (b'}' if columnar else b'')
+
+
+def iter_row_chunks(conn, query, params=None, itersize=STREAM_ITERSIZE, cursor_factory=None):
+    """
+    Chạy truy vấn bằng server-side cursor và sinh ra từng danh sách tối đa `itersize` dòng
+    (tuple, hoặc theo `cursor_factory`, ví dụ psycopg2.extras.RealDictCursor).
+    """
+    with conn.cursor(name=f'json_stream_{next(_cursor_ids)}', cursor_factory=cursor_factory) as cursor:
+        cursor.itersize = itersize
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(itersize)
+            if not rows:
+                return
+            yield rows
+
+
+def gzip_chunks(chunks):
+    """Nén gzip một luồng chunk bytes khi đang gửi đi; luôn close() `chunks` (trả kết nối database về pool)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31: định dạng gzip
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        chunks.close()
+
+
+def pack_rows(conn, query, params=None):
+    """Chạy truy vấn và trả về {"columns": [...], "rows": [[...], ...]} dạng bytes MessagePack."""
+    with conn.cursor() as cursor:
+        cursor.execute(query, params)
+        return packb({'columns': [column.name for column in cursor.description], 'rows': cursor.fetchall()})
@@ -1,8 +1,63 @@
-from flask import Blueprint, render_template
+import gzip
+import hashlib
+import threading
+
+from flask import Blueprint, current_app, render_template, request, url_for
+from app.assets import asset_url
 
 bp = Blueprint('main', __name__)
 
+# Các file sinh từ template không phụ thuộc request nên chỉ render một lần mỗi tiến trình
+_rendered_lock = threading.RLock() # RLock: sw.js cần ETag của trang chủ, được lấy khi đang giữ khóa
+_rendered = {} # tên -> (body, gzipped, etag)
+
+def _compress(body):
+    return body, gzip.compress(body, compresslevel=9), hashlib.sha256(body).hexdigest()[:16]
+
+def _render_index():
+    return _compress(render_template('index.html').encode('utf-8'))
+
+def _render_service_worker():
+    # Danh sách file giao diện cần cache sẵn; phiên bản cache đổi khi trang chủ hoặc bất kỳ asset nào đổi
+    shell_urls = [url_for('main.index'), asset_url('js/store.js'), asset_url('js/main.js')]
+    _, _, index_etag = _get_rendered('index', _render_index)
+    version = hashlib.sha256('\n'.join([index_etag] + shell_urls).encode('utf-8')).hexdigest()[:12]
+    return _compress(render_template('sw.js', version=version, shell_urls=shell_urls,
+                                     store_url=asset_url('js/store.js')).encode('utf-8'))
+
+def _get_rendered(name, render):
+    if current_app.debug:
+        return render() # Chế độ debug: luôn render lại để thấy ngay thay đổi của template
+    if name not in _rendered:
+        with _rendered_lock:
+            if name not in _rendered:
+                _rendered[name] = render()
+    return _rendered[name]
+
+def _respond(rendered, mimetype):
+    body, gzipped, etag = rendered
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    elif 'gzip' in request.accept_encodings:
+        response = current_app.response_class(gzipped, mimetype=mimetype)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = current_app.response_class(body, mimetype=mimetype)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
 @bp.route('/')
 def index():
     """Phục vụ file HTML chính của ứng dụng học tập."""
-    return render_template('index.html')
+    # Trang luôn được hỏi lại (để nhận URL asset mới sau mỗi lần deploy), các asset có hash thì cache vĩnh viễn
+    return _respond(_get_rendered('index', _render_index), 'text/html')
+
+@bp.route('/sw.js')
+def service_worker():
+    """
+    Service worker cho chế độ offline. Phục vụ ở gốc site (scope "/") với URL cố định, không qua
+    asset có hash: trình duyệt tự kiểm tra bản mới, và bản mới đổi tên cache khi asset đổi.
+    """
+    return _respond(_get_rendered('sw', _render_service_worker), 'text/javascript')
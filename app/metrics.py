@@ -0,0 +1,308 @@
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, has_request_context, request
+
+# Số liệu hiệu năng: thời gian xử lý request, số câu lệnh SQL/số dòng/thời gian chạy theo endpoint, câu lệnh chậm,
+# tình trạng pool kết nối và tỉ lệ trúng cache. Xem tại /metrics (định dạng text của Prometheus).
+# Mỗi gunicorn worker có bộ đếm riêng; đặt METRICS_DIR (thư mục dùng chung) để /metrics cộng dồn mọi worker.
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 10)) # Số giây giữa hai lần worker ghi số liệu ra METRICS_DIR
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') # Nếu đặt, /metrics yêu cầu header "Authorization: Bearer <token>"
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200)) # Câu lệnh SQL chậm hơn mức này được ghi log
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 1000)) # Request chậm hơn mức này được ghi log
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+BACKGROUND = 'background' # Nhãn endpoint cho câu lệnh chạy ngoài request (job, thread dịch...)
+
+_lock = threading.Lock()
+_registry = {} # tên -> metric
+_logger = logging.getLogger(__name__)
+_flusher_pid = None
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {} # tuple giá trị nhãn -> giá trị
+        _registry[name] = self
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def collect(self):
+        with _lock:
+            return {key: list(value) if isinstance(value, list) else value for key, value in self.values.items()}
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            # [số lần rơi vào từng bucket (không cộng dồn)..., tổng, số lần]
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[index] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+
+class Callback(_Metric):
+    """Số liệu được đọc lúc xuất /metrics: `func()` trả về một số, hoặc dict tuple giá trị nhãn -> số."""
+
+    def __init__(self, name, documentation, kind, func, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.func = func
+
+    def collect(self):
+        try:
+            value = self.func()
+        except Exception as e:
+            _logger.warning(f"Không đọc được số liệu {self.name}: {e}")
+            return {}
+        if value is None:
+            return {}
+        return value if isinstance(value, dict) else {(): value}
+
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Thời gian xử lý request (không tính phần body phát theo chunk)',
+                            ('endpoint', 'method', 'status'))
+REQUEST_QUERIES = Histogram('http_request_queries', 'Số câu lệnh SQL của mỗi request', ('endpoint',), QUERY_COUNT_BUCKETS)
+QUERIES = Counter('db_queries_total', 'Số câu lệnh SQL', ('endpoint',))
+QUERY_SECONDS = Counter('db_query_duration_seconds_total', 'Tổng thời gian chạy câu lệnh SQL', ('endpoint',))
+QUERY_ROWS = Counter('db_query_rows_total', 'Số dòng trả về/bị ảnh hưởng bởi câu lệnh SQL', ('endpoint',))
+SLOW_QUERIES = Counter('db_slow_queries_total', 'Số câu lệnh SQL chậm hơn SLOW_QUERY_MS', ('endpoint',))
+POOL_WAIT = Histogram('db_pool_wait_seconds', 'Thời gian chờ lấy kết nối từ pool')
+DB_CONNECTIONS = Counter('db_connections_total', 'Số lần lấy kết nối database theo nơi chạy (primary/replica)', ('target',))
+PHASE_SECONDS = Histogram('app_phase_duration_seconds', 'Thời gian của từng giai đoạn trong request (xem phase())',
+                          ('endpoint', 'phase'))
+CACHE_REQUESTS = Counter('app_cache_requests_total', 'Số lần tra cache trong tiến trình', ('cache', 'result'))
+
+
+def _current_endpoint():
+    if has_request_context():
+        return request.endpoint or 'unknown'
+    return BACKGROUND
+
+
+def record_query(query, elapsed, rowcount):
+    """Được gọi bởi cursor của app.db sau mỗi câu lệnh SQL."""
+    endpoint = _current_endpoint()
+    QUERIES.inc(endpoint=endpoint)
+    QUERY_SECONDS.inc(elapsed, endpoint=endpoint)
+    if rowcount is not None and rowcount > 0:
+        QUERY_ROWS.inc(rowcount, endpoint=endpoint)
+    if has_request_context():
+        stats = g.get('metrics_queries')
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc(endpoint=endpoint)
+        if isinstance(query, bytes):
+            query = query.decode('utf-8', 'replace')
+        _log(f"Câu lệnh SQL chậm ({elapsed * 1000:.0f} ms, {endpoint}): {' '.join(str(query).split())[:500]}")
+
+
+@contextmanager
+def phase(name):
+    """Đo một giai đoạn của request (ví dụ serialize JSON); kết quả có trong header Server-Timing và /metrics."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        PHASE_SECONDS.observe(elapsed, endpoint=_current_endpoint(), phase=name)
+        if has_request_context() and g.get('metrics_phases') is not None:
+            g.metrics_phases[name] = g.metrics_phases.get(name, 0) + elapsed
+
+
+def _log(message):
+    (current_app.logger if has_app_context() else _logger).warning(message)
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_queries = [0, 0.0] # số câu lệnh, tổng thời gian
+    g.metrics_phases = {}
+    _ensure_flusher()
+
+
+def _after_request(response):
+    start = g.get('metrics_start')
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    endpoint = request.endpoint or 'unknown'
+    query_count, query_seconds = g.metrics_queries
+    REQUEST_LATENCY.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+    REQUEST_QUERIES.observe(query_count, endpoint=endpoint)
+
+    # Server-Timing: xem được trong tab Network của DevTools
+    timings = [f'db;dur={query_seconds * 1000:.1f};desc="{query_count} queries"']
+    timings += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in g.metrics_phases.items()]
+    timings.append(f'total;dur={elapsed * 1000:.1f}')
+    response.headers['Server-Timing'] = ', '.join(timings)
+
+    if elapsed * 1000 >= SLOW_REQUEST_MS:
+        current_app.logger.warning(f"Request chậm: {request.method} {request.path} mất {elapsed * 1000:.0f} ms, "
+                                   f"{query_count} câu lệnh SQL ({query_seconds * 1000:.0f} ms)")
+    return response
+
+
+def _snapshot():
+    """Số liệu hiện tại của tiến trình: tên -> [[giá trị nhãn, giá trị], ...] (dạng ghi được ra JSON)."""
+    return {name: [[list(key), value] for key, value in metric.collect().items()] for name, metric in _registry.items()}
+
+
+def _flush():
+    path = os.path.join(METRICS_DIR, f'{os.getpid()}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(_snapshot(), f)
+    os.replace(path + '.tmp', path)
+
+
+def _ensure_flusher():
+    """Thread định kỳ ghi số liệu của worker ra METRICS_DIR (một thread cho mỗi tiến trình)."""
+    global _flusher_pid
+    if not METRICS_DIR or _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+
+    def run():
+        while True:
+            try:
+                _flush()
+            except OSError as e:
+                _logger.warning(f"Không ghi được số liệu ra {METRICS_DIR}: {e}")
+            time.sleep(METRICS_FLUSH_INTERVAL)
+
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    threading.Thread(target=run, name='metrics-flusher', daemon=True).start()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+def _combined_snapshot():
+    """
+    Cộng dồn số liệu của mọi worker trong METRICS_DIR. Bộ đếm của worker đã dừng vẫn được cộng
+    (để tổng không bị giảm), còn gauge thì chỉ lấy từ worker đang chạy.
+    """
+    if not METRICS_DIR:
+        return _snapshot()
+    _flush()
+    combined = {}
+    for filename in os.listdir(METRICS_DIR):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            pid = int(filename[:-5])
+            with open(os.path.join(METRICS_DIR, filename)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        alive = _pid_alive(pid)
+        for name, samples in data.items():
+            metric = _registry.get(name)
+            if metric is None or (metric.kind == 'gauge' and not alive):
+                continue
+            values = combined.setdefault(name, {})
+            for key, value in samples:
+                key = tuple(key)
+                if isinstance(value, list):
+                    current = values.get(key) or [0] * len(value)
+                    values[key] = [a + b for a, b in zip(current, value)]
+                else:
+                    values[key] = values.get(key, 0) + value
+    return {name: [[list(key), value] for key, value in values.items()] for name, values in combined.items()}
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def render():
+    """Toàn bộ số liệu theo định dạng text của Prometheus."""
+    snapshot = _combined_snapshot()
+    lines = []
+    for name, metric in sorted(_registry.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for key, value in sorted(snapshot.get(name, []), key=lambda sample: sample[0]):
+            if metric.kind != 'histogram':
+                lines.append(f'{name}{_format_labels(metric.labelnames, key)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets, value):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(metric.labelnames, key, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(metric.labelnames, key, [("le", "+Inf")])} {value[-1]}')
+            lines.append(f'{name}_sum{_format_labels(metric.labelnames, key)} {value[-2]}')
+            lines.append(f'{name}_count{_format_labels(metric.labelnames, key)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_endpoint():
+    if METRICS_TOKEN and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}'):
+        return current_app.response_class('Forbidden\n', status=403, mimetype='text/plain')
+    return current_app.response_class(render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    from app import db, translation
+
+    Callback('db_pool_connections', 'Số kết nối trong pool của tiến trình theo trạng thái', 'gauge', db.pool_stats, ('state',))
+    Callback('db_replica_lag_seconds', 'Độ trễ đo được của từng replica (-1: không kết nối được)', 'gauge', db.replica_lag,
+             ('replica',))
+    Callback('translation_events_total', 'Bộ đếm của cache bản dịch (xem translation.get_stats())', 'counter',
+             lambda: {(event,): count for event, count in translation.get_stats().items() if event != 'breaker_open'},
+             ('event',))
+    Callback('translation_breaker_open', 'Ngắt mạch dịch vụ dịch đang mở (1) hay đóng (0)', 'gauge',
+             lambda: int(translation.get_stats()['breaker_open']))
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
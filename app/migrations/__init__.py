@@ -0,0 +1,137 @@
+"""
+Các migration của schema database, chạy lần lượt theo số phiên bản và chỉ chạy tiến (không xóa dữ liệu).
+
+Mỗi migration là một module vNNNN_<tên>.py trong package này, có hàm upgrade(cursor).
+Migration được viết idempotent (IF NOT EXISTS, CREATE OR REPLACE...) để chạy được trên database
+đã được tạo bằng database_setup.py cũ. Các phiên bản đã chạy được ghi vào bảng schema_version.
+Mặc định mỗi migration chạy trong một transaction cùng với việc ghi schema_version;
+module đặt TRANSACTIONAL = False (ví dụ để CREATE INDEX CONCURRENTLY) thì chạy ở chế độ autocommit.
+"""
+import importlib
+import pkgutil
+import re
+
+import psycopg2
+
+# Khóa advisory để hai tiến trình (ví dụ hai container khởi động cùng lúc) không chạy migration song song
+MIGRATION_LOCK_ID = 72730014
+
+_MODULE_NAME = re.compile(r'^v(\d{4})_(\w+)$')
+
+
+class Migration:
+    def __init__(self, version, name, module):
+        self.version = version
+        self.name = name
+        self.module = module
+
+    @property
+    def transactional(self):
+        return getattr(self.module, 'TRANSACTIONAL', True)
+
+    def upgrade(self, cursor):
+        self.module.upgrade(cursor)
+
+
+def discover():
+    """Tất cả migration trong package, theo thứ tự phiên bản."""
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = _MODULE_NAME.match(module_info.name)
+        if match:
+            module = importlib.import_module(f'{__name__}.{module_info.name}')
+            migrations.append(Migration(int(match.group(1)), match.group(2), module))
+    migrations.sort(key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"Trùng số phiên bản migration: {versions}")
+    return migrations
+
+
+def _ensure_version_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def applied_versions(cursor):
+    cursor.execute('SELECT version FROM schema_version')
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(conn, log=print):
+    """
+    Chạy các migration chưa được áp dụng trên kết nối `conn`. Trả về danh sách các migration đã chạy.
+    Migration lỗi thì dừng lại và báo lỗi; các migration trước đó vẫn được giữ.
+    """
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK_ID,))
+    try:
+        _ensure_version_table(cursor)
+        done = applied_versions(cursor)
+        applied = []
+        for migration in discover():
+            if migration.version in done:
+                continue
+            log(f"Đang chạy migration {migration.version:04d} ({migration.name})...")
+            if migration.transactional:
+                conn.autocommit = False
+                try:
+                    migration.upgrade(cursor)
+                    _record(cursor, migration)
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.autocommit = True
+            else:
+                migration.upgrade(cursor)
+                _record(cursor, migration)
+            applied.append(migration)
+        if not applied:
+            log("Database đã ở phiên bản mới nhất.")
+        return applied
+    finally:
+        cursor.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK_ID,))
+        cursor.close()
+
+
+def _record(cursor, migration):
+    cursor.execute('INSERT INTO schema_version (version, name) VALUES (%s, %s)', (migration.version, migration.name))
+
+
+def create_index_concurrently(cursor, name, definition):
+    """
+    CREATE INDEX CONCURRENTLY (không khóa ghi bảng trong lúc tạo) cho migration TRANSACTIONAL = False.
+    Index hỏng còn sót lại từ lần chạy lỗi trước (indisvalid = false) được xóa và tạo lại.
+    """
+    cursor.execute('''
+        SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid
+        WHERE c.relname = %s AND c.relkind = 'i'
+    ''', (name,))
+    row = cursor.fetchone()
+    if row is not None and row[0]:
+        return
+    if row is not None:
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+    cursor.execute(f'CREATE INDEX CONCURRENTLY {name} ON {definition}')
+
+
+def init_app(app):
+    import click
+    from app.db import get_database_url
+
+    @app.cli.command('migrate')
+    def migrate_command():
+        """Chạy các migration chưa được áp dụng."""
+        conn = psycopg2.connect(get_database_url())
+        try:
+            migrate(conn, log=click.echo)
+        finally:
+            conn.close()
@@ -0,0 +1,45 @@
+# Các bảng ban đầu của ứng dụng: collections, topics, words, user_word_data
+
+
+def upgrade(cursor):
+    # SERIAL PRIMARY KEY là tương đương với AUTOINCREMENT trong PostgreSQL
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS collections (
+        id SERIAL PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        is_visible INTEGER NOT NULL DEFAULT 1
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS topics (
+        id SERIAL PRIMARY KEY,
+        name TEXT NOT NULL,
+        category TEXT NOT NULL,
+        position INTEGER,
+        collection_id INTEGER NOT NULL,
+        FOREIGN KEY (collection_id) REFERENCES collections (id) ON DELETE CASCADE
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS words (
+        id SERIAL PRIMARY KEY,
+        topic_id INTEGER NOT NULL,
+        word TEXT NOT NULL,
+        ipa TEXT,
+        type TEXT,
+        meaning TEXT NOT NULL,
+        example TEXT,
+        position INTEGER,
+        FOREIGN KEY (topic_id) REFERENCES topics (id) ON DELETE CASCADE
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_word_data (
+        word_id INTEGER PRIMARY KEY,
+        srs_level INTEGER NOT NULL DEFAULT 0,
+        next_review_at TIMESTAMP,
+        is_favorite INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (word_id) REFERENCES words (id) ON DELETE CASCADE
+    )
+    ''')
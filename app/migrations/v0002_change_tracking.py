@@ -0,0 +1,89 @@
+# Theo dõi thay đổi cho cache/ETag và đồng bộ delta của /api/data:
+# cột change_version, bộ đếm catalog_state, bảng deleted_rows và các trigger
+
+TRACKED_TABLES = [
+    # (bảng, bộ đếm, cột khóa chính, cột khóa cha)
+    ('collections', 'catalog', 'id', ''),
+    ('topics', 'catalog', 'id', 'collection_id'),
+    ('words', 'catalog', 'id', 'topic_id'),
+    ('user_word_data', 'progress', 'word_id', ''),
+]
+
+
+def upgrade(cursor):
+    for table, _, _, _ in TRACKED_TABLES:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS change_version BIGINT NOT NULL DEFAULT 0')
+
+    # 'catalog' tăng khi admin sửa nội dung, 'progress' tăng khi tiến độ SRS thay đổi
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS catalog_state (
+        name TEXT PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0
+    )
+    ''')
+    cursor.execute("INSERT INTO catalog_state (name, version) VALUES ('catalog', 0), ('progress', 0) ON CONFLICT (name) DO NOTHING")
+
+    # Tăng phiên bản tối đa một lần cho mỗi transaction (giá trị được nhớ trong biến cục bộ của transaction).
+    # Khóa dòng được giữ tới khi commit nên thứ tự phiên bản khớp với thứ tự commit.
+    cursor.execute('''
+    CREATE OR REPLACE FUNCTION bump_catalog_version(p_name TEXT) RETURNS BIGINT AS $$
+    DECLARE
+        v_setting TEXT := 'app.version_' || p_name;
+        v_version BIGINT := NULLIF(current_setting(v_setting, true), '')::BIGINT;
+    BEGIN
+        IF v_version IS NULL THEN
+            UPDATE catalog_state SET version = version + 1 WHERE name = p_name RETURNING version INTO v_version;
+            PERFORM set_config(v_setting, v_version::TEXT, true);
+        END IF;
+        RETURN v_version;
+    END;
+    $$ LANGUAGE plpgsql
+    ''')
+
+    # "Bia mộ" của các dòng đã xóa (kể cả xóa dây chuyền ON DELETE CASCADE)
+    # để /api/data/changes báo cho client xóa khỏi bản cache của nó
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS deleted_rows (
+        id BIGSERIAL PRIMARY KEY,
+        stream TEXT NOT NULL,
+        table_name TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        parent_id INTEGER,
+        change_version BIGINT NOT NULL,
+        deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_deleted_rows_stream_version ON deleted_rows (stream, change_version)')
+
+    # TG_ARGV[0] là bộ đếm ('catalog' hoặc 'progress'), TG_ARGV[1] là cột khóa chính,
+    # TG_ARGV[2] (nếu có) là cột khóa cha để biết chủ đề nào vừa mất từ.
+    cursor.execute('''
+    CREATE OR REPLACE FUNCTION stamp_change_version() RETURNS TRIGGER AS $$
+    BEGIN
+        NEW.change_version := bump_catalog_version(TG_ARGV[0]);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    ''')
+    cursor.execute('''
+    CREATE OR REPLACE FUNCTION record_deleted_row() RETURNS TRIGGER AS $$
+    BEGIN
+        INSERT INTO deleted_rows (stream, table_name, row_id, parent_id, change_version)
+        VALUES (TG_ARGV[0], TG_TABLE_NAME, (to_jsonb(OLD) ->> TG_ARGV[1])::INTEGER,
+                (to_jsonb(OLD) ->> NULLIF(TG_ARGV[2], ''))::INTEGER, bump_catalog_version(TG_ARGV[0]));
+        RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql
+    ''')
+    for table, stream, key, parent in TRACKED_TABLES:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {table}_stamp_change_version ON {table}')
+        cursor.execute(f'''
+        CREATE TRIGGER {table}_stamp_change_version BEFORE INSERT OR UPDATE ON {table}
+        FOR EACH ROW EXECUTE FUNCTION stamp_change_version('{stream}', '{key}')
+        ''')
+        cursor.execute(f'DROP TRIGGER IF EXISTS {table}_record_deleted_row ON {table}')
+        cursor.execute(f'''
+        CREATE TRIGGER {table}_record_deleted_row AFTER DELETE ON {table}
+        FOR EACH ROW EXECUTE FUNCTION record_deleted_row('{stream}', '{key}', '{parent}')
+        ''')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_change_version ON {table} (change_version)')
@@ -0,0 +1,8 @@
+# Index cho hàng đợi ôn tập (/api/reviews/due): chỉ các từ đã có lịch ôn
+
+
+def upgrade(cursor):
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_user_word_data_next_review_at ON user_word_data (next_review_at)
+    WHERE next_review_at IS NOT NULL
+    ''')
@@ -0,0 +1,23 @@
+# Bảng jobs: hàng đợi các thao tác admin chạy nền (import, xóa bộ sưu tập, sắp xếp lại...), xem app/jobs.py
+
+
+def upgrade(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id SERIAL PRIMARY KEY,
+        kind TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued', -- queued, running, succeeded, failed
+        params JSONB NOT NULL DEFAULT '{}',
+        data BYTEA, -- Dữ liệu đầu vào lớn (file upload), được xóa khi job kết thúc
+        serial_key TEXT, -- Các job cùng serial_key chạy lần lượt theo thứ tự tạo
+        progress INTEGER NOT NULL DEFAULT 0,
+        total INTEGER,
+        message TEXT,
+        result JSONB,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        started_at TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_pending ON jobs (id) WHERE status IN ('queued', 'running')")
@@ -0,0 +1,17 @@
+# Bảng translation_cache: tầng cache dùng chung của /api/translate (xem app/translation.py)
+
+
+def upgrade(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS translation_cache (
+        source_lang TEXT NOT NULL,
+        target_lang TEXT NOT NULL,
+        text_key TEXT NOT NULL, -- Văn bản đã chuẩn hóa (chữ thường, gộp khoảng trắng)
+        translated_text TEXT NOT NULL,
+        origin TEXT NOT NULL DEFAULT 'translator', -- 'vocabulary' (từ words.meaning) hoặc 'translator'
+        hits BIGINT NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_hit_at TIMESTAMP,
+        PRIMARY KEY (source_lang, target_lang, text_key)
+    )
+    ''')
@@ -0,0 +1,37 @@
+# Tìm kiếm từ vựng (/api/search): full-text trên word/meaning/example, không phân biệt hoa thường và dấu.
+import sys
+
+import psycopg2
+
+# Chữ có dấu tiếng Việt và chữ không dấu tương ứng, dùng cho hàm fold_text() (tìm kiếm không phân biệt dấu)
+VIETNAMESE_ACCENTED = 'àáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ'
+VIETNAMESE_PLAIN = 'a' * 17 + 'e' * 11 + 'i' * 5 + 'o' * 17 + 'u' * 11 + 'y' * 5 + 'd'
+
+
+def upgrade(cursor):
+    # fold_text() dùng translate() thay cho extension unaccent để hàm là IMMUTABLE và dùng được trong index.
+    cursor.execute('''
+    CREATE OR REPLACE FUNCTION fold_text(p_text TEXT) RETURNS TEXT AS $$
+        SELECT lower(translate(p_text, %s, %s))
+    $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    ''', (VIETNAMESE_ACCENTED + VIETNAMESE_ACCENTED.upper(), VIETNAMESE_PLAIN + VIETNAMESE_PLAIN.upper()))
+    cursor.execute('''
+    CREATE OR REPLACE FUNCTION words_search_document(p_word TEXT, p_meaning TEXT, p_example TEXT) RETURNS tsvector AS $$
+        SELECT setweight(to_tsvector('simple', fold_text(coalesce(p_word, ''))), 'A')
+            || setweight(to_tsvector('simple', fold_text(coalesce(p_meaning, ''))), 'B')
+            || setweight(to_tsvector('simple', fold_text(coalesce(p_example, ''))), 'C')
+    $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_words_search_document ON words USING GIN (words_search_document(word, meaning, example))')
+
+    # pg_trgm cho phép tìm gần đúng (gõ sai chính tả). Nếu database không có extension này,
+    # /api/search vẫn chạy nhưng chỉ khớp theo từ/tiền tố.
+    cursor.execute('SAVEPOINT create_pg_trgm')
+    try:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_words_word_trgm ON words USING GIN (fold_text(word) gin_trgm_ops)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_words_meaning_trgm ON words USING GIN (fold_text(meaning) gin_trgm_ops)')
+        cursor.execute('RELEASE SAVEPOINT create_pg_trgm')
+    except psycopg2.Error as e:
+        cursor.execute('ROLLBACK TO SAVEPOINT create_pg_trgm')
+        print(f"Cảnh báo: không cài được pg_trgm, tìm kiếm sẽ không hỗ trợ gõ sai chính tả ({e})", file=sys.stderr)
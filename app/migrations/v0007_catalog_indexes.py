@@ -0,0 +1,13 @@
+# Index cho các truy vấn danh mục theo bảng cha và thứ tự hiển thị (position, id):
+# danh sách chủ đề của bộ sưu tập, danh sách từ của chủ đề (cũng phục vụ ON DELETE CASCADE
+# và các câu UPDATE của app/admin/ordering.py), và danh sách bộ sưu tập đang hiển thị.
+# Tạo bằng CREATE INDEX CONCURRENTLY để không khóa ghi các bảng lớn trên database đang chạy.
+from app.migrations import create_index_concurrently
+
+TRANSACTIONAL = False
+
+
+def upgrade(cursor):
+    create_index_concurrently(cursor, 'idx_topics_collection_position', 'topics (collection_id, position, id)')
+    create_index_concurrently(cursor, 'idx_words_topic_position', 'words (topic_id, position, id)')
+    create_index_concurrently(cursor, 'idx_collections_visible_name', 'collections (name) WHERE is_visible = 1')
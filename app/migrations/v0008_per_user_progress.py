@@ -0,0 +1,100 @@
+# Tiến độ SRS theo từng người học: khóa (user_id, word_id), bảng được chia partition theo hash(user_id)
+# để index và các lần ghi của mỗi người học chỉ chạm vào một partition nhỏ.
+# Phiên bản tiến độ được đếm riêng cho từng người học (bảng user_progress_state) thay cho bộ đếm 'progress'
+# chung trong catalog_state, để các lần ghi của những người học khác nhau không phải chờ khóa của nhau.
+# Cần PostgreSQL 13+ (trigger BEFORE ... FOR EACH ROW trên bảng có partition).
+
+PARTITIONS = 16
+
+# Tiến độ dùng chung trước khi có nhiều người học được giữ lại dưới id này (xem app/users.py)
+LEGACY_USER_ID = '00000000-0000-0000-0000-000000000000'
+
+
+def upgrade(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_progress_state (
+        user_id UUID PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0
+    )
+    ''')
+
+    # Giống bump_catalog_version(): tăng tối đa một lần cho mỗi transaction. Chỉ dùng MỘT biến cục bộ
+    # ('<user_id>:<version>') thay vì một biến cho mỗi người học, vì Postgres giữ tên các biến đã dùng
+    # suốt đời kết nối (kết nối trong pool phục vụ rất nhiều người học).
+    cursor.execute('''
+    CREATE OR REPLACE FUNCTION bump_user_progress_version(p_user_id UUID) RETURNS BIGINT AS $$
+    DECLARE
+        v_current TEXT := current_setting('app.progress_version', true);
+        v_version BIGINT;
+    BEGIN
+        IF v_current IS NOT NULL AND split_part(v_current, ':', 1) = p_user_id::TEXT THEN
+            RETURN split_part(v_current, ':', 2)::BIGINT;
+        END IF;
+        INSERT INTO user_progress_state (user_id, version) VALUES (p_user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = user_progress_state.version + 1
+        RETURNING version INTO v_version;
+        PERFORM set_config('app.progress_version', p_user_id::TEXT || ':' || v_version::TEXT, true);
+        RETURN v_version;
+    END;
+    $$ LANGUAGE plpgsql
+    ''')
+    cursor.execute('''
+    CREATE OR REPLACE FUNCTION stamp_user_progress_version() RETURNS TRIGGER AS $$
+    BEGIN
+        NEW.change_version := bump_user_progress_version(NEW.user_id);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    ''')
+
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('user_word_data')")
+    row = cursor.fetchone()
+    if row is None or row[0] != 'p':
+        legacy_rows = row is not None
+        if legacy_rows:
+            # Bảng cũ (khóa chỉ có word_id): tạm chép dữ liệu ra rồi xóa để tên bảng/index/trigger được dùng lại
+            cursor.execute('CREATE TEMP TABLE shared_user_word_data ON COMMIT DROP AS SELECT * FROM user_word_data')
+            cursor.execute('DROP TABLE user_word_data')
+
+        cursor.execute('''
+        CREATE TABLE user_word_data (
+            user_id UUID NOT NULL,
+            word_id INTEGER NOT NULL,
+            srs_level INTEGER NOT NULL DEFAULT 0,
+            next_review_at TIMESTAMP,
+            is_favorite INTEGER NOT NULL DEFAULT 0,
+            change_version BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, word_id),
+            FOREIGN KEY (word_id) REFERENCES words (id) ON DELETE CASCADE
+        ) PARTITION BY HASH (user_id)
+        ''')
+        for remainder in range(PARTITIONS):
+            cursor.execute(f'''
+            CREATE TABLE user_word_data_p{remainder} PARTITION OF user_word_data
+            FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})
+            ''')
+
+        cursor.execute('''
+        CREATE TRIGGER user_word_data_stamp_change_version BEFORE INSERT OR UPDATE ON user_word_data
+        FOR EACH ROW EXECUTE FUNCTION stamp_user_progress_version()
+        ''')
+
+        if legacy_rows:
+            cursor.execute('''
+            INSERT INTO user_word_data (user_id, word_id, srs_level, next_review_at, is_favorite)
+            SELECT %s, word_id, srs_level, next_review_at, is_favorite FROM shared_user_word_data
+            ''', (LEGACY_USER_ID,))
+
+    # Hàng đợi ôn tập của một người học (/api/reviews/due): index-only scan, không cần đọc bảng
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_user_word_data_review_queue ON user_word_data (user_id, next_review_at)
+    INCLUDE (word_id, srs_level) WHERE next_review_at IS NOT NULL
+    ''')
+    # Đồng bộ delta (/api/data/changes) theo phiên bản tiến độ của từng người học
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_word_data_user_change_version ON user_word_data (user_id, change_version)')
+    # Xóa từ (ON DELETE CASCADE) tìm tiến độ theo word_id trên mọi partition
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_word_data_word_id ON user_word_data (word_id)')
+
+    # Bộ đếm và "bia mộ" tiến độ dùng chung không còn được dùng: khi từ bị xóa, client gỡ luôn tiến độ của từ đó
+    cursor.execute("DELETE FROM catalog_state WHERE name = 'progress'")
+    cursor.execute("DELETE FROM deleted_rows WHERE stream = 'progress'")
@@ -0,0 +1,115 @@
+# Bộ đếm lưu sẵn trong bảng cha: topics.word_count, collections.topic_count và collections.word_count,
+# được trigger giữ đúng khi thêm/xóa/chuyển dòng. Trang admin, /api/collections/<id>/topics và /api/data
+# đọc thẳng các cột này thay vì đếm lại bảng words (COUNT(*) cho mỗi chủ đề) ở mỗi request.
+# Trigger INSERT/DELETE chạy theo câu lệnh với transition table: một lần import (COPY) hàng nghìn từ
+# chỉ cập nhật mỗi chủ đề/bộ sưu tập một lần cho mỗi câu lệnh.
+
+_WORD_COUNT_UPDATE = '''
+            WITH changed AS (
+                UPDATE topics t SET word_count = t.word_count + d.n
+                FROM (SELECT topic_id, {sign}COUNT(*) AS n FROM {rows} GROUP BY topic_id) d
+                WHERE t.id = d.topic_id
+                RETURNING t.collection_id, d.n
+            )
+            UPDATE collections c SET word_count = c.word_count + s.n
+            FROM (SELECT collection_id, SUM(n) AS n FROM changed GROUP BY collection_id) s
+            WHERE c.id = s.collection_id
+'''
+
+
+def upgrade(cursor):
+    cursor.execute('ALTER TABLE topics ADD COLUMN IF NOT EXISTS word_count INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('ALTER TABLE collections ADD COLUMN IF NOT EXISTS topic_count INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('ALTER TABLE collections ADD COLUMN IF NOT EXISTS word_count INTEGER NOT NULL DEFAULT 0')
+
+    # Không cho ghi xen giữa lúc đếm lại và lúc tạo trigger
+    cursor.execute('LOCK TABLE collections, topics, words IN SHARE ROW EXCLUSIVE MODE')
+
+    # Số từ thêm (+) hoặc bớt (-) của từng chủ đề được cộng vào chủ đề và bộ sưu tập chứa nó.
+    # Khi xóa dây chuyền cả chủ đề, dòng chủ đề đã bị xóa trước nên không khớp ở đây:
+    # phần của bộ sưu tập được trừ ở count_topics_changed() theo word_count của chủ đề bị xóa.
+    cursor.execute(f'''
+    CREATE OR REPLACE FUNCTION count_words_changed() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            {_WORD_COUNT_UPDATE.format(sign='', rows='new_rows')};
+        ELSE
+            {_WORD_COUNT_UPDATE.format(sign='-', rows='old_rows')};
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    ''')
+    cursor.execute('''
+    CREATE OR REPLACE FUNCTION count_topics_changed() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            UPDATE collections c SET topic_count = c.topic_count + s.topics, word_count = c.word_count + s.words
+            FROM (SELECT collection_id, COUNT(*) AS topics, SUM(word_count) AS words
+                  FROM new_rows GROUP BY collection_id) s
+            WHERE c.id = s.collection_id;
+        ELSE
+            UPDATE collections c SET topic_count = c.topic_count - s.topics, word_count = c.word_count - s.words
+            FROM (SELECT collection_id, COUNT(*) AS topics, SUM(word_count) AS words
+                  FROM old_rows GROUP BY collection_id) s
+            WHERE c.id = s.collection_id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    ''')
+    # Chuyển từ sang chủ đề khác / chủ đề sang bộ sưu tập khác (hiếm, nên dùng trigger theo dòng)
+    cursor.execute('''
+    CREATE OR REPLACE FUNCTION count_word_moved() RETURNS TRIGGER AS $$
+    BEGIN
+        UPDATE topics SET word_count = word_count - 1 WHERE id = OLD.topic_id;
+        UPDATE topics SET word_count = word_count + 1 WHERE id = NEW.topic_id;
+        UPDATE collections SET word_count = word_count - 1 WHERE id = (SELECT collection_id FROM topics WHERE id = OLD.topic_id);
+        UPDATE collections SET word_count = word_count + 1 WHERE id = (SELECT collection_id FROM topics WHERE id = NEW.topic_id);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    ''')
+    cursor.execute('''
+    CREATE OR REPLACE FUNCTION count_topic_moved() RETURNS TRIGGER AS $$
+    BEGIN
+        UPDATE collections SET topic_count = topic_count - 1, word_count = word_count - OLD.word_count
+        WHERE id = OLD.collection_id;
+        UPDATE collections SET topic_count = topic_count + 1, word_count = word_count + NEW.word_count
+        WHERE id = NEW.collection_id;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    ''')
+
+    triggers = [
+        ('words', 'count_inserted', 'AFTER INSERT', 'REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT',
+         'count_words_changed()'),
+        ('words', 'count_deleted', 'AFTER DELETE', 'REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT',
+         'count_words_changed()'),
+        ('words', 'count_moved', 'AFTER UPDATE OF topic_id',
+         'FOR EACH ROW WHEN (OLD.topic_id IS DISTINCT FROM NEW.topic_id)', 'count_word_moved()'),
+        ('topics', 'count_inserted', 'AFTER INSERT', 'REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT',
+         'count_topics_changed()'),
+        ('topics', 'count_deleted', 'AFTER DELETE', 'REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT',
+         'count_topics_changed()'),
+        ('topics', 'count_moved', 'AFTER UPDATE OF collection_id',
+         'FOR EACH ROW WHEN (OLD.collection_id IS DISTINCT FROM NEW.collection_id)', 'count_topic_moved()'),
+    ]
+    for table, name, event, options, function in triggers:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {table}_{name} ON {table}')
+        cursor.execute(f'CREATE TRIGGER {table}_{name} {event} ON {table} {options} EXECUTE FUNCTION {function}')
+
+    # Đếm lại từ đầu (chỉ ghi các dòng có số đếm khác, để chạy lại migration không đổi change_version)
+    cursor.execute('''
+        UPDATE topics t SET word_count = COALESCE(w.n, 0)
+        FROM topics t2 LEFT JOIN (SELECT topic_id, COUNT(*) AS n FROM words GROUP BY topic_id) w ON w.topic_id = t2.id
+        WHERE t.id = t2.id AND t.word_count IS DISTINCT FROM COALESCE(w.n, 0)
+    ''')
+    cursor.execute('''
+        UPDATE collections c SET topic_count = COALESCE(s.topics, 0), word_count = COALESCE(s.words, 0)
+        FROM collections c2 LEFT JOIN (SELECT collection_id, COUNT(*) AS topics, SUM(word_count) AS words
+                                       FROM topics GROUP BY collection_id) s ON s.collection_id = c2.id
+        WHERE c.id = c2.id
+          AND (c.topic_count, c.word_count) IS DISTINCT FROM (COALESCE(s.topics, 0), COALESCE(s.words, 0))
+    ''')
@@ -0,0 +1,28 @@
+# File upload của job (ví dụ file import) được lưu thành các đoạn 1 MB trong bảng job_uploads thay vì một cột
+# BYTEA trong jobs: request ghi và job đọc lại từng đoạn, không nạp cả file vào bộ nhớ, và bảng jobs
+# (được đọc ở mỗi lần lấy job/hiển thị danh sách) không chứa dữ liệu lớn. Các đoạn bị xóa khi job kết thúc.
+
+CHUNK_SIZE = 1024 * 1024 # Bằng JOB_UPLOAD_CHUNK_SIZE trong app/jobs.py tại thời điểm viết migration
+
+
+def upgrade(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS job_uploads (
+        job_id INTEGER NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+        seq INTEGER NOT NULL,
+        chunk BYTEA NOT NULL,
+        PRIMARY KEY (job_id, seq)
+    )
+    ''')
+    cursor.execute("SELECT 1 FROM information_schema.columns WHERE table_name = 'jobs' AND column_name = 'data'")
+    if cursor.fetchone() is None:
+        return
+    # Job còn trong hàng đợi lúc nâng cấp: chia dữ liệu cũ thành các đoạn
+    cursor.execute('''
+        INSERT INTO job_uploads (job_id, seq, chunk)
+        SELECT j.id, s.seq, substring(j.data FROM s.seq * %(size)s + 1 FOR %(size)s)
+        FROM jobs j, generate_series(0, (length(j.data) - 1) / %(size)s) AS s(seq)
+        WHERE j.data IS NOT NULL AND length(j.data) > 0
+        ON CONFLICT DO NOTHING
+    ''', {'size': CHUNK_SIZE})
+    cursor.execute('ALTER TABLE jobs DROP COLUMN data')
@@ -0,0 +1,26 @@
+# Các cột bộ đếm của migration 0009 (topics.word_count, collections.topic_count/word_count) được trigger
+# cập nhật mỗi khi thêm/xóa từ hoặc chủ đề. Trigger stamp_change_version của 0002 chạy với mọi UPDATE nên
+# việc đó làm đổi change_version của bộ sưu tập, và /api/data/changes gửi lại toàn bộ chủ đề/từ của nó
+# (client bỏ hết các từ đã tải). Ở đây UPDATE chỉ đổi bộ đếm không còn đóng dấu phiên bản mới;
+# bản ghi bộ sưu tập có bộ đếm mới được catalog.get_changes() gửi lại riêng, không kéo theo chủ đề/từ.
+
+COUNTER_COLUMNS = {
+    'collections': ('topic_count', 'word_count'),
+    'topics': ('word_count',),
+}
+
+
+def upgrade(cursor):
+    for table, counters in COUNTER_COLUMNS.items():
+        ignored = ' - '.join(f"'{column}'" for column in counters + ('change_version',))
+        cursor.execute(f'DROP TRIGGER IF EXISTS {table}_stamp_change_version ON {table}')
+        cursor.execute(f'DROP TRIGGER IF EXISTS {table}_stamp_change_version_update ON {table}')
+        cursor.execute(f'''
+        CREATE TRIGGER {table}_stamp_change_version BEFORE INSERT ON {table}
+        FOR EACH ROW EXECUTE FUNCTION stamp_change_version('catalog', 'id')
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER {table}_stamp_change_version_update BEFORE UPDATE ON {table}
+        FOR EACH ROW WHEN ((to_jsonb(OLD) - {ignored}) IS DISTINCT FROM (to_jsonb(NEW) - {ignored}))
+        EXECUTE FUNCTION stamp_change_version('catalog', 'id')
+        ''')
@@ -0,0 +1,30 @@
+# Các cột thứ tự hiển thị topics.position, words.position (schema 0001 cho phép NULL) và collections.created_at
+# (thứ tự danh sách bộ sưu tập ở trang admin) được đưa vào cursor phân trang keyset. Một dòng có giá trị NULL
+# làm cursor thành "None,<id>": /api/... trả 400 cho trang sau, trang admin quay lại trang đầu, và phép so sánh
+# (position, id) > (...) bỏ qua các dòng NULL. Điền các giá trị còn thiếu rồi đặt NOT NULL để giữ được
+# các index (collection_id/topic_id, position, id) của migration 0007 thay vì phải sắp xếp theo COALESCE().
+
+POSITION_TABLES = {
+    'topics': 'collection_id',
+    'words': 'topic_id',
+}
+
+
+def upgrade(cursor):
+    for table, parent_column in POSITION_TABLES.items():
+        # Giữ nguyên thứ tự đang hiển thị (NULL đứng cuối, theo id), giống ordering._normalize_positions()
+        cursor.execute(f'''
+            UPDATE {table} AS t SET position = r.new_position
+            FROM (
+                SELECT id, COALESCE(MAX(position) OVER (PARTITION BY {parent_column}), -1)
+                           + ROW_NUMBER() OVER (PARTITION BY {parent_column}, position IS NULL ORDER BY id)
+                           AS new_position,
+                       position
+                FROM {table}
+            ) r
+            WHERE t.id = r.id AND r.position IS NULL
+        ''')
+        cursor.execute(f'ALTER TABLE {table} ALTER COLUMN position SET NOT NULL')
+
+    cursor.execute('UPDATE collections SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL')
+    cursor.execute('ALTER TABLE collections ALTER COLUMN created_at SET NOT NULL')
@@ -0,0 +1,80 @@
+# Nghĩa của từ vựng được nạp sẵn vào translation_cache (origin 'vocabulary', không hết hạn). Khi một từ bị sửa
+# hoặc bị xóa (kể cả xóa dây chuyền theo chủ đề/bộ sưu tập) thì dòng của khóa cũ còn lại mãi với nghĩa cũ.
+# Trigger theo câu lệnh trên words nạp lại các khóa bị ảnh hưởng từ những từ còn lại và xóa khóa không còn
+# từ nào dùng, trong cùng transaction với thay đổi, nên mọi worker đọc translation_cache đều thấy ngay.
+# Tầng cache trong tiến trình được xóa khi phiên bản catalog đổi (app/translation.py).
+from app.migrations import create_index_concurrently
+
+TRANSACTIONAL = False
+
+
+def upgrade(cursor):
+    # Khóa cache của một từ, giống normalize_text() trong app/translation.py
+    cursor.execute(r'''
+    CREATE OR REPLACE FUNCTION translation_key(word TEXT) RETURNS TEXT AS $$
+        SELECT lower(btrim(regexp_replace(word, '\s+', ' ', 'g')))
+    $$ LANGUAGE sql IMMUTABLE
+    ''')
+    create_index_concurrently(cursor, 'idx_words_translation_key', 'words (translation_key(word))')
+
+    cursor.execute('''
+    CREATE OR REPLACE FUNCTION refresh_vocabulary_translations(keys TEXT[]) RETURNS VOID AS $$
+    BEGIN
+        IF cardinality(keys) = 0 THEN
+            RETURN;
+        END IF;
+        -- Cùng một từ xuất hiện ở nhiều chủ đề: lấy nghĩa của bản ghi mới nhất (như seed_from_vocabulary())
+        INSERT INTO translation_cache (source_lang, target_lang, text_key, translated_text, origin)
+        SELECT DISTINCT ON (key) 'en', 'vi', key, meaning, 'vocabulary'
+        FROM (
+            SELECT translation_key(w.word) AS key, w.meaning, w.id
+            FROM words w WHERE translation_key(w.word) = ANY(keys) AND w.meaning <> ''
+        ) v
+        WHERE key <> ''
+        ORDER BY key, id DESC
+        ON CONFLICT (source_lang, target_lang, text_key) DO UPDATE
+        SET translated_text = EXCLUDED.translated_text, origin = EXCLUDED.origin, created_at = NOW()
+        WHERE translation_cache.translated_text IS DISTINCT FROM EXCLUDED.translated_text
+           OR translation_cache.origin <> EXCLUDED.origin;
+
+        DELETE FROM translation_cache c
+        WHERE c.source_lang = 'en' AND c.target_lang = 'vi' AND c.origin = 'vocabulary' AND c.text_key = ANY(keys)
+          AND NOT EXISTS (SELECT 1 FROM words w WHERE translation_key(w.word) = c.text_key AND w.meaning <> '');
+    END;
+    $$ LANGUAGE plpgsql
+    ''')
+    # Sắp xếp lại (chỉ đổi position) cũng là UPDATE: chỉ các dòng đổi word/meaning mới được tính
+    cursor.execute('''
+    CREATE OR REPLACE FUNCTION words_refresh_translations() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            PERFORM refresh_vocabulary_translations(ARRAY(SELECT DISTINCT translation_key(word) FROM old_rows));
+        ELSE
+            PERFORM refresh_vocabulary_translations(ARRAY(
+                SELECT translation_key(k.word)
+                FROM old_rows o JOIN new_rows n ON n.id = o.id, LATERAL (VALUES (o.word), (n.word)) AS k(word)
+                WHERE o.word IS DISTINCT FROM n.word OR o.meaning IS DISTINCT FROM n.meaning
+                GROUP BY 1
+            ));
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    ''')
+
+    triggers = [
+        ('refresh_translations_deleted', 'AFTER DELETE', 'REFERENCING OLD TABLE AS old_rows'),
+        ('refresh_translations_updated', 'AFTER UPDATE', 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+    ]
+    for name, event, options in triggers:
+        cursor.execute(f'DROP TRIGGER IF EXISTS words_{name} ON words')
+        cursor.execute(f'CREATE TRIGGER words_{name} {event} ON words {options} FOR EACH STATEMENT '
+                       'EXECUTE FUNCTION words_refresh_translations()')
+
+    # Dọn các dòng đã cũ từ trước khi có trigger
+    cursor.execute('''
+        SELECT refresh_vocabulary_translations(ARRAY(
+            SELECT text_key FROM translation_cache
+            WHERE source_lang = 'en' AND target_lang = 'vi' AND origin = 'vocabulary'
+        ))
+    ''')
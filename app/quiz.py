@@ -0,0 +1,287 @@
+import math
+import os
+import random
+import re
+import threading
+from array import array
+from datetime import datetime
+
+import psycopg2.extras
+from app import catalog, metrics
+from app.db import db_connection, db_cursor
+
+# Tạo bài quiz ở server (/api/quiz) thay vì để trình duyệt lọc và xáo trộn toàn bộ danh sách từ cho mỗi câu hỏi.
+# Mỗi tiến trình giữ một index nhỏ trong bộ nhớ cho phiên bản catalog hiện tại: với mỗi chủ đề và mỗi bộ sưu tập,
+# danh sách id từ theo loại từ (noun, verb...) và theo điều kiện của từng dạng quiz. Câu hỏi và đáp án nhiễu được
+# lấy mẫu ngẫu nhiên từ các danh sách này (O(số câu hỏi), không phụ thuộc kích thước bộ sưu tập), nội dung từ
+# được đọc bằng một truy vấn theo id.
+MULTIPLE_CHOICE = 'multiple_choice' # Cho từ, chọn nghĩa
+LISTENING = 'listening' # Nghe phát âm, chọn từ
+FILL_BLANK = 'fill_blank' # Câu ví dụ bị khuyết từ, chọn từ
+SPELLING = 'spelling' # Cho nghĩa và phát âm, gõ lại từ (không có lựa chọn)
+QUIZ_TYPES = (MULTIPLE_CHOICE, LISTENING, FILL_BLANK, SPELLING)
+
+DEFAULT_QUIZ_SIZE = 10
+MAX_QUIZ_SIZE = 50
+OPTION_COUNT = 4
+QUIZ_PRIORITY_SHARE = float(os.environ.get('QUIZ_PRIORITY_SHARE', 0.5)) # Tỉ lệ câu hỏi dành cho từ đến hạn ôn/còn yếu
+WEAK_SRS_LEVEL = 1 # Từ có cấp SRS không quá mức này được coi là còn yếu
+PRIORITY_CANDIDATES = 500
+BLANK = '_______'
+
+# Điều kiện để một từ làm được câu hỏi (và đáp án nhiễu) của từng dạng quiz, giống điều kiện cũ ở main.js:
+# nghe/viết và điền từ chỉ dùng từ đơn, điền từ cần có câu ví dụ
+_SINGLE_WORD_SQL = "position(' ' in btrim(w.word)) = 0"
+_HAS_EXAMPLE_SQL = "COALESCE(w.example, '') <> ''"
+_ELIGIBLE_SQL = {
+    MULTIPLE_CHOICE: 'TRUE',
+    LISTENING: 'TRUE',
+    FILL_BLANK: f'{_SINGLE_WORD_SQL} AND {_HAS_EXAMPLE_SQL}',
+    SPELLING: _SINGLE_WORD_SQL,
+}
+
+_INDEX_QUERY = f'''
+    SELECT w.id, w.topic_id, t.collection_id, COALESCE(w.type, ''), {_SINGLE_WORD_SQL}, {_HAS_EXAMPLE_SQL}
+    FROM words w
+    JOIN topics t ON w.topic_id = t.id
+    JOIN collections c ON t.collection_id = c.id
+    WHERE c.is_visible = 1
+'''
+
+_index_lock = threading.Lock()
+_index = None
+
+
+class _Pool:
+    """Id các từ của một chủ đề hoặc một bộ sưu tập, chia theo loại từ và theo điều kiện của từng dạng quiz."""
+
+    __slots__ = ('all', 'single', 'fill_blank', 'by_type', 'single_by_type')
+
+    def __init__(self):
+        self.all = array('i')
+        self.single = array('i') # Từ đơn (nghe/viết, đáp án nhiễu của điền từ)
+        self.fill_blank = array('i') # Từ đơn có câu ví dụ
+        self.by_type = {}
+        self.single_by_type = {}
+
+    def add(self, word_id, word_type, single, has_example):
+        self.all.append(word_id)
+        self.by_type.setdefault(word_type, array('i')).append(word_id)
+        if single:
+            self.single.append(word_id)
+            self.single_by_type.setdefault(word_type, array('i')).append(word_id)
+            if has_example:
+                self.fill_blank.append(word_id)
+
+    def questions(self, quiz_type):
+        """Các từ làm được câu hỏi của dạng quiz `quiz_type`."""
+        if quiz_type == FILL_BLANK:
+            return self.fill_blank
+        if quiz_type == SPELLING:
+            return self.single
+        return self.all
+
+    def distractors(self, quiz_type, word_type):
+        """Các danh sách để lấy đáp án nhiễu, ưu tiên cùng loại từ (khó đoán hơn) trước."""
+        if quiz_type == FILL_BLANK:
+            return self.single_by_type.get(word_type, ()), self.single
+        return self.by_type.get(word_type, ()), self.all
+
+
+class _Index:
+    def __init__(self, catalog_version):
+        self.catalog_version = catalog_version
+        self.topics = {} # topic_id -> _Pool
+        self.collections = {} # collection_id -> _Pool
+        self.topic_collections = {} # topic_id -> collection_id
+
+
+def _build_index(catalog_version):
+    index = _Index(catalog_version)
+    with db_connection(readonly=True) as conn:
+        # Server-side cursor: đọc dần theo từng lô, không giữ cả bảng words trong bộ nhớ cùng lúc
+        with conn.cursor(name='quiz_index') as cursor:
+            cursor.itersize = 10000
+            cursor.execute(_INDEX_QUERY)
+            for word_id, topic_id, collection_id, word_type, single, has_example in cursor:
+                topic = index.topics.get(topic_id)
+                if topic is None:
+                    topic = index.topics[topic_id] = _Pool()
+                    index.topic_collections[topic_id] = collection_id
+                collection = index.collections.get(collection_id)
+                if collection is None:
+                    collection = index.collections[collection_id] = _Pool()
+                topic.add(word_id, word_type, single, has_example)
+                collection.add(word_id, word_type, single, has_example)
+    return index
+
+
+def get_index():
+    """Index của phiên bản catalog hiện tại (dựng lại khi admin thay đổi dữ liệu)."""
+    global _index
+    # Đọc phiên bản TRƯỚC dữ liệu: nếu có thay đổi xen giữa, index sẽ được dựng lại ở request sau
+    catalog_version = catalog.get_catalog_version()
+    index = _index
+    if index is not None and index.catalog_version == catalog_version:
+        metrics.CACHE_REQUESTS.inc(cache='quiz_index', result='hit')
+        return index
+    with _index_lock:
+        if _index is not None and _index.catalog_version >= catalog_version:
+            metrics.CACHE_REQUESTS.inc(cache='quiz_index', result='hit')
+            return _index
+        metrics.CACHE_REQUESTS.inc(cache='quiz_index', result='miss')
+        _index = _build_index(catalog_version)
+        return _index
+
+
+def _sample(ids, count, exclude):
+    """Tối đa `count` id ngẫu nhiên của `ids` không nằm trong `exclude`; chi phí theo `count`, không theo len(ids)."""
+    if not ids or count <= 0:
+        return []
+    picked = []
+    for word_id in random.sample(ids, min(len(ids), count + len(exclude))):
+        if word_id not in exclude:
+            picked.append(word_id)
+            if len(picked) == count:
+                break
+    return picked
+
+
+def _priority_words(cursor, user_id, quiz_type, scope_sql, scope_params, limit):
+    """
+    Các từ trong phạm vi đã đến hạn ôn hoặc còn yếu của người học (đến hạn trước, cấp thấp trước).
+    Chỉ xét PRIORITY_CANDIDATES dòng tiến độ đầu tiên theo index (user_id, next_review_at) để chi phí không tăng
+    theo số từ người học đã học.
+    """
+    if limit <= 0:
+        return []
+    cursor.execute(f'''
+        SELECT u.word_id FROM (
+            SELECT word_id, srs_level, next_review_at <= %(now)s AS due FROM user_word_data
+            WHERE user_id = %(user_id)s AND next_review_at IS NOT NULL
+              AND (next_review_at <= %(now)s OR srs_level <= %(weak_level)s)
+            ORDER BY next_review_at
+            LIMIT %(candidates)s
+        ) u
+        JOIN words w ON w.id = u.word_id
+        JOIN topics t ON w.topic_id = t.id
+        WHERE {scope_sql} AND {_ELIGIBLE_SQL[quiz_type]}
+        ORDER BY u.due DESC, u.srs_level, random()
+        LIMIT %(limit)s
+    ''', dict(scope_params, user_id=user_id, now=datetime.now(), weak_level=WEAK_SRS_LEVEL,
+               candidates=PRIORITY_CANDIDATES, limit=limit))
+    return [row['word_id'] for row in cursor.fetchall()]
+
+
+def _question_ids_in_pool(cursor, user_id, quiz_type, pool, scope_sql, scope_params, size):
+    """Câu hỏi trong một chủ đề/bộ sưu tập: một phần là từ đến hạn/còn yếu, phần còn lại lấy ngẫu nhiên."""
+    question_ids = _priority_words(cursor, user_id, quiz_type, scope_sql, scope_params,
+                                   math.ceil(size * QUIZ_PRIORITY_SHARE))
+    question_ids += _sample(pool.questions(quiz_type), size - len(question_ids), set(question_ids))
+    random.shuffle(question_ids)
+    return question_ids
+
+
+def _question_ids_from_list(cursor, quiz_type, candidate_sql, params, size):
+    """Câu hỏi lấy ngẫu nhiên trong một danh sách từ cho trước (từ cần ôn, từ đã lưu)."""
+    cursor.execute(f'''
+        SELECT w.id FROM words w
+        JOIN topics t ON w.topic_id = t.id
+        JOIN collections c ON t.collection_id = c.id
+        WHERE c.is_visible = 1 AND {_ELIGIBLE_SQL[quiz_type]} AND {candidate_sql}
+    ''', params)
+    candidates = [row['id'] for row in cursor.fetchall()]
+    return random.sample(candidates, min(size, len(candidates)))
+
+
+def _read_words(cursor, word_ids):
+    cursor.execute('SELECT id, topic_id, word, meaning, ipa, type, example FROM words WHERE id = ANY(%s)', (list(word_ids),))
+    return {row['id']: row for row in cursor.fetchall()}
+
+
+def _pick_distractor_ids(index, quiz_type, word):
+    """
+    Id ứng viên đáp án nhiễu cho câu hỏi về `word`: cùng loại từ trong chủ đề, rồi cả chủ đề, rồi cả bộ sưu tập.
+    Lấy dư để còn đủ sau khi bỏ các đáp án trùng chữ với nhau.
+    """
+    wanted = 2 * (OPTION_COUNT - 1)
+    exclude = {word['id']}
+    picked = []
+    topic = index.topics.get(word['topic_id'])
+    collection = index.collections.get(index.topic_collections.get(word['topic_id']))
+    for pool in (topic, collection):
+        if pool is None:
+            continue
+        for ids in pool.distractors(quiz_type, word['type'] or ''):
+            ids_picked = _sample(ids, wanted - len(picked), exclude)
+            picked += ids_picked
+            exclude.update(ids_picked)
+            if len(picked) >= wanted:
+                return picked
+    return picked
+
+
+def _option_text(quiz_type, word):
+    return word['meaning'] if quiz_type == MULTIPLE_CHOICE else word['word']
+
+
+def _build_question(quiz_type, word, distractors):
+    question = {key: word[key] for key in ('id', 'topic_id', 'word', 'meaning', 'ipa', 'type', 'example')}
+    if quiz_type == FILL_BLANK:
+        question['sentence'] = re.sub(rf'\b{re.escape(word["word"])}\b', BLANK, word['example'], flags=re.IGNORECASE)
+    if quiz_type == SPELLING:
+        return question
+
+    options = [word]
+    seen = {_option_text(quiz_type, word).strip().lower()}
+    for distractor in distractors:
+        text = _option_text(quiz_type, distractor).strip().lower()
+        if text and text not in seen:
+            seen.add(text)
+            options.append(distractor)
+            if len(options) == OPTION_COUNT:
+                break
+    random.shuffle(options)
+    question['options'] = [{'id': option['id'], 'word': option['word'], 'meaning': option['meaning']} for option in options]
+    question['answer'] = options.index(word)
+    return question
+
+
+def generate(user_id, quiz_type, size, topic_id=None, collection_id=None, review=False, word_ids=None):
+    """
+    Một bài quiz `quiz_type` gồm tối đa `size` câu hỏi trong phạm vi: một chủ đề, một bộ sưu tập, các từ đến hạn ôn
+    (review=True) hoặc một danh sách id (ví dụ từ đã lưu). Trả về None nếu chủ đề/bộ sưu tập không tồn tại.
+    """
+    index = get_index()
+    with db_cursor(psycopg2.extras.RealDictCursor, readonly=True) as cursor:
+        if topic_id is not None:
+            pool = index.topics.get(topic_id)
+            if pool is None:
+                return None
+            question_ids = _question_ids_in_pool(cursor, user_id, quiz_type, pool, 'w.topic_id = %(topic_id)s',
+                                                 {'topic_id': topic_id}, size)
+        elif collection_id is not None:
+            pool = index.collections.get(collection_id)
+            if pool is None:
+                return None
+            question_ids = _question_ids_in_pool(cursor, user_id, quiz_type, pool, 't.collection_id = %(collection_id)s',
+                                                 {'collection_id': collection_id}, size)
+        elif review:
+            # Giống phiên ôn tập của /api/reviews/due: các từ đến hạn sớm nhất
+            question_ids = _question_ids_from_list(cursor, quiz_type, '''w.id IN (
+                SELECT u.word_id FROM user_word_data u
+                WHERE u.user_id = %(user_id)s AND u.next_review_at <= %(now)s
+                ORDER BY u.next_review_at LIMIT %(limit)s)''', {'user_id': user_id, 'now': datetime.now(),
+                                                                'limit': MAX_QUIZ_SIZE}, size)
+        else:
+            question_ids = _question_ids_from_list(cursor, quiz_type, 'w.id = ANY(%(ids)s)', {'ids': list(word_ids)}, size)
+
+        words = _read_words(cursor, question_ids)
+        question_words = [words[word_id] for word_id in question_ids if word_id in words]
+        candidates = {}
+        if quiz_type != SPELLING:
+            candidates = {word['id']: _pick_distractor_ids(index, quiz_type, word) for word in question_words}
+            words.update(_read_words(cursor, {word_id for ids in candidates.values() for word_id in ids} - words.keys()))
+
+    return [_build_question(quiz_type, word, [words[word_id] for word_id in candidates.get(word['id'], ()) if word_id in words])
+            for word in question_words]
@@ -1,6 +1,6 @@
 document.addEventListener('DOMContentLoaded', function () {
 
-    function initializeSortable(elementId, reorderUrl) {
+    function initializeSortable(elementId, moveUrlPrefix) {
         const sortableList = document.getElementById(elementId);
         if (sortableList) {
             new Sortable(sortableList, {
@@ -8,15 +8,18 @@ document.addEventListener('DOMContentLoaded', function () {
                 ghostClass: 'sortable-ghost',
                 handle: '.grabber',
                 onEnd: function (evt) {
-                    const rows = sortableList.querySelectorAll('tr');
-                    const orderedIds = Array.from(rows).map(row => row.dataset.id);
-                    fetch(reorderUrl, {
+                    if (evt.oldIndex === evt.newIndex) return;
+                    // Chỉ gửi mục vừa kéo và vị trí mới, server tự dịch các mục nằm giữa.
+                    // Danh sách được phân trang: vị trí tính trong cả danh sách = số dòng trước trang + vị trí trên trang
+                    const offset = Number(sortableList.dataset.offset || 0);
+                    fetch(`${moveUrlPrefix}/${evt.item.dataset.id}/move`, {
                         method: 'POST',
                         headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify({ ordered_ids: orderedIds }),
+                        body: JSON.stringify({ position: offset + evt.newIndex }),
                     }).then(response => response.json()).then(data => {
                         if (data.status !== 'success') {
                             alert('Lỗi khi cập nhật thứ tự: ' + data.message);
+                            window.location.reload();
                         }
                     }).catch(err => console.error(err));
                 },
@@ -24,6 +27,56 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     }
 
+    const JOB_POLL_INTERVAL = 1500;
+    const JOB_STATUS_TEXT = { queued: 'Đang chờ', running: 'Đang chạy', succeeded: 'Hoàn tất', failed: 'Thất bại' };
+
+    function fetchJob(jobId) {
+        return fetch(`/admin/jobs/${jobId}`).then(response => response.json());
+    }
+
+    // Hỏi trạng thái công việc định kỳ cho tới khi nó kết thúc
+    function waitForJob(jobId, onProgress) {
+        return new Promise((resolve, reject) => {
+            const poll = () => {
+                fetchJob(jobId).then(job => {
+                    if (job.status === 'error') {
+                        reject(new Error(job.message));
+                        return;
+                    }
+                    if (onProgress) onProgress(job);
+                    if (job.finished) resolve(job);
+                    else setTimeout(poll, JOB_POLL_INTERVAL);
+                }).catch(reject);
+            };
+            poll();
+        });
+    }
+
+    function initializeJobList() {
+        const pendingItems = document.querySelectorAll('.job-item[data-finished="0"]');
+        if (pendingItems.length === 0) return;
+
+        const jobs = Array.from(pendingItems).map(item => waitForJob(item.dataset.jobId, job => {
+            const statusEl = item.querySelector('.job-status');
+            statusEl.textContent = JOB_STATUS_TEXT[job.status];
+            statusEl.className = 'job-status font-medium ' +
+                (job.status === 'succeeded' ? 'text-green-600' : job.status === 'failed' ? 'text-red-600' : 'text-blue-600');
+            item.querySelector('.job-message').textContent = job.message || '';
+            const errorsEl = item.querySelector('.job-errors');
+            errorsEl.innerHTML = '';
+            ((job.result && job.result.errors) || []).forEach(error => {
+                const li = document.createElement('li');
+                li.textContent = error;
+                errorsEl.appendChild(li);
+            });
+        }).catch(err => console.error(err)));
+
+        // Tải lại trang để cập nhật danh sách bộ sưu tập khi có công việc vừa hoàn tất
+        Promise.all(jobs).then(results => {
+            if (results.some(job => job && job.status === 'succeeded')) window.location.reload();
+        });
+    }
+
     function initializeImportForm() {
         const importForm = document.getElementById('import-form');
         if (importForm) {
@@ -74,8 +127,9 @@ document.addEventListener('DOMContentLoaded', function () {
         });
     }
 
-    initializeSortable('sortable-topics', '/admin/topics/reorder');
-    initializeSortable('sortable-words', '/admin/words/reorder');
+    initializeSortable('sortable-topics', '/admin/topics');
+    initializeSortable('sortable-words', '/admin/words');
     initializeImportForm();
     initializeVisibilityToggle();
+    initializeJobList();
 });
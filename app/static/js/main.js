@@ -36,7 +36,10 @@ if (themeToggleBtn) {
 // --- LOGIC ỨNG DỤNG HỌC TỪ VỰNG ---
 document.addEventListener("DOMContentLoaded", async () => {
   // --- BIẾN TRẠNG THÁI VÀ DỮ LIỆU ---
-  let fullVocabularyData = [];
+  let catalogCache = null; // Cấu trúc catalog + các từ đã tải, được lưu lại trên máy
+  let fullVocabularyData = []; // Chỉ gồm các từ đã tải (theo chủ đề đang xem, từ đã lưu, từ cần ôn)
+  let viewRequestId = 0;
+  let dueReviews = { total: 0, topics: {}, wordIds: [] }; // Hàng đợi ôn tập lấy từ /api/reviews/due
   let topics = [];
   let userData = {};
   let userWordsData = {};
@@ -123,15 +126,14 @@ document.addEventListener("DOMContentLoaded", async () => {
       window.speechSynthesis.onvoiceschanged = loadSpeechVoices;
     }
 
-    loadUserWordsData();
+    await loadUserWordsData();
+    registerServiceWorker();
 
     try {
-      const response = await fetch("/api/data");
-      if (!response.ok) throw new Error(`Network error: ${response.status}`);
-      const data = await response.json();
-      topics = data.topics;
-      fullVocabularyData = data.words;
-      userData = data.user_data.reduce((acc, item) => {
+      catalogCache = await loadCatalog();
+      topics = catalogCache.topics;
+      fullVocabularyData = catalogCache.words;
+      userData = catalogCache.user_data.reduce((acc, item) => {
         acc[item.word_id] = item;
         return acc;
       }, {});
@@ -147,6 +149,9 @@ document.addEventListener("DOMContentLoaded", async () => {
     renderTopics();
     updateView(currentTopicId);
     setupEventListeners();
+    refreshDueReviews().then(renderTopics);
+    flushSrsEvents(); // Gửi các câu trả lời còn sót từ lần trước
+    window.addEventListener("online", flushSrsEvents); // Có mạng trở lại
   }
 
   // Hàm cài đặt các trình lắng nghe sự kiện
@@ -324,6 +329,8 @@ document.addEventListener("DOMContentLoaded", async () => {
     };
 
     // Gán sự kiện cho cả chuột và cảm ứng
+    document.addEventListener("visibilitychange", flushSrsEventsOnHide);
+
     document.addEventListener("mouseup", handleSelectionEnd);
     document.addEventListener("touchend", handleSelectionEnd);
 
@@ -406,19 +413,22 @@ document.addEventListener("DOMContentLoaded", async () => {
 
   // --- CÁC HÀM HIỂN THỊ VÀ CẬP NHẬT GIAO DIỆN ---
   let fillBlankQuizState = {};
-  function startFillBlankQuiz() {
+  async function startFillBlankQuiz() {
     // Lọc những từ có câu ví dụ và không quá phức tạp
-    const wordsWithExamples = getWordsForCurrentView().filter(
+    const words = getWordsForCurrentView();
+    const wordsWithExamples = words.filter(
       (w) => w.example && w.word.split(" ").length === 1
     );
     if (wordsWithExamples.length < 4) {
       return alert("Cần ít nhất 4 từ có câu ví dụ để bắt đầu bài tập này.");
     }
+    const questions = await loadQuiz("fill_blank", words);
+    if (questions.length === 0)
+      return alert("Không có từ phù hợp cho bài tập này.");
 
     fillBlankQuizState = {
-      questions: shuffleArray(wordsWithExamples).slice(0, 10),
+      questions,
       currentQuestionIndex: 0,
-      sourceWords: wordsWithExamples,
     };
 
     openModal(ui.fillBlankModal);
@@ -437,22 +447,13 @@ document.addEventListener("DOMContentLoaded", async () => {
     const questionWord =
       fillBlankQuizState.questions[fillBlankQuizState.currentQuestionIndex];
 
-    // Tạo câu bị khuyết
-    const blankSentence = questionWord.example.replace(
-      new RegExp(`\\b${questionWord.word}\\b`, "gi"),
-      "_______"
-    );
-    document.getElementById("fill-blank-sentence").innerHTML = blankSentence;
-
-    // Tạo các lựa chọn
-    let options = [{ word: questionWord.word, isCorrect: true }];
-    const distractors = shuffleArray(
-      fillBlankQuizState.sourceWords.filter((w) => w.id !== questionWord.id)
-    ).slice(0, 3);
-    distractors.forEach((d) =>
-      options.push({ word: d.word, isCorrect: false })
-    );
-    options = shuffleArray(options);
+    // Câu bị khuyết và các lựa chọn đã được tạo sẵn (xem loadQuiz)
+    document.getElementById("fill-blank-sentence").textContent =
+      questionWord.sentence;
+    const options = questionWord.options.map((opt, i) => ({
+      word: opt.word,
+      isCorrect: i === questionWord.answer,
+    }));
 
     const optionsContainer = document.getElementById("fill-blank-options");
     optionsContainer.innerHTML = "";
@@ -562,6 +563,8 @@ document.addEventListener("DOMContentLoaded", async () => {
       updateSrsStatus(wordId, isCorrect);
     });
 
+    flushSrsEvents();
+
     if (correctCount === 5) {
       feedbackEl.textContent = "Xuất sắc!";
       feedbackEl.className =
@@ -602,19 +605,8 @@ document.addEventListener("DOMContentLoaded", async () => {
           : ""
       }`;
       link.innerHTML = `<span class="mr-3 text-lg">${item.icon}</span> <span>${item.name}</span>`;
-      if (item.id === "review") {
-        // SỬA LẠI HOÀN TOÀN ĐOẠN LOGIC TÍNH TOÁN NÀY
-        const now = new Date();
-        const wordsToReviewCount = Object.values(userData).filter(
-          (wordProgress) =>
-            wordProgress.next_review_at &&
-            new Date(wordProgress.next_review_at) <= now
-        ).length;
-        // KẾT THÚC PHẦN SỬA
-
-        if (wordsToReviewCount > 0) {
-          link.innerHTML += `<span class="ml-auto bg-red-500 text-white text-xs font-bold px-2 py-0.5 rounded-full">${wordsToReviewCount}</span>`;
-        }
+      if (item.id === "review" && dueReviews.total > 0) {
+        link.innerHTML += `<span class="ml-auto bg-red-500 text-white text-xs font-bold px-2 py-0.5 rounded-full">${dueReviews.total}</span>`;
       }
       ui.topicNavigation.appendChild(link);
     });
@@ -661,10 +653,12 @@ document.addEventListener("DOMContentLoaded", async () => {
             : ""
         }`;
 
-        const wordCount = fullVocabularyData.filter(
-          (word) => word.topic_id === topic.id
-        ).length;
-        topicElement.innerHTML = `${topic.name}<span class="ml-auto text-xs font-mono bg-slate-200 dark:bg-slate-700 text-slate-500 dark:text-slate-400 px-1.5 py-0.5 rounded-full">${wordCount}</span>`;
+        const wordCount = topic.word_count;
+        const dueCount = dueReviews.topics[topic.id];
+        const dueBadge = dueCount
+          ? `<span class="ml-2 bg-red-500 text-white text-xs font-bold px-1.5 py-0.5 rounded-full">${dueCount}</span>`
+          : "";
+        topicElement.innerHTML = `${topic.name}${dueBadge}<span class="ml-auto text-xs font-mono bg-slate-200 dark:bg-slate-700 text-slate-500 dark:text-slate-400 px-1.5 py-0.5 rounded-full">${wordCount}</span>`;
         topicsList.appendChild(topicElement);
       });
 
@@ -833,7 +827,7 @@ document.addEventListener("DOMContentLoaded", async () => {
     );
   }
 
-  function updateView(topicId) {
+  async function updateView(topicId) {
     if (topicId === "progress") {
       currentTopicId = "progress";
       renderTopics();
@@ -845,12 +839,34 @@ document.addEventListener("DOMContentLoaded", async () => {
     }
 
     currentTopicId = topicId;
+    const requestId = ++viewRequestId;
     let words;
     let title;
 
     if (ui.vocabularyContainer)
       ui.vocabularyContainer.innerHTML = `<div class="text-center col-span-full p-10">Đang tải...</div>`;
 
+    try {
+      if (topicId === "favorites") {
+        await ensureWordsLoaded(
+          Object.keys(userWordsData)
+            .filter((id) => userWordsData[id].isFavorite)
+            .map(Number)
+        );
+      } else if (topicId === "review") {
+        await refreshDueReviews();
+      } else {
+        await ensureTopicLoaded(topicId);
+      }
+    } catch (error) {
+      console.error("Failed to load words:", error);
+      if (requestId === viewRequestId && ui.vocabularyContainer)
+        ui.vocabularyContainer.innerHTML = `<p class="text-red-500 text-center col-span-full">Lỗi tải dữ liệu. Vui lòng kiểm tra lại kết nối.</p>`;
+      return;
+    }
+    // Người dùng đã chuyển sang mục khác trong lúc chờ tải
+    if (requestId !== viewRequestId) return;
+
     if (topicId === "favorites") {
       title = "Từ đã lưu";
       words = fullVocabularyData.filter(
@@ -858,12 +874,7 @@ document.addEventListener("DOMContentLoaded", async () => {
       );
     } else if (topicId === "review") {
       title = "Ôn tập hôm nay";
-      const now = new Date();
-      words = fullVocabularyData.filter((word) => {
-        const wordProgress = userData[word.id];
-        // Lấy những từ có ngày ôn tập đã đến hạn
-        return wordProgress && new Date(wordProgress.next_review_at) <= now;
-      });
+      words = getDueReviewWords();
     } else {
       const topic = topics.find((t) => t.id === currentTopicId);
       title = topic ? topic.name : "Không xác định";
@@ -876,43 +887,385 @@ document.addEventListener("DOMContentLoaded", async () => {
     renderTopics();
   }
 
-  function handleSearch(query) {
-    const lowerCaseQuery = query.toLowerCase().trim();
-    if (lowerCaseQuery === "") {
+  // Tìm kiếm chạy ở server (/api/search): không cần tải toàn bộ từ vựng về máy
+  const SEARCH_RESULT_LIMIT = 50;
+
+  async function handleSearch(query) {
+    const trimmedQuery = query.trim();
+    if (trimmedQuery === "") {
       updateView(currentTopicId);
       return;
     }
-    const filteredWords = fullVocabularyData.filter(
-      (word) =>
-        word.word.toLowerCase().includes(lowerCaseQuery) ||
-        word.meaning.toLowerCase().includes(lowerCaseQuery)
-    );
+    const requestId = ++viewRequestId;
+    let results;
+    try {
+      results = (
+        await fetchJson(
+          `/api/search?q=${encodeURIComponent(trimmedQuery)}&limit=${SEARCH_RESULT_LIMIT}`
+        )
+      ).results;
+    } catch (error) {
+      console.error("Search failed:", error);
+      return;
+    }
+    // Người dùng đã gõ tiếp hoặc chuyển sang mục khác trong lúc chờ
+    if (requestId !== viewRequestId) return;
+
+    const words = results.map(({ topic_name, rank, ...word }) => word);
+    if (words.length > 0) addLoadedWords(words);
     if (ui.currentTopicTitle)
       ui.currentTopicTitle.textContent = `Kết quả cho "${query}"`;
-    renderVocabulary(filteredWords);
+    renderVocabulary(words);
   }
 
   // --- CÁC HÀM TIỆN ÍCH VÀ QUẢN LÝ DỮ LIỆU ---
 
+  // Tải cấu trúc dữ liệu (bộ sưu tập, chủ đề kèm số từ, tiến độ). Nếu đã có bản lưu trên máy
+  // thì chỉ tải phần thay đổi qua /api/data/changes; từ vựng được tải theo từng chủ đề khi cần.
+  async function loadCatalog() {
+    const cached = await readCatalogCache();
+    if (cached && cached.version && cached.loaded_topics) {
+      try {
+        const response = await fetch(
+          `/api/data/changes?since=${encodeURIComponent(cached.version)}&words=0`
+        );
+        if (response.ok) {
+          const changes = await response.json();
+          if (changes.version === cached.version) return cached;
+          const merged = applyCatalogChanges(cached, changes);
+          writeCatalogCache(merged);
+          return merged;
+        }
+      } catch (error) {
+        console.warn("Delta sync failed, reloading catalog structure:", error);
+      }
+    }
+
+    try {
+      const data = await fetchCatalogStructure();
+      writeCatalogCache(data);
+      return data;
+    } catch (error) {
+      // Mất mạng: dùng tạm bản đã lưu nếu có
+      if (cached && cached.loaded_topics) return cached;
+      throw error;
+    }
+  }
+
+  async function fetchCatalogStructure() {
+    const { version, collections } = await fetchJson("/api/collections");
+    const topicLists = await Promise.all(
+      collections.map((c) =>
+        fetchAllPages(`/api/collections/${c.id}/topics`, "topics")
+      )
+    );
+    const { user_data } = await fetchJson("/api/user_data");
+    return {
+      version,
+      collections,
+      topics: topicLists.flat(),
+      words: [],
+      loaded_topics: [],
+      user_data,
+    };
+  }
+
+  // Xin định dạng dạng cột (tên cột chỉ gửi một lần cho mỗi bảng, payload nhỏ hơn nhiều)
+  // rồi chuyển lại thành mảng object như định dạng JSON thường
+  const COLUMNAR_JSON = "application/vnd.aneng.columnar+json";
+
+  async function fetchJson(url) {
+    const response = await fetch(url, {
+      headers: { Accept: `${COLUMNAR_JSON}, application/json;q=0.9` },
+    });
+    if (!response.ok) throw new Error(`Network error: ${response.status}`);
+    const payload = await response.json();
+    return response.headers.get("Content-Type")?.startsWith(COLUMNAR_JSON)
+      ? decodeColumnar(payload)
+      : payload;
+  }
+
+  function decodeColumnar(payload) {
+    for (const [key, value] of Object.entries(payload)) {
+      if (value && Array.isArray(value.columns) && Array.isArray(value.rows)) {
+        payload[key] = value.rows.map((row) =>
+          Object.fromEntries(value.columns.map((column, i) => [column, row[i]]))
+        );
+      }
+    }
+    return payload;
+  }
+
+  // Lần lượt tải hết các trang của một endpoint phân trang (tham số after/next_after)
+  async function fetchAllPages(url, key) {
+    let rows = [];
+    let after = null;
+    do {
+      const page = await fetchJson(
+        after ? `${url}?after=${encodeURIComponent(after)}` : url
+      );
+      rows = rows.concat(page[key]);
+      after = page.next_after;
+    } while (after);
+    return rows;
+  }
+
+  async function ensureTopicLoaded(topicId) {
+    if (catalogCache.loaded_topics.includes(topicId)) return;
+    const words = await fetchAllPages(`/api/topics/${topicId}/words`, "words");
+    catalogCache.loaded_topics.push(topicId);
+    addLoadedWords(words, catalogCache.loaded_topics);
+  }
+
+  async function ensureWordsLoaded(wordIds) {
+    const loadedIds = new Set(fullVocabularyData.map((w) => w.id));
+    const missingIds = wordIds.filter((id) => !loadedIds.has(id));
+    const words = [];
+    for (let i = 0; i < missingIds.length; i += 500) {
+      const ids = missingIds.slice(i, i + 500).join(",");
+      words.push(...(await fetchJson(`/api/words?ids=${ids}`)).words);
+    }
+    if (words.length > 0) addLoadedWords(words);
+  }
+
+  // Danh sách từ cần ôn được server tính bằng truy vấn có index (xem /api/reviews/due),
+  // thay vì duyệt toàn bộ userData mỗi lần render. Một phiên ôn tập tối đa REVIEW_SESSION_SIZE từ.
+  const REVIEW_SESSION_SIZE = 50;
+
+  async function refreshDueReviews() {
+    try {
+      const result = await fetchJson(
+        `/api/reviews/due?limit=${REVIEW_SESSION_SIZE}`
+      );
+      // Bỏ các cột tiến độ đi kèm để không lưu lẫn vào catalog
+      if (result.words.length > 0)
+        addLoadedWords(
+          result.words.map(({ srs_level, next_review_at, ...word }) => word)
+        );
+      dueReviews = {
+        total: result.total,
+        topics: result.topics,
+        wordIds: result.words.map((w) => w.id),
+      };
+    } catch (error) {
+      console.error("Failed to load due reviews:", error);
+    }
+  }
+
+  function getDueReviewWords() {
+    const wordsById = new Map(fullVocabularyData.map((w) => [w.id, w]));
+    return dueReviews.wordIds
+      .map((id) => wordsById.get(id))
+      .filter(Boolean);
+  }
+
+  function addLoadedWords(words, loadedTopics) {
+    const wordsById = new Map(catalogCache.words.map((w) => [w.id, w]));
+    words.forEach((w) => wordsById.set(w.id, w));
+    catalogCache.words = [...wordsById.values()].sort(compareWords);
+    fullVocabularyData = catalogCache.words;
+    // Chỉ ghi các từ vừa tải, không ghi lại cả catalog
+    offlineStore
+      .saveWords(words, loadedTopics)
+      .catch((error) => console.warn("Failed to store words offline:", error));
+  }
+
+  // Gộp các thay đổi từ /api/data/changes vào bản catalog đã lưu.
+  // Chủ đề có thay đổi sẽ bị bỏ khỏi danh sách đã tải để lần xem sau tải lại từ server.
+  function applyCatalogChanges(cache, changes) {
+    const upsert = (rows, updates, deletedIds, key = "id") => {
+      const byKey = new Map(rows.map((row) => [row[key], row]));
+      updates.forEach((row) => byKey.set(row[key], row));
+      deletedIds.forEach((id) => byKey.delete(id));
+      return byKey;
+    };
+
+    const collections = upsert(
+      cache.collections,
+      changes.collections,
+      changes.deleted.collections
+    );
+    for (const [id, collection] of collections) {
+      if (!collection.is_visible) collections.delete(id); // Bộ sưu tập vừa bị ẩn
+    }
+
+    // Gỡ các chủ đề/từ không còn thuộc bộ sưu tập/chủ đề nào (xóa dây chuyền hoặc bị ẩn)
+    const topicsById = upsert(cache.topics, changes.topics, changes.deleted.topics);
+    for (const [id, topic] of topicsById) {
+      if (!collections.has(topic.collection_id)) topicsById.delete(id);
+    }
+
+    const changedTopicIds = new Set(changes.topics.map((t) => t.id));
+    const isStillValid = (topicId) =>
+      topicsById.has(topicId) && !changedTopicIds.has(topicId);
+    const deletedWordIds = new Set(changes.deleted.words);
+
+    const userDataById = upsert(
+      cache.user_data,
+      changes.user_data,
+      changes.deleted.user_data,
+      "word_id"
+    );
+
+    return {
+      version: changes.version,
+      collections: [...collections.values()].sort((a, b) =>
+        a.name.localeCompare(b.name)
+      ),
+      topics: [...topicsById.values()].sort(
+        (a, b) =>
+          a.collection_id - b.collection_id ||
+          a.position - b.position ||
+          a.id - b.id
+      ),
+      words: cache.words.filter(
+        (word) => isStillValid(word.topic_id) && !deletedWordIds.has(word.id)
+      ),
+      loaded_topics: cache.loaded_topics.filter(isStillValid),
+      user_data: [...userDataById.values()],
+    };
+  }
+
+  function compareWords(a, b) {
+    return a.topic_id - b.topic_id || a.position - b.position || a.id - b.id;
+  }
+
+  // Bản catalog lưu trên máy nằm trong IndexedDB (xem store.js). Không đọc/ghi được
+  // (trình duyệt chặn, hết dung lượng) thì coi như chưa có bản lưu, lần sau tải toàn bộ.
+  async function readCatalogCache() {
+    try {
+      const cached = await offlineStore.readCatalog();
+      if (cached) cached.words.sort(compareWords); // IndexedDB trả về theo thứ tự id
+      return cached;
+    } catch (error) {
+      console.warn("Offline catalog is unavailable:", error);
+      return null;
+    }
+  }
+
+  function writeCatalogCache(data) {
+    offlineStore
+      .replaceCatalog(data)
+      .catch((error) => console.warn("Failed to store catalog offline:", error));
+  }
+
+  // Các câu trả lời quiz được xếp vào hàng đợi trong IndexedDB (mỗi câu một bản ghi) và gửi
+  // theo lô qua /api/update_srs/batch: khi đủ SRS_FLUSH_SIZE câu, khi kết thúc/đóng quiz, khi rời
+  // trang và khi có mạng trở lại. Đang offline thì service worker gửi lại bằng Background Sync.
+  const SRS_FLUSH_SIZE = 20;
+  const SRS_SYNC_TAG = "srs-sync"; // Trùng với sw.js
+  let pendingSrsCount = 0;
+  let srsFlushInFlight = null;
+
   async function updateSrsStatus(wordId, isCorrect) {
+    const event = {
+      word_id: Number(wordId),
+      is_correct: isCorrect,
+      answered_at: new Date().toISOString(),
+    };
     try {
-      const response = await fetch("/api/update_srs", {
+      await offlineStore.enqueueSrsEvent(event);
+    } catch (error) {
+      // Không có IndexedDB: gửi ngay từng câu
+      console.warn("SRS queue is unavailable:", error);
+      sendSrsEvents([event]);
+      return;
+    }
+    if (++pendingSrsCount >= SRS_FLUSH_SIZE) flushSrsEvents();
+  }
+
+  async function flushSrsEvents() {
+    if (srsFlushInFlight) await srsFlushInFlight; // Giữ đúng thứ tự giữa các lô
+
+    srsFlushInFlight = (async () => {
+      try {
+        pendingSrsCount = 0;
+        const results = await offlineStore.flushSrsQueue();
+        if (results.length > 0) await applySrsResults(results);
+      } catch (error) {
+        console.error("SRS Update Error:", error);
+        // Phần chưa gửi vẫn nằm trong hàng đợi: nhờ service worker gửi khi có mạng
+        requestSrsSync();
+      } finally {
+        srsFlushInFlight = null;
+      }
+    })();
+    await srsFlushInFlight;
+  }
+
+  async function sendSrsEvents(events) {
+    try {
+      const response = await fetch("/api/update_srs/batch", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ word_id: wordId, is_correct: isCorrect }),
+        body: JSON.stringify({ events }),
       });
       if (!response.ok) throw new Error("Failed to update SRS status");
-      const result = await response.json();
-
-      // Cập nhật trạng thái SRS ở phía client ngay lập tức
-      userData[wordId] = userData[wordId] || {};
-      userData[wordId].srs_level = result.new_level;
-      console.log(`Word ${wordId} updated to SRS level ${result.new_level}`);
+      await applySrsResults((await response.json()).results);
     } catch (error) {
       console.error("SRS Update Error:", error);
     }
   }
 
+  // Cập nhật trạng thái SRS ở phía client và trong bản lưu offline
+  async function applySrsResults(results) {
+    const changed = results.map(({ word_id, new_level, next_review_at }) => {
+      userData[word_id] = userData[word_id] || { word_id };
+      userData[word_id].srs_level = new_level;
+      userData[word_id].next_review_at = next_review_at;
+      return userData[word_id];
+    });
+    offlineStore
+      .putMany("user_data", changed)
+      .catch((error) => console.warn("Failed to store progress offline:", error));
+    await refreshDueReviews();
+    renderTopics();
+  }
+
+  function requestSrsSync() {
+    if (!("serviceWorker" in navigator)) return;
+    navigator.serviceWorker.ready
+      .then((registration) =>
+        registration.sync ? registration.sync.register(SRS_SYNC_TAG) : null
+      )
+      .catch((error) => console.warn("Background sync is unavailable:", error));
+  }
+
+  // Khi trang bị ẩn/đóng, fetch thường có thể bị hủy: dùng sendBeacon
+  // (không đọc được response nên lấy các câu trả lời ra khỏi hàng đợi trước khi gửi)
+  async function flushSrsEventsOnHide() {
+    if (document.visibilityState !== "hidden") return;
+    if (!navigator.sendBeacon) {
+      flushSrsEvents();
+      return;
+    }
+    let events;
+    try {
+      events = await offlineStore.takeSrsEvents();
+    } catch (error) {
+      return;
+    }
+    if (events.length === 0) return;
+    const body = new Blob([JSON.stringify({ events })], {
+      type: "application/json",
+    });
+    pendingSrsCount = 0;
+    if (!navigator.sendBeacon("/api/update_srs/batch", body)) {
+      await offlineStore.putMany("srs_queue", events);
+      requestSrsSync();
+    }
+  }
+
+  // Service worker (sw.js) phục vụ giao diện và catalog đã cache khi offline
+  function registerServiceWorker() {
+    if (!("serviceWorker" in navigator)) return;
+    navigator.serviceWorker
+      .register("/sw.js")
+      .catch((error) =>
+        console.warn("Service worker registration failed:", error)
+      );
+  }
+
   async function showTranslationPopup(text, rect) {
     if (!ui.translationPopup) return;
 
@@ -951,6 +1304,11 @@ document.addEventListener("DOMContentLoaded", async () => {
         body: JSON.stringify({ text: text }),
       });
 
+      if (response.status === 503) {
+        // Dịch vụ dịch đang quá tải hoặc tạm ngắt ở phía server
+        ui.translationPopup.innerHTML = "Dịch vụ dịch đang bận, vui lòng thử lại sau.";
+        return;
+      }
       if (!response.ok) throw new Error("Translation request failed");
 
       const data = await response.json();
@@ -975,14 +1333,24 @@ document.addEventListener("DOMContentLoaded", async () => {
     speechVoices = window.speechSynthesis.getVoices();
   }
 
-  function loadUserWordsData() {
-    const saved = localStorage.getItem("userWordsData");
-    userWordsData = saved ? JSON.parse(saved) : {};
+  async function loadUserWordsData() {
+    try {
+      const records = await offlineStore.getAll("user_words");
+      userWordsData = Object.fromEntries(
+        records.map(({ word_id, ...data }) => [word_id, data])
+      );
+    } catch (error) {
+      console.warn("Offline progress is unavailable:", error);
+      userWordsData = {};
+    }
     updateDailyStreak();
   }
 
-  function saveUserWordsData() {
-    localStorage.setItem("userWordsData", JSON.stringify(userWordsData));
+  // Ghi riêng bản ghi của một từ thay vì cả userWordsData
+  function saveUserWordData(wordId) {
+    offlineStore
+      .putMany("user_words", [{ ...userWordsData[wordId], word_id: Number(wordId) }])
+      .catch((error) => console.warn("Failed to store favorite:", error));
   }
 
   function updateDailyStreak() {
@@ -1002,7 +1370,7 @@ document.addEventListener("DOMContentLoaded", async () => {
       (userWordsData[wordId] = { level: 0, nextReview: null });
     userWordsData[wordId].isFavorite = !userWordsData[wordId].isFavorite;
     element.classList.toggle("favorited", userWordsData[wordId].isFavorite);
-    saveUserWordsData();
+    saveUserWordData(wordId);
     if ("favorites" === currentTopicId) updateView("favorites");
   }
 
@@ -1028,11 +1396,7 @@ document.addEventListener("DOMContentLoaded", async () => {
           (e) => e.id in userWordsData && userWordsData[e.id].isFavorite
         );
       case "review":
-        return fullVocabularyData.filter(
-          (e) =>
-            e.id in userWordsData &&
-            userWordsData[e.id].nextReview <= Date.now()
-        );
+        return getDueReviewWords();
       case "progress":
         return [];
       default:
@@ -1065,6 +1429,7 @@ document.addEventListener("DOMContentLoaded", async () => {
   }
 
   function closeModal(modal) {
+    flushSrsEvents();
     if (modal) {
       modal.classList.add("opacity-0");
       const modalContent = modal.querySelector("div > div");
@@ -1096,18 +1461,81 @@ document.addEventListener("DOMContentLoaded", async () => {
 
   // --- CÁC HÀM LIÊN QUAN ĐẾN QUIZ ---
 
-  function startQuiz() {
+  // Bài quiz được tạo ở server (/api/quiz): câu hỏi có sẵn các lựa chọn và vị trí đáp án đúng, đáp án nhiễu
+  // được lấy từ cùng chủ đề và một phần câu hỏi dành cho từ đến hạn ôn/còn yếu. Trình duyệt không phải
+  // duyệt và xáo trộn cả danh sách từ cho mỗi câu hỏi.
+  const QUIZ_SIZE = 10;
+  const MAX_QUIZ_SIZE = 50;
+  const MAX_QUIZ_IDS = 500;
+
+  function quizScopeParams(words) {
+    if (currentTopicId === "review") return "scope=review";
+    if (currentTopicId === "favorites")
+      return `ids=${words
+        .slice(0, MAX_QUIZ_IDS)
+        .map((w) => w.id)
+        .join(",")}`;
+    return `topic=${currentTopicId}`;
+  }
+
+  async function loadQuiz(type, words, size = QUIZ_SIZE) {
+    try {
+      const { questions } = await fetchJson(
+        `/api/quiz?type=${type}&size=${size}&${quizScopeParams(words)}`
+      );
+      return questions;
+    } catch (error) {
+      console.warn("Server quiz failed, building quiz locally:", error);
+      return buildLocalQuiz(type, words, size);
+    }
+  }
+
+  // Dự phòng khi không gọi được server: tạo quiz từ các từ đã tải trên máy, cùng định dạng với /api/quiz
+  function buildLocalQuiz(type, words, size) {
+    const eligible = words.filter(
+      (w) =>
+        type === "multiple_choice" ||
+        type === "listening" ||
+        (w.word.split(" ").length === 1 && (type === "spelling" || w.example))
+    );
+    return shuffleArray([...eligible])
+      .slice(0, size)
+      .map((word) => {
+        const question = { ...word };
+        if (type === "fill_blank")
+          question.sentence = word.example.replace(
+            new RegExp(`\\b${word.word}\\b`, "gi"),
+            "_______"
+          );
+        if (type === "spelling") return question;
+        const options = shuffleArray([
+          word,
+          ...shuffleArray(eligible.filter((w) => w.id !== word.id)).slice(0, 3),
+        ]);
+        question.options = options.map(({ id, word, meaning }) => ({
+          id,
+          word,
+          meaning,
+        }));
+        question.answer = options.indexOf(word);
+        return question;
+      });
+  }
+
+  async function startQuiz() {
     const words = getWordsForCurrentView();
     if (words.length < 4)
       return void alert(
         "Cần ít nhất 4 từ trong danh sách này để tạo bài trắc nghiệm."
       );
+    const questions = await loadQuiz("multiple_choice", words);
+    if (questions.length === 0)
+      return void alert("Không có từ phù hợp cho bài tập này.");
     trackQuizTaken();
     quizState = {
-      questions: shuffleArray(words).slice(0, 10),
+      questions,
       currentQuestionIndex: 0,
       score: 0,
-      sourceWords: words,
     };
     document.getElementById("quiz-content").style.display = "block";
     document.getElementById("quiz-results").style.display = "none";
@@ -1119,7 +1547,10 @@ document.addEventListener("DOMContentLoaded", async () => {
     if (quizState.currentQuestionIndex >= quizState.questions.length)
       return void showQuizResults();
     const questionWord = quizState.questions[quizState.currentQuestionIndex];
-    const options = getQuizOptions(questionWord);
+    const options = questionWord.options.map((opt, i) => ({
+      meaning: opt.meaning,
+      isCorrect: i === questionWord.answer,
+    }));
     document.getElementById(
       "quiz-question"
     ).textContent = `Từ "${questionWord.word}" có nghĩa là gì?`;
@@ -1139,17 +1570,6 @@ document.addEventListener("DOMContentLoaded", async () => {
     ui.nextQuizBtn.classList.add("hidden");
   }
 
-  function getQuizOptions(correctWord) {
-    let options = [{ meaning: correctWord.meaning, isCorrect: true }];
-    const distractors = shuffleArray(
-      quizState.sourceWords.filter((w) => w.id !== correctWord.id)
-    ).slice(0, 3);
-    distractors.forEach((d) =>
-      options.push({ meaning: d.meaning, isCorrect: false })
-    );
-    return shuffleArray(options);
-  }
-
   function checkAnswer(isCorrect, btnElement) {
     document.querySelectorAll("#quiz-options .quiz-option").forEach((btn) => {
       btn.disabled = true;
@@ -1173,6 +1593,7 @@ document.addEventListener("DOMContentLoaded", async () => {
   }
 
   function showQuizResults() {
+    flushSrsEvents();
     document.getElementById("quiz-content").style.display = "none";
     const resultsDiv = document.getElementById("quiz-results");
     resultsDiv.style.display = "block";
@@ -1193,15 +1614,17 @@ document.addEventListener("DOMContentLoaded", async () => {
     ).textContent = `Bạn đã trả lời đúng ${score} / ${total} câu. ${feedback}`;
   }
 
-  function startSpellingQuiz() {
-    const words = getWordsForCurrentView().filter(
-      (w) => w.word.split(" ").length === 1
+  async function startSpellingQuiz() {
+    const questions = await loadQuiz(
+      "spelling",
+      getWordsForCurrentView(),
+      MAX_QUIZ_SIZE
     );
-    if (words.length < 1)
+    if (questions.length < 1)
       return void alert("Không có từ phù hợp cho bài tập này.");
     trackQuizTaken();
     spellingQuizState = {
-      questions: shuffleArray(words),
+      questions,
       currentQuestionIndex: 0,
     };
     openModal(ui.spellingQuizModal);
@@ -1254,19 +1677,21 @@ document.addEventListener("DOMContentLoaded", async () => {
     ui.nextSpellingQuizBtn.classList.remove("hidden");
   }
 
-  function startListeningQuiz() {
+  async function startListeningQuiz() {
     const words = getWordsForCurrentView();
     if (words.length < 4)
       return void alert(
         "Cần ít nhất 4 từ trong danh sách này để tạo bài trắc nghiệm."
       );
+    const questions = await loadQuiz("listening", words);
+    if (questions.length === 0)
+      return void alert("Không có từ phù hợp cho bài tập này.");
     trackQuizTaken();
     quizState = {
       type: "listening",
-      questions: shuffleArray(words).slice(0, 10),
+      questions,
       currentQuestionIndex: 0,
       score: 0,
-      sourceWords: words,
     };
     document.getElementById("listening-quiz-content").style.display = "block";
     document.getElementById("listening-quiz-results").style.display = "none";
@@ -1278,7 +1703,10 @@ document.addEventListener("DOMContentLoaded", async () => {
     if (quizState.currentQuestionIndex >= quizState.questions.length)
       return void showListeningQuizResults();
     const questionWord = quizState.questions[quizState.currentQuestionIndex];
-    const options = getListeningQuizOptions(questionWord);
+    const options = questionWord.options.map((opt, i) => ({
+      word: opt.word,
+      isCorrect: i === questionWord.answer,
+    }));
     ui.playListeningQuizSoundBtn.onclick = () => speakText(questionWord.word);
     speakText(questionWord.word);
     const optionsContainer = document.getElementById("listening-quiz-options");
@@ -1297,17 +1725,6 @@ document.addEventListener("DOMContentLoaded", async () => {
     ui.nextListeningQuizBtn.classList.add("hidden");
   }
 
-  function getListeningQuizOptions(correctWord) {
-    let options = [{ word: correctWord.word, isCorrect: true }];
-    const distractors = shuffleArray(
-      quizState.sourceWords.filter((w) => w.id !== correctWord.id)
-    ).slice(0, 3);
-    distractors.forEach((d) =>
-      options.push({ word: d.word, isCorrect: false })
-    );
-    return shuffleArray(options);
-  }
-
   function checkListeningAnswer(isCorrect, btnElement) {
     const allOptionBtns = document.querySelectorAll(
       "#listening-quiz-options .quiz-option"
@@ -1330,18 +1747,19 @@ document.addEventListener("DOMContentLoaded", async () => {
           btn.classList.add("correct");
       });
     }
-    allOptionBtns.forEach((btn) => {
-      const wordText = btn.textContent.split("\n")[0].trim();
-      const wordObj = fullVocabularyData.find((w) => w.word === wordText);
-      if (wordObj) {
+    // Các nút theo đúng thứ tự lựa chọn của câu hỏi: hiện nghĩa của từng lựa chọn
+    const { options } = quizState.questions[quizState.currentQuestionIndex];
+    allOptionBtns.forEach((btn, i) => {
+      if (options[i]) {
         btn.classList.add("flex", "flex-col", "items-center", "justify-center");
-        btn.innerHTML += `<span class="block text-xs text-slate-500 mt-1">(${wordObj.meaning})</span>`;
+        btn.innerHTML += `<span class="block text-xs text-slate-500 mt-1">(${options[i].meaning})</span>`;
       }
     });
     ui.nextListeningQuizBtn.classList.remove("hidden");
   }
 
   function showListeningQuizResults() {
+    flushSrsEvents();
     document.getElementById("listening-quiz-content").style.display = "none";
     const resultsDiv = document.getElementById("listening-quiz-results");
     resultsDiv.style.display = "block";
@@ -1368,8 +1786,10 @@ document.addEventListener("DOMContentLoaded", async () => {
 
   function renderStats() {
     if (document.getElementById("total-words-stat"))
-      document.getElementById("total-words-stat").textContent =
-        fullVocabularyData.length;
+      document.getElementById("total-words-stat").textContent = topics.reduce(
+        (sum, topic) => sum + (topic.word_count || 0),
+        0
+      );
     if (document.getElementById("total-topics-stat"))
       document.getElementById("total-topics-stat").textContent = topics.length;
   }
@@ -1421,9 +1841,7 @@ document.addEventListener("DOMContentLoaded", async () => {
     const masteredCount = Object.values(userWordsData).filter(
       (w) => w.level >= 5
     ).length;
-    const reviewCount = Object.values(userWordsData).filter(
-      (w) => w.nextReview && w.nextReview <= Date.now()
-    ).length;
+    const reviewCount = dueReviews.total;
     document.getElementById("progress-streak").textContent = streak;
     document.getElementById("progress-mastered").textContent = masteredCount;
     document.getElementById("progress-review").textContent = reviewCount;
@@ -0,0 +1,254 @@
+// Kho dữ liệu offline trên IndexedDB, dùng chung cho trang (main.js) và service worker (sw.js):
+//  - meta: cấu trúc catalog (version, collections, topics, loaded_topics) dưới khóa "catalog"
+//  - words, user_data: mỗi từ / tiến độ của mỗi từ là một bản ghi, được ghi riêng lẻ
+//    thay vì JSON.stringify lại toàn bộ catalog như khi còn lưu trong localStorage
+//  - user_words: từ yêu thích, mỗi từ một bản ghi
+//  - srs_queue: các câu trả lời quiz chưa gửi được lên server (xem flushSrsQueue)
+// Trình duyệt không có IndexedDB (hoặc bị chặn) thì mọi hàm trả về Promise bị reject, main.js tự xử lý.
+const offlineStore = (() => {
+  const DB_NAME = "aneng";
+  const DB_VERSION = 1;
+  const SRS_BATCH_SIZE = 500; // Bằng MAX_SRS_BATCH_SIZE của /api/update_srs/batch
+  const SRS_LOCK_NAME = "aneng-srs-queue";
+  // Các key localStorage cũ, được chuyển sang IndexedDB ở lần mở đầu tiên rồi xóa
+  const LEGACY_KEYS = ["catalogCache", "userWordsData", "pendingSrsEvents"];
+
+  let dbPromise = null;
+
+  function open() {
+    if (!dbPromise) {
+      dbPromise = new Promise((resolve, reject) => {
+        if (!self.indexedDB) {
+          reject(new Error("IndexedDB is not available"));
+          return;
+        }
+        const request = self.indexedDB.open(DB_NAME, DB_VERSION);
+        request.onupgradeneeded = () => {
+          const db = request.result;
+          db.createObjectStore("meta");
+          db.createObjectStore("words", { keyPath: "id" });
+          db.createObjectStore("user_data", { keyPath: "word_id" });
+          db.createObjectStore("user_words", { keyPath: "word_id" });
+          db.createObjectStore("srs_queue", { keyPath: "seq", autoIncrement: true });
+        };
+        request.onsuccess = () => {
+          const db = request.result;
+          // Tab khác mở phiên bản schema mới hơn: đóng để không chặn việc nâng cấp
+          db.onversionchange = () => {
+            db.close();
+            dbPromise = null;
+          };
+          resolve(db);
+        };
+        request.onerror = () => reject(request.error);
+        request.onblocked = () => reject(new Error("IndexedDB upgrade is blocked"));
+      });
+      dbPromise = dbPromise.then(migrateLocalStorage);
+      dbPromise.catch(() => (dbPromise = null));
+    }
+    return dbPromise;
+  }
+
+  // Chạy `work(stores)` trong một transaction; Promise hoàn tất khi transaction đã commit
+  async function transaction(storeNames, mode, work) {
+    const db = await open();
+    return new Promise((resolve, reject) => {
+      const tx = db.transaction(storeNames, mode);
+      const stores = Object.fromEntries(
+        storeNames.map((name) => [name, tx.objectStore(name)])
+      );
+      let result;
+      tx.oncomplete = () => resolve(result);
+      tx.onerror = () => reject(tx.error);
+      tx.onabort = () => reject(tx.error || new Error("Transaction aborted"));
+      Promise.resolve(work(stores)).then(
+        (value) => (result = value),
+        (error) => {
+          tx.abort();
+          reject(error);
+        }
+      );
+    });
+  }
+
+  function requestResult(request) {
+    return new Promise((resolve, reject) => {
+      request.onsuccess = () => resolve(request.result);
+      request.onerror = () => reject(request.error);
+    });
+  }
+
+  function getAll(storeName) {
+    return transaction([storeName], "readonly", (stores) =>
+      requestResult(stores[storeName].getAll())
+    );
+  }
+
+  function putMany(storeName, records) {
+    if (records.length === 0) return Promise.resolve();
+    return transaction([storeName], "readwrite", (stores) => {
+      records.forEach((record) => stores[storeName].put(record));
+    });
+  }
+
+  function deleteMany(storeName, keys) {
+    if (keys.length === 0) return Promise.resolve();
+    return transaction([storeName], "readwrite", (stores) => {
+      keys.forEach((key) => stores[storeName].delete(key));
+    });
+  }
+
+  // --- Catalog ---
+
+  async function readCatalog() {
+    return transaction(
+      ["meta", "words", "user_data"],
+      "readonly",
+      async (stores) => {
+        const [meta, words, userData] = await Promise.all([
+          requestResult(stores.meta.get("catalog")),
+          requestResult(stores.words.getAll()),
+          requestResult(stores.user_data.getAll()),
+        ]);
+        return meta ? { ...meta, words, user_data: userData } : null;
+      }
+    );
+  }
+
+  // Ghi lại toàn bộ catalog (sau lần tải đầu hoặc sau khi gộp delta) trong một transaction
+  function replaceCatalog(catalog) {
+    const { words, user_data, ...meta } = catalog;
+    return transaction(
+      ["meta", "words", "user_data"],
+      "readwrite",
+      (stores) => {
+        stores.meta.put(meta, "catalog");
+        stores.words.clear();
+        words.forEach((word) => stores.words.put(word));
+        stores.user_data.clear();
+        user_data.forEach((item) => stores.user_data.put(item));
+      }
+    );
+  }
+
+  // Thêm các từ vừa tải (và cập nhật danh sách chủ đề đã tải) mà không chạm tới các bản ghi khác
+  function saveWords(words, loadedTopics) {
+    return transaction(["meta", "words"], "readwrite", async (stores) => {
+      words.forEach((word) => stores.words.put(word));
+      if (loadedTopics) {
+        const meta = await requestResult(stores.meta.get("catalog"));
+        if (meta)
+          stores.meta.put({ ...meta, loaded_topics: loadedTopics }, "catalog");
+      }
+    });
+  }
+
+  // --- Hàng đợi câu trả lời quiz ---
+
+  function enqueueSrsEvent(event) {
+    return transaction(["srs_queue"], "readwrite", (stores) =>
+      requestResult(stores.srs_queue.add(event))
+    );
+  }
+
+  // Web Locks (nếu có) bảo đảm trang và service worker không gửi cùng một câu trả lời hai lần
+  function withSrsLock(work) {
+    if (self.navigator && self.navigator.locks) {
+      return self.navigator.locks.request(SRS_LOCK_NAME, work);
+    }
+    return work();
+  }
+
+  // Gửi toàn bộ hàng đợi theo thứ tự, mỗi lô tối đa SRS_BATCH_SIZE câu; câu trả lời chỉ bị xóa khỏi
+  // hàng đợi sau khi server đã ghi nhận. Trả về danh sách `results` của server (để cập nhật giao diện).
+  // Lỗi mạng/5xx: dừng lại và ném lỗi, phần còn lại được gửi lần sau. Lỗi 4xx (dữ liệu không hợp lệ):
+  // bỏ lô đó để không chặn cả hàng đợi.
+  function flushSrsQueue() {
+    return withSrsLock(async () => {
+      const results = [];
+      for (;;) {
+        const batch = await transaction(["srs_queue"], "readonly", (stores) =>
+          requestResult(stores.srs_queue.getAll(null, SRS_BATCH_SIZE))
+        );
+        if (batch.length === 0) return results;
+
+        const response = await fetch("/api/update_srs/batch", {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          credentials: "same-origin",
+          body: JSON.stringify({
+            events: batch.map(({ seq, ...event }) => event),
+          }),
+        });
+        const { status } = response;
+        if (status >= 500 || status === 401 || status === 403)
+          throw new Error(`Failed to update SRS status: ${status}`);
+        if (response.ok) results.push(...(await response.json()).results);
+        else console.warn("Dropping rejected SRS events:", status);
+        await deleteMany("srs_queue", batch.map((event) => event.seq));
+      }
+    });
+  }
+
+  // Lấy hết hàng đợi ra khỏi IndexedDB (dùng với sendBeacon khi trang bị đóng: không chờ được response)
+  function takeSrsEvents() {
+    return withSrsLock(() =>
+      transaction(["srs_queue"], "readwrite", async (stores) => {
+        const events = await requestResult(stores.srs_queue.getAll());
+        stores.srs_queue.clear();
+        return events.map(({ seq, ...event }) => event);
+      })
+    );
+  }
+
+  // --- Chuyển dữ liệu cũ từ localStorage ---
+
+  async function migrateLocalStorage(db) {
+    const legacy = self.localStorage;
+    if (!legacy || !LEGACY_KEYS.some((key) => key in legacy)) return db;
+    const parse = (key, fallback) => {
+      try {
+        return JSON.parse(self.localStorage.getItem(key)) || fallback;
+      } catch (error) {
+        return fallback;
+      }
+    };
+    const catalog = parse("catalogCache", null);
+    const userWords = parse("userWordsData", {});
+    const pendingEvents = parse("pendingSrsEvents", []);
+
+    await new Promise((resolve, reject) => {
+      const tx = db.transaction(
+        ["meta", "words", "user_data", "user_words", "srs_queue"],
+        "readwrite"
+      );
+      if (catalog && catalog.version && catalog.loaded_topics) {
+        const { words = [], user_data = [], ...meta } = catalog;
+        tx.objectStore("meta").put(meta, "catalog");
+        words.forEach((word) => tx.objectStore("words").put(word));
+        user_data.forEach((item) => tx.objectStore("user_data").put(item));
+      }
+      Object.entries(userWords).forEach(([wordId, data]) =>
+        tx.objectStore("user_words").put({ ...data, word_id: Number(wordId) })
+      );
+      pendingEvents.forEach((event) => tx.objectStore("srs_queue").add(event));
+      tx.oncomplete = resolve;
+      tx.onerror = () => reject(tx.error);
+    });
+    LEGACY_KEYS.forEach((key) => self.localStorage.removeItem(key));
+    return db;
+  }
+
+  return {
+    open,
+    getAll,
+    putMany,
+    deleteMany,
+    readCatalog,
+    replaceCatalog,
+    saveWords,
+    enqueueSrsEvent,
+    flushSrsQueue,
+    takeSrsEvents,
+  };
+})();
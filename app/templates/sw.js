@@ -0,0 +1,107 @@
+// Service worker của ứng dụng (được render bởi route /sw.js, xem app/main/routes.py).
+//  - Giao diện (trang chủ + các asset) được cache sẵn khi cài đặt để mở được khi offline.
+//  - Asset có hash (/assets/..., có thể qua CDN) không bao giờ đổi nội dung: lấy từ cache trước.
+//  - Trang chủ và các API catalog: hỏi mạng trước, mất mạng thì trả bản đã cache.
+//  - Thư viện từ CDN: trả bản đã cache ngay và cập nhật lại ở nền.
+//  - Background Sync "srs-sync": gửi các câu trả lời quiz còn trong hàng đợi IndexedDB (store.js).
+importScripts({{ store_url|tojson }});
+
+const CACHE_VERSION = {{ version|tojson }};
+const SHELL_CACHE = `shell-${CACHE_VERSION}`;
+const RUNTIME_CACHE = "runtime";
+const SHELL_URLS = {{ shell_urls|tojson }};
+const INDEX_URL = SHELL_URLS[0];
+const SRS_SYNC_TAG = "srs-sync";
+// Các endpoint catalog dùng chung (không phụ thuộc người học) được phép trả từ cache khi offline
+const CATALOG_API = /^\/api\/(collections(\/\d+\/topics)?|topics\/\d+\/words|words)$/;
+
+self.addEventListener("install", (event) => {
+  event.waitUntil(
+    caches
+      .open(SHELL_CACHE)
+      .then((cache) => cache.addAll(SHELL_URLS))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener("activate", (event) => {
+  // Bỏ giao diện của các phiên bản trước (asset cũ đã đổi tên theo hash)
+  event.waitUntil(
+    caches
+      .keys()
+      .then((names) =>
+        Promise.all(
+          names
+            .filter((name) => name.startsWith("shell-") && name !== SHELL_CACHE)
+            .map((name) => caches.delete(name))
+        )
+      )
+      .then(() => self.clients.claim())
+  );
+});
+
+self.addEventListener("fetch", (event) => {
+  const request = event.request;
+  if (request.method !== "GET") return;
+  const url = new URL(request.url);
+
+  if (request.mode === "navigate" && url.pathname === INDEX_URL) {
+    event.respondWith(networkFirst(request, SHELL_CACHE, INDEX_URL));
+  } else if (SHELL_URLS.includes(url.href) || url.pathname.startsWith("/assets/")) {
+    event.respondWith(cacheFirst(request));
+  } else if (SHELL_URLS.includes(url.pathname)) {
+    // Chưa build asset (môi trường dev): file /static không có hash nên phải hỏi mạng trước
+    event.respondWith(networkFirst(request, SHELL_CACHE));
+  } else if (url.origin !== self.location.origin) {
+    if (["script", "style", "font"].includes(request.destination))
+      event.respondWith(staleWhileRevalidate(request));
+  } else if (CATALOG_API.test(url.pathname)) {
+    event.respondWith(networkFirst(request, RUNTIME_CACHE));
+  }
+});
+
+self.addEventListener("sync", (event) => {
+  if (event.tag === SRS_SYNC_TAG) event.waitUntil(offlineStore.flushSrsQueue());
+});
+
+async function cacheFirst(request) {
+  const cached = await caches.match(request);
+  if (cached) return cached;
+  const response = await fetch(request);
+  if (response.ok) {
+    const cache = await caches.open(RUNTIME_CACHE);
+    cache.put(request, response.clone());
+  }
+  return response;
+}
+
+async function networkFirst(request, cacheName, fallbackUrl) {
+  try {
+    const response = await fetch(request);
+    if (response.ok) {
+      const cache = await caches.open(cacheName);
+      cache.put(fallbackUrl || request, response.clone());
+    }
+    return response;
+  } catch (error) {
+    const cached = await caches.match(fallbackUrl || request);
+    if (cached) return cached;
+    throw error;
+  }
+}
+
+async function staleWhileRevalidate(request) {
+  const cache = await caches.open(RUNTIME_CACHE);
+  const cached = await cache.match(request);
+  const network = fetch(request)
+    .then((response) => {
+      // Response "opaque" (CDN không gửi CORS) vẫn dùng được cho <script>/<link>
+      if (response.ok || response.type === "opaque")
+        cache.put(request, response.clone());
+      return response;
+    })
+    .catch((error) => {
+      if (!cached) throw error;
+    });
+  return cached || network;
+}
@@ -0,0 +1,445 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import click
+import psycopg2
+import psycopg2.extras
+from deep_translator import GoogleTranslator
+from flask import current_app
+from app import catalog
+from app.db import db_cursor
+
+# Cache bản dịch hai tầng cho /api/translate:
+#  1. LRU trong tiến trình, có TTL (không cần truy vấn database), được xóa khi phiên bản catalog đổi
+#  2. Bảng translation_cache trong Postgres, dùng chung cho mọi worker và được nạp sẵn nghĩa từ bảng words
+#     (trigger của migration 0013 giữ các dòng này đúng khi từ bị sửa hoặc xóa)
+TRANSLATION_CACHE_SIZE = int(os.environ.get('TRANSLATION_CACHE_SIZE', 2048))
+TRANSLATION_CACHE_TTL = float(os.environ.get('TRANSLATION_CACHE_TTL', 3600)) # Giây, cho tầng trong tiến trình
+TRANSLATION_DB_TTL_DAYS = int(os.environ.get('TRANSLATION_DB_TTL_DAYS', 30)) # Bản dịch từ dịch vụ ngoài được dịch lại sau chừng này ngày
+TRANSLATION_HIT_FLUSH_INTERVAL = float(os.environ.get('TRANSLATION_HIT_FLUSH_INTERVAL', 60)) # Số giây giữa hai lần ghi bộ đếm hits vào database
+TRANSLATOR = os.environ.get('TRANSLATOR', 'google') # 'stub' để chạy local/test mà không gọi ra ngoài
+
+# Giới hạn các lời gọi tới dịch vụ dịch để dịch vụ chậm không giữ hết worker của web
+TRANSLATION_WORKERS = int(os.environ.get('TRANSLATION_WORKERS', 4)) # Số lời gọi chạy song song mỗi tiến trình
+TRANSLATION_MAX_PENDING = int(os.environ.get('TRANSLATION_MAX_PENDING', 32)) # Số lời gọi tối đa đang chạy + đang chờ
+TRANSLATION_TIMEOUT = float(os.environ.get('TRANSLATION_TIMEOUT', 5)) # Số giây chờ kết quả của một request
+TRANSLATION_BREAKER_THRESHOLD = int(os.environ.get('TRANSLATION_BREAKER_THRESHOLD', 5)) # Số lỗi liên tiếp trước khi ngắt
+TRANSLATION_BREAKER_COOLDOWN = float(os.environ.get('TRANSLATION_BREAKER_COOLDOWN', 30)) # Số giây ngắt trước khi thử lại
+
+MAX_CACHED_TEXT_LENGTH = 1000 # Đoạn văn dài hiếm khi lặp lại: không lưu vào cache
+
+ORIGIN_VOCABULARY = 'vocabulary' # Nghĩa lấy từ cột words.meaning
+ORIGIN_TRANSLATOR = 'translator' # Kết quả từ dịch vụ dịch
+
+
+class TranslationUnavailable(Exception):
+    """Dịch vụ dịch đang quá tải, quá chậm hoặc đang bị ngắt (circuit breaker mở)."""
+
+
+class _CircuitBreaker:
+    """
+    Sau `threshold` lỗi liên tiếp thì ngừng gọi dịch vụ dịch trong `cooldown` giây,
+    sau đó cho một lời gọi thử (half-open): thành công thì đóng lại, lỗi thì ngắt tiếp.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_running or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None
+
+
+class _LRUCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict() # key -> (value, thời điểm hết hạn)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[1] < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + self.ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_memory_cache = _LRUCache(TRANSLATION_CACHE_SIZE, TRANSLATION_CACHE_TTL)
+_memory_cache_version = None # Phiên bản catalog lúc _memory_cache được nạp
+_breaker = _CircuitBreaker(TRANSLATION_BREAKER_THRESHOLD, TRANSLATION_BREAKER_COOLDOWN)
+_stats_lock = threading.Lock()
+_stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'shared': 0, 'failures': 0, 'rejected': 0}
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(TRANSLATION_MAX_PENDING)
+_inflight = {} # (source, target, key) -> Future của lời gọi đang chạy
+_inflight_lock = threading.Lock()
+
+# Lượt trúng cache ở tầng database được cộng dồn trong tiến trình và ghi vào translation_cache định kỳ
+# (một câu UPDATE cho cả lô), để việc đọc cache không thành một lần ghi cho mỗi lượt tra
+_hits = {} # (source, target, key) -> số lượt trúng chưa ghi
+_hits_lock = threading.Lock()
+_hit_flusher_pid = None
+_logger = logging.getLogger(__name__)
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_stats():
+    """
+    Bộ đếm của tiến trình hiện tại: số lần trúng cache ở từng tầng, số lần phải gọi dịch vụ dịch (misses),
+    số lần dùng chung lời gọi đang chạy (shared), số lời gọi lỗi (failures) và bị từ chối do quá tải/ngắt (rejected).
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['breaker_open'] = _breaker.is_open
+    return stats
+
+
+def normalize_text(text):
+    """Khóa cache: bỏ khoảng trắng thừa và không phân biệt hoa thường (hàm SQL translation_key(), migration 0013)."""
+    return ' '.join(text.split()).lower()
+
+
+def _translate_upstream(text, source, target):
+    if TRANSLATOR == 'stub':
+        return f'[{target}] {text}'
+    return GoogleTranslator(source=source, target=target).translate(text)
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=TRANSLATION_WORKERS, thread_name_prefix='translate')
+                _executor_pid = pid
+    return _executor
+
+
+def _call_upstream(text, source, target):
+    started = time.monotonic()
+    try:
+        translated_text = _translate_upstream(text, source, target)
+    except Exception:
+        _count('failures')
+        _breaker.record_failure()
+        raise
+    finally:
+        _pending.release()
+    # Lời gọi xong sau khi request đã hết thời gian chờ (đã bị tính là lỗi) thì không đóng circuit breaker lại
+    if time.monotonic() - started <= TRANSLATION_TIMEOUT:
+        _breaker.record_success()
+    return translated_text
+
+
+def _submit_upstream(text, source, target, key):
+    """
+    Gửi lời gọi dịch vào thread pool, hoặc dùng chung lời gọi đang chạy cho cùng văn bản (single-flight).
+    Trả về Future; báo TranslationUnavailable nếu circuit breaker đang mở hoặc hàng đợi đã đầy.
+    """
+    inflight_key = (source, target, key)
+    with _inflight_lock:
+        future = _inflight.get(inflight_key)
+        if future is not None:
+            _count('shared')
+            return future
+        if not _breaker.allow():
+            _count('rejected')
+            raise TranslationUnavailable('Dịch vụ dịch tạm thời bị ngắt do lỗi liên tiếp.')
+        if not _pending.acquire(blocking=False):
+            _count('rejected')
+            raise TranslationUnavailable('Dịch vụ dịch đang quá tải.')
+        _count('misses')
+        try:
+            future = _get_executor().submit(_call_upstream, text, source, target)
+        except BaseException:
+            _pending.release()
+            raise
+        _inflight[inflight_key] = future
+
+    def done(finished):
+        with _inflight_lock:
+            if _inflight.get(inflight_key) is finished:
+                del _inflight[inflight_key]
+    future.add_done_callback(done)
+    return future
+
+
+def _cache_key(text):
+    # Đoạn văn quá dài không được lưu cache, nhưng vẫn được gộp khi nhiều request cùng dịch
+    return normalize_text(text) if len(text) <= MAX_CACHED_TEXT_LENGTH else text
+
+
+def _check_memory_cache_version():
+    """
+    Xóa tầng cache trong tiến trình khi phiên bản catalog đổi: từ vựng được sửa/xóa ở worker khác (nghĩa
+    trong translation_cache đã đổi cùng transaction) không còn được trả về từ bộ nhớ của worker này.
+    """
+    global _memory_cache_version
+    try:
+        version = catalog.get_catalog_version() # Chỉ truy vấn database mỗi CATALOG_VERSION_TTL giây
+    except psycopg2.Error as e:
+        current_app.logger.warning(f"Translation cache version check error: {e}")
+        return
+    if version != _memory_cache_version:
+        _memory_cache.clear()
+        _memory_cache_version = version
+
+
+def _read_db(keys, source, target):
+    """Đọc nhiều bản dịch trong một truy vấn (chỉ đọc, chạy được trên replica). Trả về dict khóa -> bản dịch."""
+    with db_cursor(readonly=True) as cursor:
+        cursor.execute('''
+            SELECT text_key, translated_text FROM translation_cache
+            WHERE source_lang = %s AND target_lang = %s AND text_key = ANY(%s)
+              AND (origin = %s OR created_at > NOW() - make_interval(days => %s))
+        ''', (source, target, list(keys), ORIGIN_VOCABULARY, TRANSLATION_DB_TTL_DAYS))
+        found = dict(cursor.fetchall())
+    _record_hits(found, source, target)
+    return found
+
+
+def _record_hits(keys, source, target):
+    if not keys:
+        return
+    with _hits_lock:
+        for key in keys:
+            _hits[(source, target, key)] = _hits.get((source, target, key), 0) + 1
+    _ensure_hit_flusher()
+
+
+def _ensure_hit_flusher():
+    global _hit_flusher_pid
+    pid = os.getpid()
+    if _hit_flusher_pid == pid:
+        return
+    with _hits_lock:
+        if _hit_flusher_pid != pid:
+            threading.Thread(target=_run_hit_flusher, name='translation-hits', daemon=True).start()
+            _hit_flusher_pid = pid
+
+
+def _run_hit_flusher():
+    while True:
+        time.sleep(TRANSLATION_HIT_FLUSH_INTERVAL)
+        try:
+            flush_hits()
+        except Exception as e:
+            _logger.warning(f"Không ghi được bộ đếm hits của cache bản dịch: {e}")
+
+
+def flush_hits():
+    """Ghi các lượt trúng cache đang cộng dồn vào translation_cache (hits, last_hit_at). Trả về số dòng đã cập nhật."""
+    with _hits_lock:
+        pending = dict(_hits)
+        _hits.clear()
+    if not pending:
+        return 0
+    try:
+        with db_cursor() as cursor:
+            psycopg2.extras.execute_values(cursor, '''
+                UPDATE translation_cache c SET hits = c.hits + v.n, last_hit_at = NOW()
+                FROM (VALUES %s) AS v(source_lang, target_lang, text_key, n)
+                WHERE c.source_lang = v.source_lang AND c.target_lang = v.target_lang AND c.text_key = v.text_key
+            ''', [(source, target, key, n) for (source, target, key), n in sorted(pending.items())],
+                template='(%s, %s, %s, %s::bigint)')
+            return cursor.rowcount
+    except Exception:
+        # Giữ lại để lần sau ghi tiếp
+        with _hits_lock:
+            for hit_key, n in pending.items():
+                _hits[hit_key] = _hits.get(hit_key, 0) + n
+        raise
+
+
+def _write_db(translations, source, target):
+    """Lưu các bản dịch mới (dict khóa -> bản dịch) trong một câu lệnh."""
+    with db_cursor() as cursor:
+        # Không ghi đè nghĩa lấy từ bảng words
+        psycopg2.extras.execute_values(cursor, '''
+            INSERT INTO translation_cache (source_lang, target_lang, text_key, translated_text, origin)
+            VALUES %s
+            ON CONFLICT (source_lang, target_lang, text_key) DO UPDATE
+            SET translated_text = EXCLUDED.translated_text, created_at = NOW()
+            WHERE translation_cache.origin <> 'vocabulary'
+        ''', [(source, target, key, translated_text, ORIGIN_TRANSLATOR) for key, translated_text in translations.items()])
+
+
+def translate_many(texts, source='en', target='vi', timeout=TRANSLATION_TIMEOUT):
+    """
+    Dịch nhiều đoạn văn bản: văn bản trùng nhau chỉ dịch một lần, lần lượt thử cache trong tiến trình,
+    bảng translation_cache (một truy vấn cho cả lô) rồi mới gọi dịch vụ dịch song song qua thread pool.
+    Trả về list cùng thứ tự với `texts`, mỗi phần tử là bản dịch (str) hoặc Exception nếu dịch lỗi/quá `timeout` giây.
+    Lỗi database chỉ được ghi log.
+    """
+    deadline = time.monotonic() + timeout
+    _check_memory_cache_version()
+    keys = [_cache_key(text) for text in texts]
+    results = {}
+    original_text = {}
+    for text, key in zip(texts, keys):
+        original_text.setdefault(key, text)
+        if key not in results:
+            cached = _memory_cache.get((source, target, key))
+            if cached is not None:
+                _count('memory_hits')
+                results[key] = cached
+
+    missing = [key for key in original_text if key not in results and len(key) <= MAX_CACHED_TEXT_LENGTH]
+    if missing:
+        try:
+            found = _read_db(missing, source, target)
+        except psycopg2.Error as e:
+            current_app.logger.warning(f"Translation cache read error: {e}")
+            found = {}
+        for key, translated_text in found.items():
+            _count('db_hits')
+            _memory_cache.set((source, target, key), translated_text)
+            results[key] = translated_text
+
+    futures = {}
+    for key, text in original_text.items():
+        if key in results:
+            continue
+        try:
+            futures[key] = _submit_upstream(text, source, target, key)
+        except TranslationUnavailable as e:
+            results[key] = e
+
+    fresh = {}
+    for key, future in futures.items():
+        try:
+            translated_text = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeoutError:
+            # Lời gọi vẫn chạy tiếp trong thread pool (và vẫn giữ chỗ trong TRANSLATION_MAX_PENDING)
+            _count('failures')
+            _breaker.record_failure()
+            results[key] = TranslationUnavailable('Dịch vụ dịch phản hồi quá chậm.')
+            continue
+        except Exception as e:
+            results[key] = e
+            continue
+        results[key] = translated_text
+        if translated_text and len(key) <= MAX_CACHED_TEXT_LENGTH:
+            _memory_cache.set((source, target, key), translated_text)
+            fresh[key] = translated_text
+
+    if fresh:
+        try:
+            _write_db(fresh, source, target)
+        except psycopg2.Error as e:
+            current_app.logger.warning(f"Translation cache write error: {e}")
+    return [results[key] for key in keys]
+
+
+def translate(text, source='en', target='vi'):
+    """Dịch một đoạn văn bản (xem translate_many). Báo lỗi của dịch vụ dịch hoặc TranslationUnavailable."""
+    result = translate_many([text], source, target)[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def seed_from_vocabulary(cursor, collection_id=None, word_ids=None):
+    """
+    Nạp nghĩa trong bảng words vào translation_cache (en -> vi) để từ vựng có sẵn không phải gọi dịch vụ dịch.
+    Giới hạn theo collection_id hoặc word_ids nếu có (ví dụ sau khi import hay thêm từ); nạp toàn bộ thì đồng thời
+    xóa các dòng không còn từ nào dùng. Từ bị sửa/xóa được trigger của migration 0013 cập nhật, không cần gọi hàm này.
+    Trả về số dòng đã ghi. Tầng cache trong tiến trình của các worker khác được xóa khi phiên bản catalog đổi.
+    """
+    conditions = ["w.meaning <> ''"]
+    params = {'origin': ORIGIN_VOCABULARY}
+    if collection_id is not None:
+        conditions.append('w.topic_id IN (SELECT id FROM topics WHERE collection_id = %(collection_id)s)')
+        params['collection_id'] = collection_id
+    if word_ids is not None:
+        conditions.append('w.id = ANY(%(word_ids)s)')
+        params['word_ids'] = list(word_ids)
+    # Cùng một từ xuất hiện ở nhiều chủ đề: lấy nghĩa của bản ghi mới nhất
+    cursor.execute(f'''
+        INSERT INTO translation_cache (source_lang, target_lang, text_key, translated_text, origin)
+        SELECT DISTINCT ON (key) 'en', 'vi', key, meaning, %(origin)s
+        FROM (
+            SELECT translation_key(w.word) AS key, w.meaning, w.id
+            FROM words w WHERE {' AND '.join(conditions)}
+        ) v
+        WHERE key <> ''
+        ORDER BY key, id DESC
+        ON CONFLICT (source_lang, target_lang, text_key) DO UPDATE
+        SET translated_text = EXCLUDED.translated_text, origin = EXCLUDED.origin, created_at = NOW()
+        WHERE translation_cache.translated_text IS DISTINCT FROM EXCLUDED.translated_text
+           OR translation_cache.origin <> EXCLUDED.origin
+    ''', params)
+    count = cursor.rowcount
+    if collection_id is None and word_ids is None:
+        cursor.execute('''
+            DELETE FROM translation_cache c
+            WHERE c.source_lang = 'en' AND c.target_lang = 'vi' AND c.origin = %s
+              AND NOT EXISTS (SELECT 1 FROM words w WHERE translation_key(w.word) = c.text_key AND w.meaning <> '')
+        ''', (ORIGIN_VOCABULARY,))
+    _memory_cache.clear()
+    return count
+
+
+def init_app(app):
+    @app.cli.command('seed-translations')
+    def seed_translations_command():
+        """Nạp lại toàn bộ nghĩa trong bảng words vào translation_cache."""
+        with db_cursor() as cursor:
+            count = seed_from_vocabulary(cursor)
+        click.echo(f'Đã nạp {count} bản dịch từ bảng words.')
@@ -0,0 +1,43 @@
+import os
+import uuid
+from datetime import timedelta
+
+from flask import session
+from app.db import db_cursor
+
+# Mỗi người học được nhận diện bằng một id ngẫu nhiên (UUID) lưu trong session cookie đã ký bằng SECRET_KEY.
+# Tiến độ SRS (user_word_data) được lưu theo id này.
+USER_SESSION_DAYS = int(os.environ.get('USER_SESSION_DAYS', 365)) # Cookie được gia hạn ở mỗi request
+
+# Bật (=1) trên bản cài đặt chỉ có một người học: người học mới đầu tiên nhận lại tiến độ dùng chung
+# từ trước khi có nhiều người học (được migration 0008 lưu dưới LEGACY_USER_ID).
+CLAIM_LEGACY_PROGRESS = os.environ.get('CLAIM_LEGACY_PROGRESS') == '1'
+LEGACY_USER_ID = '00000000-0000-0000-0000-000000000000'
+
+
+def init_app(app):
+    # Gán thẳng: Flask luôn có sẵn PERMANENT_SESSION_LIFETIME (31 ngày) nên setdefault() không có tác dụng
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=USER_SESSION_DAYS)
+
+
+def get_current_user_id():
+    """Id người học của request hiện tại; tạo id mới (và cookie) cho người học lần đầu truy cập."""
+    user_id = session.get('user_id')
+    if user_id is not None:
+        try:
+            return str(uuid.UUID(user_id))
+        except (TypeError, ValueError):
+            pass
+
+    user_id = str(uuid.uuid4())
+    session['user_id'] = user_id
+    session.permanent = True
+    if CLAIM_LEGACY_PROGRESS:
+        _claim_legacy_progress(user_id)
+    return user_id
+
+
+def _claim_legacy_progress(user_id):
+    # Câu UPDATE khóa các dòng nên khi nhiều người học mới cùng lúc, chỉ một người nhận được tiến độ cũ
+    with db_cursor() as cursor:
+        cursor.execute('UPDATE user_word_data SET user_id = %s WHERE user_id = %s', (user_id, LEGACY_USER_ID))
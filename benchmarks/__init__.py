@@ -0,0 +1,17 @@
+"""
+Bộ benchmark của ứng dụng: đo độ trễ (p50/p90/p95/p99) và thông lượng của các thao tác chính
+ở nhiều quy mô dữ liệu để tìm ra điểm bắt đầu chậm đi trước khi import nội dung lớn.
+
+Chạy trên một database RIÊNG (benchmark thêm/xóa dữ liệu): đặt DATABASE_URL rồi
+
+    python -m benchmarks run --scales 1000,10000,100000 --output results.json
+    python -m benchmarks run --scales 100000 --http --concurrency 1,8,32 --output results.json
+    python -m benchmarks compare baseline.json results.json --threshold 0.2
+    python -m benchmarks cleanup
+
+Dữ liệu giả được tạo thành các bộ sưu tập tên bắt đầu bằng "[bench]" (xem seed.py), mỗi quy mô một bộ,
+giữ lại giữa các lần chạy để không phải seed lại. Có hai chế độ đo:
+ - client: gọi trực tiếp qua Flask test client (scenarios.py), đo chi phí của từng request;
+ - http: nhiều kết nối đồng thời tới gunicorn (load.py), đo thông lượng và độ trễ khi có tải.
+Kết quả được ghi ra file JSON (stats.py) để so sánh giữa các lần chạy.
+"""
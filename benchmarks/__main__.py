@@ -0,0 +1,160 @@
+import argparse
+import os
+import sys
+import tempfile
+
+import psycopg2
+from app import create_app
+from app.db import db_cursor, get_database_url
+from app.migrations import migrate
+from benchmarks import load, scenarios, seed, stats
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def _name_list(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def _session_cookie(app, user_id):
+    """Cookie session hợp lệ của người học giả (cùng SECRET_KEY với server được đo)."""
+    value = app.session_interface.get_signing_serializer(app).dumps({'user_id': user_id, '_permanent': True})
+    return f"{app.config['SESSION_COOKIE_NAME']}={value}"
+
+
+def _context(scale, collection_id, learners, import_file):
+    with db_cursor() as cursor:
+        # Chủ đề có nhiều từ nhất (trang admin / sắp xếp nặng nhất) và một mẫu id từ để ghi tiến độ
+        cursor.execute('''
+            SELECT t.id FROM topics t JOIN words w ON w.topic_id = t.id WHERE t.collection_id = %s
+            GROUP BY t.id ORDER BY COUNT(*) DESC, t.id LIMIT 1
+        ''', (collection_id,))
+        topic_id = cursor.fetchone()[0]
+        cursor.execute('''
+            SELECT w.id FROM words w JOIN topics t ON w.topic_id = t.id WHERE t.collection_id = %s
+            ORDER BY random() LIMIT 10000
+        ''', (collection_id,))
+        word_ids = [row[0] for row in cursor.fetchall()]
+    return {'scale': scale, 'collection_id': collection_id, 'topic_id': topic_id, 'word_ids': word_ids,
+            'learners': learners, 'import_file': import_file}
+
+
+def run(args):
+    app = create_app()
+    conn = psycopg2.connect(get_database_url())
+    try:
+        migrate(conn)
+        meta = {'environment': stats.environment(conn), 'args': {key: value for key, value in vars(args).items()
+                                                                  if key != 'func'}}
+    finally:
+        conn.close()
+
+    results = []
+    for scale in args.scales:
+        print(f'== {scale} từ: chuẩn bị dữ liệu...', file=sys.stderr)
+        collection_id = seed.ensure_collection(scale, args.words_per_topic)
+        visible_words = seed.activate(collection_id)
+        learners = seed.ensure_learners(collection_id, args.learners, args.progress)
+
+        fd, import_file = tempfile.mkstemp(suffix='.json', prefix='bench-import-')
+        os.close(fd)
+        try:
+            import_words = args.import_words or max(1, scale // 10)
+            seed.write_synthetic_file(import_file, import_words, args.words_per_topic)
+            ctx = _context(scale, collection_id, learners, import_file)
+
+            print(f'== {scale} từ: test client...', file=sys.stderr)
+            scale_results = scenarios.run(app, ctx, args.scenarios, args.iterations, args.warmup)
+            if args.http:
+                print(f'== {scale} từ: tải HTTP...', file=sys.stderr)
+                cookies = [_session_cookie(app, user_id) for user_id in learners]
+                if args.url:
+                    scale_results += load.run(args.url, ctx, args.load_scenarios, args.concurrency, args.duration, cookies)
+                else:
+                    extra_env = {'WORKER_MODE': args.worker_mode} if args.worker_mode else None
+                    with load.spawn_gunicorn(args.port, args.workers, args.threads, extra_env) as base_url:
+                        scale_results += load.run(base_url, ctx, args.load_scenarios, args.concurrency, args.duration,
+                                                  cookies)
+        finally:
+            os.remove(import_file)
+
+        for result in scale_results:
+            results.append(dict(scale=scale, visible_words=visible_words, **result))
+        print(stats.format_table([dict(scale=scale, **result) for result in scale_results]), file=sys.stderr)
+
+    if args.output:
+        stats.write_results(args.output, meta, results)
+        print(f'Đã ghi kết quả vào {args.output}', file=sys.stderr)
+    return 0
+
+
+def compare(args):
+    rows = stats.compare(stats.load_results(args.baseline), stats.load_results(args.current))
+    regressions = 0
+    for (scale, mode, scenario, concurrency), field, before, after, change in rows:
+        flag = ''
+        if change > args.threshold:
+            flag = '  <-- chậm hơn'
+            regressions += 1
+        print(f'{scale:>9} {mode:<6} {scenario:<22} {concurrency:>4} {field:<7} '
+              f'{before:>10.2f} -> {after:>10.2f} ms ({change:+.0%}){flag}')
+    print(f'{regressions} chỉ số chậm hơn quá {args.threshold:.0%}.')
+    return 1 if regressions else 0
+
+
+def cleanup(args):
+    create_app()
+    print(f'Đã xóa {seed.cleanup()} bộ sưu tập benchmark.')
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmark độ trễ/thông lượng của ứng dụng.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Seed dữ liệu (nếu chưa có) và chạy benchmark')
+    run_parser.add_argument('--scales', type=_int_list, default=[1000, 10000, 100000],
+                            help='Các quy mô (số từ), ví dụ 1000,10000,100000,1000000')
+    run_parser.add_argument('--words-per-topic', type=int, default=seed.WORDS_PER_TOPIC)
+    run_parser.add_argument('--learners', type=int, default=8, help='Số người học giả có tiến độ')
+    run_parser.add_argument('--progress', type=float, default=0.2, help='Tỉ lệ số từ có tiến độ của mỗi người học')
+    run_parser.add_argument('--import-words', type=int, default=0, help='Số từ của file import (mặc định 10%% quy mô)')
+    run_parser.add_argument('--scenarios', type=_name_list, default=scenarios.SCENARIO_NAMES,
+                            help=f"Kịch bản test client ({','.join(scenarios.SCENARIO_NAMES)})")
+    run_parser.add_argument('--iterations', type=int, default=50)
+    run_parser.add_argument('--warmup', type=int, default=3)
+    run_parser.add_argument('--http', action='store_true', help='Đo thêm khi có tải qua HTTP (gunicorn)')
+    run_parser.add_argument('--url', help='Đo server có sẵn thay vì tự khởi động gunicorn')
+    run_parser.add_argument('--load-scenarios', type=_name_list, default=list(load.LOAD_SCENARIOS),
+                            help=f"Kịch bản HTTP ({','.join(load.LOAD_SCENARIOS)})")
+    run_parser.add_argument('--concurrency', type=_int_list, default=[1, 8, 32])
+    run_parser.add_argument('--duration', type=float, default=10, help='Số giây đo cho mỗi mức đồng thời')
+    run_parser.add_argument('--workers', type=int, default=2, help='Số gunicorn worker')
+    run_parser.add_argument('--threads', type=int, default=1, help='Số thread mỗi gunicorn worker')
+    run_parser.add_argument('--worker-mode', choices=('sync', 'gthread', 'gevent'),
+                            help='Mô hình worker của gunicorn (mặc định theo WORKER_MODE, xem gunicorn.conf.py)')
+    run_parser.add_argument('--port', type=int, default=8765)
+    run_parser.add_argument('--output', help='File JSON ghi kết quả')
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser('compare', help='So sánh hai file kết quả, mã thoát 1 nếu có regression')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.2, help='Tỉ lệ chậm hơn được chấp nhận')
+    compare_parser.set_defaults(func=compare)
+
+    cleanup_parser = commands.add_parser('cleanup', help='Xóa dữ liệu benchmark')
+    cleanup_parser.set_defaults(func=cleanup)
+
+    args = parser.parse_args(argv)
+    unknown = set(getattr(args, 'scenarios', ())) - set(scenarios.SCENARIO_NAMES) \
+        | set(getattr(args, 'load_scenarios', ())) - set(load.LOAD_SCENARIOS)
+    if unknown:
+        parser.error(f"Kịch bản không tồn tại: {', '.join(sorted(unknown))}")
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
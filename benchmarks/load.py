@@ -0,0 +1,137 @@
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from benchmarks import stats
+
+# Đo khi có tải: `concurrency` thread, mỗi thread một kết nối keep-alive, gửi request liên tục trong `duration` giây
+# tới gunicorn (tự khởi động bằng spawn_gunicorn hoặc một server có sẵn qua --url).
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_TIMEOUT_SECONDS = 30
+
+
+def _get_data(ctx):
+    return 'GET', '/api/data', None
+
+
+def _update_srs(ctx):
+    return 'POST', '/api/update_srs', {'word_id': random.choice(ctx['word_ids']), 'is_correct': random.random() < 0.7}
+
+
+def _quiz(ctx):
+    return 'GET', f"/api/quiz?collection={ctx['collection_id']}", None
+
+
+def _manage_words(ctx):
+    return 'GET', f"/admin/topic/{ctx['topic_id']}/words", None
+
+
+LOAD_SCENARIOS = {
+    'api_data': _get_data,
+    'update_srs': _update_srs,
+    'quiz': _quiz,
+    'manage_words': _manage_words,
+}
+
+
+@contextmanager
+def spawn_gunicorn(port, workers, threads=1, extra_env=None):
+    """Chạy `gunicorn run:app` (với gunicorn.conf.py) trên 127.0.0.1:`port` trong lúc dùng context, trả về URL gốc."""
+    env = dict(os.environ, **(extra_env or {}))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--threads', str(threads), '--log-level', 'warning', 'run:app'],
+        cwd=REPO_ROOT, env=env
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        _wait_until_ready(base_url, process)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def _wait_until_ready(base_url, process):
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn đã dừng với mã {process.returncode}')
+        try:
+            connection = _connect(base_url)
+            connection.request('GET', '/api/collections')
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn không phản hồi sau khi khởi động')
+
+
+def _connect(base_url):
+    parts = urlsplit(base_url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    return connection_class(parts.hostname, parts.port, timeout=60)
+
+
+def _worker(base_url, build_request, ctx, cookie, deadline, samples, db_samples, errors):
+    connection = _connect(base_url)
+    headers = {'Accept-Encoding': 'gzip', 'Cookie': cookie}
+    while time.monotonic() < deadline:
+        method, path, body = build_request(ctx)
+        request_headers = dict(headers, **({'Content-Type': 'application/json'} if body is not None else {}))
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=json.dumps(body) if body is not None else None,
+                               headers=request_headers)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors.append(1)
+            connection.close()
+            connection = _connect(base_url)
+            continue
+        elapsed = time.perf_counter() - start
+        if response.status >= 400:
+            errors.append(1)
+            continue
+        samples.append(elapsed)
+        timing = stats.parse_server_timing(response.getheader('Server-Timing'))
+        if timing is not None:
+            db_samples.append(timing)
+    connection.close()
+
+
+def run(base_url, ctx, names, concurrency_levels, duration, cookies):
+    """
+    Đo các kịch bản `names` ở từng mức đồng thời. `cookies` là danh sách cookie session
+    (mỗi thread dùng một người học giả khác nhau, lặp lại nếu thiếu).
+    """
+    results = []
+    for name in names:
+        build_request = LOAD_SCENARIOS[name]
+        for concurrency in concurrency_levels:
+            samples, db_samples, errors = [], [], [] # list.append an toàn giữa các thread
+            deadline = time.monotonic() + duration
+            started = time.perf_counter()
+            threads = [threading.Thread(target=_worker, args=(base_url, build_request, ctx, cookies[index % len(cookies)],
+                                                               deadline, samples, db_samples, errors))
+                       for index in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall_time = time.perf_counter() - started
+            results.append(dict(scenario=name, mode='http', concurrency=concurrency,
+                                **stats.summarize(samples, len(errors), wall_time, db_samples)))
+    return results
@@ -0,0 +1,158 @@
+import random
+import time
+
+from app import formats, jobs
+from app.admin import tasks
+from app.catalog import bump_catalog_version
+from app.db import db_cursor
+from benchmarks import seed, stats
+
+# Các kịch bản đo qua Flask test client (không có mạng, một request mỗi lần): thời gian đo gồm cả việc đọc hết
+# body, và với thao tác chạy nền (import, sắp xếp) là đến khi job hoàn tất.
+JOB_POLL_SECONDS = 0.005
+JOB_TIMEOUT_SECONDS = 3600
+
+
+class Scenario:
+    """
+    Một thao tác được đo. `request(client, ctx)` gửi request và trả về response;
+    `before_each`/`after_each(ctx)` chạy ngoài thời gian đo; `job_id(response)` (nếu có) trả về id job
+    cần chờ; `max_iterations` giới hạn số lần chạy với các thao tác nặng.
+    """
+
+    def __init__(self, name, request, expected=(200,), before_each=None, after_each=None, job_id=None,
+                 max_iterations=None):
+        self.name = name
+        self.request = request
+        self.expected = expected
+        self.before_each = before_each
+        self.after_each = after_each
+        self.job_id = job_id
+        self.max_iterations = max_iterations
+
+
+def _bump_catalog(ctx):
+    with db_cursor() as cursor:
+        bump_catalog_version(cursor)
+
+
+def _get_data(fmt):
+    def request(client, ctx):
+        return client.get('/api/data', headers={'Accept': fmt, 'Accept-Encoding': 'gzip'})
+    return request
+
+
+def _update_srs(client, ctx):
+    return client.post('/api/update_srs', json={'word_id': random.choice(ctx['word_ids']),
+                                                'is_correct': random.random() < 0.7})
+
+
+def _update_srs_batch(client, ctx):
+    events = [{'word_id': word_id, 'is_correct': random.random() < 0.7}
+              for word_id in random.sample(ctx['word_ids'], min(20, len(ctx['word_ids'])))]
+    return client.post('/api/update_srs/batch', json={'events': events})
+
+
+def _quiz(client, ctx):
+    return client.get(f"/api/quiz?collection={ctx['collection_id']}")
+
+
+def _manage_words(client, ctx):
+    return client.get(f"/admin/topic/{ctx['topic_id']}/words")
+
+
+def _reorder_words(client, ctx):
+    with db_cursor() as cursor:
+        cursor.execute('SELECT id FROM words WHERE topic_id = %s ORDER BY position, id', (ctx['topic_id'],))
+        ordered_ids = [row[0] for row in cursor.fetchall()][::-1]
+    return client.post('/admin/words/reorder', json={'topic_id': ctx['topic_id'], 'ordered_ids': ordered_ids})
+
+
+def _prepare_import(ctx):
+    ctx['import_index'] = ctx.get('import_index', 0) + 1
+    ctx['import_name'] = f"{seed.BENCH_PREFIX} import {ctx['scale']} #{ctx['import_index']}"
+
+
+def _import_data(client, ctx):
+    with open(ctx['import_file'], 'rb') as f:
+        return client.post('/admin/import-data', content_type='multipart/form-data',
+                           data={'collection_name': ctx['import_name'], 'json_file': (f, 'bench.json')})
+
+
+def _latest_import_job(response):
+    return next(job['id'] for job in jobs.recent_jobs(5) if job['kind'] == tasks.IMPORT_COLLECTION)
+
+
+def _drop_import(ctx):
+    with db_cursor() as cursor:
+        cursor.execute('DELETE FROM collections WHERE name = %s', (ctx['import_name'],))
+        bump_catalog_version(cursor)
+
+
+SCENARIOS = [
+    Scenario('api_data', _get_data(formats.JSON)),
+    Scenario('api_data_columnar', _get_data(formats.COLUMNAR)),
+    Scenario('api_data_msgpack', _get_data(formats.MSGPACK)),
+    # Catalog vừa thay đổi: snapshot phải dựng lại ở request đầu tiên
+    Scenario('api_data_cold', _get_data(formats.JSON), before_each=_bump_catalog, max_iterations=20),
+    Scenario('update_srs', _update_srs),
+    Scenario('update_srs_batch', _update_srs_batch),
+    Scenario('quiz', _quiz),
+    Scenario('manage_words', _manage_words),
+    Scenario('reorder_words', _reorder_words, expected=(202,), job_id=lambda response: response.get_json()['job_id']),
+    Scenario('import_data', _import_data, expected=(302,), before_each=_prepare_import, after_each=_drop_import,
+             job_id=_latest_import_job, max_iterations=5),
+]
+SCENARIO_NAMES = [scenario.name for scenario in SCENARIOS]
+
+
+def _wait_for_job(job_id):
+    deadline = time.monotonic() + JOB_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        job = jobs.get_job(job_id)
+        if job['status'] in (jobs.SUCCEEDED, jobs.FAILED):
+            return job['status'] == jobs.SUCCEEDED
+        time.sleep(JOB_POLL_SECONDS)
+    return False
+
+
+def run(app, ctx, names, iterations, warmup):
+    """Chạy lần lượt các kịch bản `names`; trả về danh sách kết quả (xem stats.summarize)."""
+    if formats.MSGPACK not in formats.AVAILABLE_FORMATS:
+        names = [name for name in names if name != 'api_data_msgpack']
+    results = []
+    for scenario in SCENARIOS:
+        if scenario.name not in names:
+            continue
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = ctx['learners'][0] # Người học giả đã có tiến độ (seed.ensure_learners)
+
+        count = min(iterations, scenario.max_iterations or iterations)
+        samples, db_samples, errors = [], [], 0
+        for index in range(min(warmup, count) + count):
+            if scenario.before_each is not None:
+                scenario.before_each(ctx)
+            start = time.perf_counter()
+            response = scenario.request(client, ctx)
+            response.get_data()
+            ok = response.status_code in scenario.expected
+            if ok and scenario.job_id is not None:
+                ok = _wait_for_job(scenario.job_id(response))
+            elapsed = time.perf_counter() - start
+            timing = stats.parse_server_timing(response.headers.get('Server-Timing'))
+            response.close()
+            if scenario.after_each is not None:
+                scenario.after_each(ctx)
+
+            if index < min(warmup, count):
+                continue
+            if ok:
+                samples.append(elapsed)
+                if timing is not None:
+                    db_samples.append(timing)
+            else:
+                errors += 1
+        results.append(dict(scenario=scenario.name, mode='client', concurrency=1,
+                            **stats.summarize(samples, errors, db_samples=db_samples)))
+    return results
@@ -0,0 +1,135 @@
+import json
+import os
+import random
+import tempfile
+import uuid
+
+import psycopg2.extras
+from app.admin.importer import import_collection
+from app.catalog import bump_catalog_version
+from app.db import db_cursor
+
+# Dữ liệu giả cho benchmark: mỗi quy mô (số từ) là một bộ sưu tập "[bench] <n> words".
+# File JSON được tạo theo đúng định dạng import của trang admin và ghi qua importer (COPY) như khi import thật.
+BENCH_PREFIX = '[bench]'
+WORDS_PER_TOPIC = 50
+LEARNER_NAMESPACE = uuid.UUID('6c1f3a52-9d0e-4b8c-a2f7-3e5b1d9c8a40') # Id người học giả cố định giữa các lần chạy
+MAX_LEARNERS = 1000
+
+_TYPES = ('noun', 'verb', 'adjective', 'adverb', 'phrase')
+_SYLLABLES = ('ba', 'ken', 'lo', 'mi', 'nor', 'pa', 'qui', 'ra', 'sel', 'tu', 'vin', 'wex', 'zo')
+
+
+def collection_name(scale):
+    return f'{BENCH_PREFIX} {scale} words'
+
+
+def learner_id(index):
+    return str(uuid.uuid5(LEARNER_NAMESPACE, f'learner-{index}'))
+
+
+def _fake_word(rng, index):
+    stem = ''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+    return f'{stem}{index}'
+
+
+def write_synthetic_file(path, word_count, words_per_topic=WORDS_PER_TOPIC, seed=0):
+    """Ghi file JSON {"topics": [...], "vocabulary": [...]} gồm `word_count` từ, ghi dần nên không tốn bộ nhớ."""
+    rng = random.Random(seed)
+    topic_count = max(1, -(-word_count // words_per_topic))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"topics": [')
+        for topic in range(topic_count):
+            f.write(',' if topic else '')
+            json.dump({'id': topic + 1, 'name': f'Topic {topic + 1}', 'category': f'Category {topic % 20 + 1}'}, f)
+        f.write('], "vocabulary": [')
+        for index in range(word_count):
+            word = _fake_word(rng, index)
+            f.write(',' if index else '')
+            json.dump({
+                'topic_id': index // words_per_topic + 1,
+                'word': word,
+                'ipa': f'/{word}/',
+                'type': rng.choice(_TYPES),
+                'meaning': f'nghĩa của từ {word}',
+                'example': f'This is an example sentence that uses the word {word} in context.',
+            }, f, ensure_ascii=False)
+        f.write(']}')
+
+
+def import_synthetic(name, word_count, words_per_topic=WORDS_PER_TOPIC, seed=0):
+    """Tạo bộ sưu tập `name` với `word_count` từ giả. Trả về id bộ sưu tập."""
+    fd, path = tempfile.mkstemp(suffix='.json', prefix='bench-')
+    os.close(fd)
+    try:
+        write_synthetic_file(path, word_count, words_per_topic, seed)
+        with open(path, 'rb') as stream, db_cursor(psycopg2.extras.RealDictCursor) as cursor:
+            import_collection(cursor, name, stream)
+            cursor.execute('SELECT id FROM collections WHERE name = %s', (name,))
+            return cursor.fetchone()['id']
+    finally:
+        os.remove(path)
+
+
+def ensure_collection(scale, words_per_topic=WORDS_PER_TOPIC):
+    """Id bộ sưu tập benchmark của quy mô `scale`, tạo mới nếu chưa có (lần chạy sau dùng lại)."""
+    with db_cursor() as cursor:
+        cursor.execute('SELECT id FROM collections WHERE name = %s', (collection_name(scale),))
+        row = cursor.fetchone()
+    if row is not None:
+        return row[0]
+    return import_synthetic(collection_name(scale), scale, words_per_topic, seed=scale)
+
+
+def activate(collection_id):
+    """Chỉ hiển thị bộ sưu tập benchmark đang đo (các bộ sưu tập không phải benchmark giữ nguyên)."""
+    with db_cursor() as cursor:
+        cursor.execute('''
+            UPDATE collections SET is_visible = CASE WHEN id = %s THEN 1 ELSE 0 END
+            WHERE name LIKE %s AND is_visible <> CASE WHEN id = %s THEN 1 ELSE 0 END
+        ''', (collection_id, BENCH_PREFIX + '%', collection_id))
+        if cursor.rowcount:
+            bump_catalog_version(cursor)
+        cursor.execute('''
+            SELECT COUNT(*) FROM words w JOIN topics t ON w.topic_id = t.id JOIN collections c ON t.collection_id = c.id
+            WHERE c.is_visible = 1
+        ''')
+        return cursor.fetchone()[0]
+
+
+def ensure_learners(collection_id, count, fraction):
+    """
+    Id của `count` người học giả, mỗi người có tiến độ ở khoảng `fraction` số từ của bộ sưu tập
+    (một phần đến hạn ôn). Tiến độ chỉ được tạo một lần cho mỗi bộ sưu tập.
+    """
+    learners = [learner_id(index) for index in range(min(count, MAX_LEARNERS))]
+    with db_cursor() as cursor:
+        for user_id in learners:
+            cursor.execute('''
+                SELECT EXISTS (SELECT 1 FROM user_word_data u JOIN words w ON u.word_id = w.id
+                               JOIN topics t ON w.topic_id = t.id WHERE u.user_id = %s AND t.collection_id = %s)
+            ''', (user_id, collection_id))
+            if cursor.fetchone()[0]:
+                continue
+            cursor.execute('''
+                INSERT INTO user_word_data (user_id, word_id, srs_level, next_review_at)
+                SELECT %s, w.id, floor(random() * 6)::int, NOW() + (random() * 14 - 4) * INTERVAL '1 day'
+                FROM words w JOIN topics t ON w.topic_id = t.id
+                WHERE t.collection_id = %s AND random() < %s
+                ON CONFLICT (user_id, word_id) DO NOTHING
+            ''', (user_id, collection_id, fraction))
+    return learners
+
+
+def cleanup():
+    """Xóa mọi bộ sưu tập benchmark (tiến độ của các từ bị xóa theo) và trạng thái của người học giả."""
+    with db_cursor() as cursor:
+        cursor.execute('DELETE FROM collections WHERE name LIKE %s', (BENCH_PREFIX + '%',))
+        deleted = cursor.rowcount
+        if deleted:
+            bump_catalog_version(cursor)
+    learners = [learner_id(index) for index in range(MAX_LEARNERS)]
+    with db_cursor() as cursor:
+        cursor.execute('DELETE FROM user_word_data WHERE user_id = ANY(%s::uuid[])', (learners,))
+        cursor.execute('DELETE FROM user_progress_state WHERE user_id = ANY(%s::uuid[])', (learners,))
+    return deleted
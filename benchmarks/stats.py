@@ -0,0 +1,133 @@
+import json
+import math
+import os
+import platform
+import re
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+PERCENTILES = (50, 90, 95, 99)
+COMPARED_FIELDS = ('p50_ms', 'p95_ms') # Các chỉ số được so sánh khi tìm regression
+
+_SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+def percentile(sorted_samples, q):
+    """Phân vị q (0-100) của danh sách đã sắp xếp, nội suy tuyến tính giữa hai mẫu gần nhất."""
+    if not sorted_samples:
+        return None
+    rank = (len(sorted_samples) - 1) * q / 100
+    lower = math.floor(rank)
+    upper = min(lower + 1, len(sorted_samples) - 1)
+    return sorted_samples[lower] + (sorted_samples[upper] - sorted_samples[lower]) * (rank - lower)
+
+
+def summarize(samples, errors=0, wall_time=None, db_samples=()):
+    """
+    Tóm tắt danh sách thời gian (giây) của các request thành công.
+    `wall_time` (giây) là tổng thời gian chạy để tính thông lượng; mặc định là tổng các mẫu (chạy tuần tự).
+    `db_samples` là các cặp (thời gian SQL ms, số câu lệnh) lấy từ header Server-Timing.
+    """
+    ordered = sorted(samples)
+    total = wall_time if wall_time is not None else sum(ordered)
+    result = {
+        'count': len(ordered),
+        'errors': errors,
+        'mean_ms': _ms(sum(ordered) / len(ordered)) if ordered else None,
+        'max_ms': _ms(ordered[-1]) if ordered else None,
+        'throughput_rps': round(len(ordered) / total, 2) if total else None,
+    }
+    for q in PERCENTILES:
+        value = percentile(ordered, q)
+        result[f'p{q}_ms'] = _ms(value) if value is not None else None
+    if db_samples:
+        result['db_mean_ms'] = round(sum(ms for ms, _ in db_samples) / len(db_samples), 3)
+        result['queries_per_request'] = round(sum(count for _, count in db_samples) / len(db_samples), 2)
+    return result
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def parse_server_timing(header):
+    """(thời gian SQL ms, số câu lệnh) trong header Server-Timing (xem app/metrics.py), hoặc None."""
+    match = _SERVER_TIMING_DB.search(header or '')
+    return (float(match.group(1)), int(match.group(2))) if match else None
+
+
+def environment(conn=None):
+    """Thông tin môi trường chạy, lưu kèm kết quả để biết các lần chạy có so sánh được với nhau không."""
+    info = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'git_commit': _git_commit(),
+    }
+    if conn is not None:
+        with conn.cursor() as cursor:
+            cursor.execute('SHOW server_version')
+            info['postgres'] = cursor.fetchone()[0]
+    return info
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_results(path, meta, results):
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _result_key(result):
+    return (result['scale'], result['mode'], result['scenario'], result.get('concurrency', 1))
+
+
+def compare(baseline, current):
+    """
+    So sánh hai file kết quả. Trả về danh sách (key, chỉ số, giá trị cũ, giá trị mới, tỉ lệ thay đổi)
+    của mọi cặp kết quả khớp nhau (tỉ lệ dương là chậm hơn).
+    """
+    old = {_result_key(result): result for result in baseline['results']}
+    rows = []
+    for result in current['results']:
+        previous = old.get(_result_key(result))
+        if previous is None:
+            continue
+        for field in COMPARED_FIELDS:
+            before, after = previous.get(field), result.get(field)
+            if not before or after is None:
+                continue
+            rows.append((_result_key(result), field, before, after, (after - before) / before))
+    return rows
+
+
+def format_table(results):
+    """Bảng text ngắn gọn để đọc nhanh trên terminal."""
+    header = f"{'scale':>9} {'mode':<6} {'scenario':<22} {'conc':>4} {'count':>6} {'err':>4} " \
+             f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rps':>9} {'queries':>7}"
+    lines = [header, '-' * len(header)]
+    for r in results:
+        lines.append(
+            f"{r['scale']:>9} {r['mode']:<6} {r['scenario']:<22} {r.get('concurrency', 1):>4} {r['count']:>6} "
+            f"{r['errors']:>4} {_cell(r['p50_ms'])} {_cell(r['p95_ms'])} {_cell(r['p99_ms'])} "
+            f"{_cell(r['throughput_rps'])} {r.get('queries_per_request', ''):>7}"
+        )
+    return '\n'.join(lines)
+
+
+def _cell(value):
+    return f'{value:>9.2f}' if value is not None else f"{'-':>9}"
@@ -2,6 +2,12 @@ import psycopg2
 import os
 import sys
 
+from app.migrations import migrate
+
+# Các bảng của ứng dụng, theo thứ tự xóa được khi chạy với --reset
+APP_TABLES = ['schema_version', 'translation_cache', 'job_uploads', 'jobs', 'deleted_rows', 'catalog_state',
+              'user_progress_state', 'user_word_data', 'words', 'topics', 'collections']
+
 def get_db_connection():
     """Lấy kết nối đến database từ biến môi trường."""
     # Lấy URL database từ biến môi trường mà Render cung cấp
@@ -19,97 +25,42 @@ def get_db_connection():
         print(f"Lỗi khi kết nối đến PostgreSQL: {e}", file=sys.stderr)
         return None
 
-def setup_database():
+def reset_database(conn):
+    """Xóa toàn bộ bảng của ứng dụng (MẤT HẾT DỮ LIỆU). Chỉ chạy khi gọi với --reset."""
+    with conn.cursor() as cursor:
+        for table in APP_TABLES:
+            cursor.execute(f'DROP TABLE IF EXISTS {table} CASCADE')
+    conn.commit()
+    print("Đã xóa toàn bộ bảng cũ.")
+
+def setup_database(reset=False):
     """
-    Tạo các bảng (collections, topics, words, user_word_data) 
-    trên database PostgreSQL.
+    Tạo hoặc nâng cấp schema trên database PostgreSQL bằng các migration trong app/migrations.
+    Chạy lại nhiều lần an toàn: chỉ các migration chưa áp dụng mới được chạy, dữ liệu cũ được giữ nguyên.
+    Trả về True nếu thành công.
     """
     conn = get_db_connection()
     if conn is None:
         print("Không thể kết nối đến database. Hủy bỏ cài đặt.", file=sys.stderr)
-        return
+        return False
 
-    cursor = None # Khởi tạo cursor bên ngoài để có thể đóng trong finally
     try:
-        cursor = conn.cursor()
-        print("Đang tạo bảng trên PostgreSQL...")
-        
-        # Xóa bảng cũ nếu tồn tại (để bạn có thể chạy lại file này nếu cần)
-        cursor.execute('DROP TABLE IF EXISTS user_word_data;')
-        cursor.execute('DROP TABLE IF EXISTS words;')
-        cursor.execute('DROP TABLE IF EXISTS topics;')
-        cursor.execute('DROP TABLE IF EXISTS collections;')
-
-        # Bảng collections
-        # SERIAL PRIMARY KEY là tương đương với AUTOINCREMENT trong PostgreSQL
-        cursor.execute('''
-        CREATE TABLE collections (
-            id SERIAL PRIMARY KEY,
-            name TEXT NOT NULL UNIQUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            is_visible INTEGER NOT NULL DEFAULT 1
-        )
-        ''')
-        print("Tạo bảng 'collections' thành công.")
-
-        # Bảng topics
-        cursor.execute('''
-        CREATE TABLE topics (
-            id SERIAL PRIMARY KEY,
-            name TEXT NOT NULL,
-            category TEXT NOT NULL,
-            position INTEGER,
-            collection_id INTEGER NOT NULL,
-            FOREIGN KEY (collection_id) REFERENCES collections (id) ON DELETE CASCADE
-        )
-        ''')
-        print("Tạo bảng 'topics' thành công.")
-
-        # Bảng words
-        cursor.execute('''
-        CREATE TABLE words (
-            id SERIAL PRIMARY KEY,
-            topic_id INTEGER NOT NULL,
-            word TEXT NOT NULL,
-            ipa TEXT,
-            type TEXT,
-            meaning TEXT NOT NULL,
-            example TEXT,
-            position INTEGER,
-            FOREIGN KEY (topic_id) REFERENCES topics (id) ON DELETE CASCADE
-        )
-        ''')
-        print("Tạo bảng 'words' thành công.")
-
-        # Bảng user_word_data
-        cursor.execute('''
-        CREATE TABLE user_word_data (
-            word_id INTEGER PRIMARY KEY,
-            srs_level INTEGER NOT NULL DEFAULT 0,
-            next_review_at TIMESTAMP,
-            is_favorite INTEGER NOT NULL DEFAULT 0,
-            FOREIGN KEY (word_id) REFERENCES words (id) ON DELETE CASCADE
-        )
-        ''')
-        print("Tạo bảng 'user_word_data' thành công.")
-        
-        # Commit tất cả thay đổi vào database
-        conn.commit()
-        print("Tất cả các bảng đã được tạo thành công trên PostgreSQL!")
+        if reset:
+            reset_database(conn)
+        applied = migrate(conn)
+        if applied:
+            print(f"Đã áp dụng {len(applied)} migration thành công!")
+        return True
 
     except (Exception, psycopg2.DatabaseError) as e:
         print(f"Đã xảy ra lỗi khi thiết lập cơ sở dữ liệu: {e}", file=sys.stderr)
-        if conn:
-            conn.rollback() # Hoàn tác nếu có lỗi
+        return False
     finally:
-        # Luôn đóng cursor và connection
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            print("Đã đóng kết nối database.")
+        conn.close()
+        print("Đã đóng kết nối database.")
 
 if __name__ == '__main__':
     print("Bắt đầu chạy setup_database...")
-    setup_database()
-    print("Kết thúc setup_database.")
\ No newline at end of file
+    ok = setup_database(reset='--reset' in sys.argv[1:])
+    print("Kết thúc setup_database.")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,39 @@
+# Cấu hình gunicorn (Dockerfile chạy `gunicorn --config gunicorn.conf.py run:app`).
+#
+# Mô hình worker, chọn bằng biến môi trường WORKER_MODE:
+#  - sync (mặc định): mỗi worker là một tiến trình xử lý MỘT request tại một thời điểm. Request đang chờ
+#    database hay dịch vụ dịch giữ cả tiến trình, nên số request đồng thời = số worker (WEB_CONCURRENCY).
+#  - gthread: mỗi worker có WORKER_THREADS thread, số request đồng thời = WEB_CONCURRENCY * WORKER_THREADS.
+#  - gevent: mỗi worker chạy tối đa WORKER_CONNECTIONS request đồng thời trên các greenlet. Khi một request chờ
+#    I/O (câu lệnh SQL, gọi dịch vụ dịch) thì greenlet nhường cho request khác, nên một container xử lý được
+#    rất nhiều phiên quiz đồng thời với ít tiến trình (ít bộ nhớ). Cùng các route và định dạng response:
+#      * psycopg2 chạy ở chế độ "green" (wait callback, xem app/db.py); pool kết nối vẫn giới hạn DB_POOL_MAX
+#        mỗi worker, các request vượt quá chờ lượt (tối đa DB_POOL_TIMEOUT giây) mà không giữ tiến trình;
+#      * thư viện HTTP của deep-translator và thread pool của app/translation.py được gevent vá (monkey patch)
+#        thành không chặn;
+#      * phần tính toán CPU (dựng snapshot catalog, nén) vẫn chặn worker trong lúc chạy, nên vẫn nên có
+#        nhiều hơn một worker trên máy nhiều nhân.
+#    Ở chế độ này nên tăng DB_POOL_MAX (ví dụ 20-50) trong giới hạn max_connections của Postgres.
+import os
+
+WORKER_MODE = os.environ.get('WORKER_MODE', 'sync')
+WORKER_THREADS = int(os.environ.get('WORKER_THREADS', 8)) # Chỉ dùng với WORKER_MODE=gthread
+WORKER_CONNECTIONS = int(os.environ.get('WORKER_CONNECTIONS', 1000)) # Chỉ dùng với WORKER_MODE=gevent
+
+if WORKER_MODE not in ('sync', 'gthread', 'gevent'):
+    raise RuntimeError(f"WORKER_MODE không hợp lệ: {WORKER_MODE!r} (sync, gthread hoặc gevent)")
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+worker_class = WORKER_MODE
+threads = WORKER_THREADS if WORKER_MODE == 'gthread' else 1
+worker_connections = WORKER_CONNECTIONS
+# Không preload app: với gevent, worker phải vá thư viện chuẩn trước khi app (psycopg2, threading) được import
+preload_app = False
+
+
+def post_worker_init(worker):
+    # Mỗi worker chạy thread xử lý job ngay khi khởi động: job còn trong hàng đợi sau khi restart, hoặc do
+    # worker khác thêm vào, không phải chờ một request gọi tới jobs.ensure_worker()
+    from app import jobs
+    jobs.ensure_worker()
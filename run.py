@@ -1,6 +1,9 @@
-from app import create_app
+from werkzeug.serving import is_running_from_reloader
+from app import create_app, jobs
 
 app = create_app()
 
 if __name__ == '__main__':
+    if is_running_from_reloader(): # Chỉ tiến trình con của reloader phục vụ request và chạy job
+        jobs.ensure_worker()
     app.run(debug=True)